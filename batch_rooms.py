@@ -0,0 +1,163 @@
+# Apply transforms to many room files at once, 1 room per process
+# python batch_rooms.py --validate                      -> check every room in rooms/
+# python batch_rooms.py --autotile --migrate-paths      -> fix every room in place
+# python batch_rooms.py --to room --output-dir out a.json -> convert 1 room into out/
+
+from os import environ, path, makedirs
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from glob import glob
+from json import load
+from sys import exit
+import argparse
+import time
+
+# No window needed, workers inherit this
+environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import main
+import numpy as np
+
+# Each worker loads the sprite sheet once
+sprite_sheet = None
+
+
+def init_worker():
+    global sprite_sheet
+    sprite_sheet = main.SpriteSheet(
+        main.SPRITE_SHEET_PNG_PATH,
+        main.SPRITE_SHEET_JSON_PATH
+    )
+
+
+# Json room cells the arrays could not hold, outside the room or stacked on another cell
+def get_dropped_cells_problems_list(room_path, room_data):
+    with open(room_path, 'r') as file:
+        json_data = load(file)
+    problems_list = []
+    for i, (tile_map, room) in enumerate(zip(room_data.tile_maps_list, json_data["rooms_list"])):
+        dropped_count = len(room) - int(np.count_nonzero(tile_map.sprite_ids))
+        if dropped_count:
+            problems_list.append(
+                f"layer {i} has {dropped_count} cells outside the room or stacked on another cell")
+    return problems_list
+
+
+# 1 room -> (room path, output path or None, problems list), runs in a worker
+def process_room(room_path, args):
+    room_data = main.load_room_data(room_path, sprite_sheet)
+
+    problems_list = []
+    if args.validate:
+        problems_list = main.validate_room_data(room_data)
+        if room_path.endswith(main.ROOM_JSON_EXTENSION):
+            problems_list += get_dropped_cells_problems_list(
+                room_path, room_data)
+
+    # Only checking? leave the file alone
+    if not (args.autotile or args.migrate_paths or args.to):
+        return room_path, None, problems_list
+
+    # Binary rooms map their file, work on a copy and let go of the map
+    # Windows will not replace a file that is still mapped
+    room_data = room_data.snapshot()
+
+    if args.migrate_paths:
+        room_data.sprite_sheet_path = main.get_portable_path(
+            room_data.sprite_sheet_path)
+
+    # Same autotile the editor runs on load and on the t key
+    if args.autotile:
+        for tile_map in room_data.tile_maps_list:
+            tile_map.autotile()
+
+    # Output next to it or in the output dir, in its format or the asked one
+    extension = path.splitext(room_path)[1]
+    if args.to == "room":
+        extension = main.ROOM_BINARY_EXTENSION
+    elif args.to == "json":
+        extension = main.ROOM_JSON_EXTENSION
+    output_path = path.splitext(room_path)[0] + extension
+    if args.output_dir:
+        output_path = path.join(args.output_dir, path.basename(output_path))
+
+    # Written next to it then swapped in
+    main.save_room_data(output_path, room_data)
+    return room_path, output_path, problems_list
+
+
+def run():
+    parser = argparse.ArgumentParser(
+        description="Apply transforms to many room files at once"
+    )
+    parser.add_argument(
+        "paths",
+        nargs="*",
+        help="room files, defaults to every room file in the rooms dir"
+    )
+    parser.add_argument("--validate", action="store_true",
+                        help="report broken rooms, exit 1 if any")
+    parser.add_argument("--autotile", action="store_true",
+                        help="autotile every layer again")
+    parser.add_argument("--migrate-paths", action="store_true",
+                        help="store sprite_sheet_path with forward slashes")
+    parser.add_argument("--to", choices=["room", "json"],
+                        help="convert to this format")
+    parser.add_argument("--output-dir", help="write here instead of in place")
+    parser.add_argument("--workers", type=int,
+                        help="processes, defaults to 1 per core")
+    args = parser.parse_args()
+    if not (args.validate or args.autotile or args.migrate_paths or args.to):
+        parser.error(
+            "nothing to do, pick --validate, --autotile, --migrate-paths or --to")
+
+    # Converting? the rooms already in that format are not inputs
+    room_paths_list = args.paths
+    if not room_paths_list:
+        extensions_list = [main.ROOM_JSON_EXTENSION, main.ROOM_BINARY_EXTENSION]
+        if args.to == "room":
+            extensions_list = [main.ROOM_JSON_EXTENSION]
+        elif args.to == "json":
+            extensions_list = [main.ROOM_BINARY_EXTENSION]
+        room_paths_list = sorted(
+            room_path
+            for extension in extensions_list
+            for room_path in glob(path.join(main.ROOMS_DIR_PATH, f"*{extension}"))
+        )
+    if args.output_dir:
+        makedirs(args.output_dir, exist_ok=True)
+
+    # Progress streams as rooms finish, in any order
+    start = time.perf_counter()
+    failed_count = 0
+    problems_count = 0
+    with ProcessPoolExecutor(args.workers, initializer=init_worker) as executor:
+        futures_dict = {
+            executor.submit(process_room, room_path, args): room_path for room_path in room_paths_list
+        }
+        for i, future in enumerate(as_completed(futures_dict), 1):
+            room_path = futures_dict[future]
+            try:
+                room_path, output_path, problems_list = future.result()
+            except Exception as error:
+                failed_count += 1
+                print(
+                    f"[{i}/{len(futures_dict)}] {room_path} failed: {error!r}", flush=True)
+                continue
+            problems_count += len(problems_list)
+            message = f" -> {output_path}" if output_path else " ok"
+            if problems_list:
+                message += f", {len(problems_list)} problems"
+            print(f"[{i}/{len(futures_dict)}] {room_path}{message}", flush=True)
+            for problem in problems_list:
+                print(f"    {problem}", flush=True)
+
+    print(
+        f"{len(room_paths_list)} rooms, {failed_count} failed, {problems_count} problems, "
+        f"{time.perf_counter() - start:.2f}s"
+    )
+    if failed_count or problems_count:
+        exit(1)
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,153 @@
+# Collision benchmark: many actors falling, walking and jumping through a big room of solid, one way and spike tiles
+# Run from the repo root: python -m benchmarks.collision --actors 1000
+
+from os import environ
+import argparse
+import statistics
+import time
+
+TICKS_COUNT = 240
+
+# Actor box, same size as the actor frames
+ACTOR_SIZE = 24
+
+# Pixels per second and pixels per second squared
+WALK_SPEED = 90.0
+JUMP_SPEED = 330.0
+GRAVITY = 900.0
+MAX_FALL_SPEED = 600.0
+
+# Naive actor vs actor pairs are timed for this many ticks only
+NAIVE_TICKS_COUNT = 5
+
+
+def run():
+    parser = argparse.ArgumentParser(
+        description="Time tile sweeps, hazards and actor pairs for many moving actors"
+    )
+    parser.add_argument("--actors", type=int, default=1000)
+    parser.add_argument("--room-scale", default="8x8", help="room scale like 8x8")
+    parser.add_argument("--ticks", type=int, default=TICKS_COUNT)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    # No window, no sound
+    environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    environ.setdefault("SDL_AUDIODRIVER", "dummy")
+    import main
+    import numpy as np
+    import pygame as pg
+
+    rng = np.random.default_rng(args.seed)
+    sprite_sheet = main.SpriteSheet(
+        main.SPRITE_SHEET_PNG_PATH,
+        main.SPRITE_SHEET_JSON_PATH
+    )
+
+    # Floor, walls and a platform every 5 rows, mostly solid, some one way, some spikes
+    room_scale = tuple(int(value) for value in args.room_scale.split("x"))
+    room_data = main.RoomData(
+        sprite_sheet, main.SPRITE_SHEET_PNG_PATH, (0, 0), room_scale
+    )
+    tile_map = room_data.tile_maps_list[main.COLLISION_LAYER_INDEX]
+    ids_array = np.array(
+        [
+            0,
+            sprite_sheet.ids_dict["dirt_block"],
+            sprite_sheet.ids_dict["wood_thin_tile"],
+            sprite_sheet.ids_dict["spike"]
+        ],
+        np.uint16
+    )
+    for y in range(4, tile_map.height_tile_unit - 1, 5):
+        tile_map.sprite_ids[y] = ids_array[
+            rng.choice(4, tile_map.width_tile_unit, p=[0.4, 0.35, 0.2, 0.05])
+        ]
+    tile_map.sprite_ids[-1] = ids_array[1]
+    tile_map.sprite_ids[:, [0, -1]] = ids_array[1]
+    collider = main.TileCollider(tile_map)
+
+    # Actors spawn in air cells with room for their box
+    is_free = sprite_sheet.collision_kinds_array[tile_map.sprite_ids] == main.COLLISION_AIR
+    is_free = is_free[:-1, :-1] & is_free[1:, :-1] & is_free[:-1, 1:] & is_free[1:, 1:]
+    free_ys, free_xs = np.nonzero(is_free)
+    spawns = rng.choice(len(free_xs), args.actors)
+    spawn_lefts = free_xs[spawns] * main.TILE_SIZE + 0.0
+    spawn_tops = free_ys[spawns] * main.TILE_SIZE + 0.0
+    lefts = spawn_lefts.copy()
+    tops = spawn_tops.copy()
+    sizes = np.full(args.actors, float(ACTOR_SIZE))
+    vxs = rng.choice([-WALK_SPEED, WALK_SPEED], args.actors)
+    vys = np.zeros(args.actors)
+
+    dt = 1 / main.TICK_RATE
+    phases_list = ["move_x", "move_y", "hazards", "pairs"]
+    times_dict = {phase: [] for phase in phases_list}
+    hits_count = 0
+    pairs_count = 0
+    deaths_count = 0
+    for _ in range(args.ticks):
+        start = time.perf_counter()
+        lefts, is_hit_x = collider.move_x(lefts, tops, sizes, sizes, vxs * dt)
+        # Walls turn actors around
+        vxs[is_hit_x] *= -1
+        times_dict["move_x"].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        vys = np.minimum(vys + GRAVITY * dt, MAX_FALL_SPEED)
+        tops, is_hit_y = collider.move_y(lefts, tops, sizes, sizes, vys * dt)
+        # Landed actors jump again now and then, bumped heads fall
+        is_landed = is_hit_y & (vys > 0)
+        vys[is_hit_y] = 0
+        is_jumping = is_landed & (rng.random(args.actors) < 0.02)
+        vys[is_jumping] = -JUMP_SPEED
+        times_dict["move_y"].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        is_hazard = collider.get_hazard_mask(lefts, tops, sizes, sizes)
+        # Spiked actors go back to their spawn
+        lefts[is_hazard] = spawn_lefts[is_hazard]
+        tops[is_hazard] = spawn_tops[is_hazard]
+        vys[is_hazard] = 0
+        times_dict["hazards"].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        is_array, _ = main.get_overlapping_pairs(lefts, tops, sizes, sizes)
+        times_dict["pairs"].append(time.perf_counter() - start)
+
+        hits_count += int(is_hit_x.sum() + is_hit_y.sum())
+        pairs_count += len(is_array)
+        deaths_count += int(is_hazard.sum())
+
+    # What the pairs cost when every actor tests every other actor
+    naive_times_list = []
+    frects_list = [
+        pg.FRect(left, top, ACTOR_SIZE, ACTOR_SIZE) for left, top in zip(lefts.tolist(), tops.tolist())
+    ]
+    for _ in range(NAIVE_TICKS_COUNT):
+        start = time.perf_counter()
+        for frect in frects_list:
+            frect.collidelistall(frects_list)
+        naive_times_list.append(time.perf_counter() - start)
+
+    print(
+        f"actors={args.actors} room scale={room_scale[0]}x{room_scale[1]} "
+        f"tiles={tile_map.width_tile_unit}x{tile_map.height_tile_unit} ticks={args.ticks}"
+    )
+    tick_times_list = [sum(times) for times in zip(*times_dict.values())]
+    for phase, times_list in list(times_dict.items()) + [("tick", tick_times_list)]:
+        print(
+            f"{phase:>12} median={statistics.median(times_list) * 1000:.3f}ms "
+            f"max={max(times_list) * 1000:.3f}ms"
+        )
+    print(
+        f"{'naive pairs':>12} median={statistics.median(naive_times_list) * 1000:.3f}ms"
+    )
+    print(
+        f"tile hits per tick={hits_count / args.ticks:.1f} "
+        f"pairs per tick={pairs_count / args.ticks:.1f} spiked={deaths_count}"
+    )
+
+
+if __name__ == "__main__":
+    run()
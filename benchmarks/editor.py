@@ -0,0 +1,290 @@
+# Headless benchmark of the editor hot paths against synthetic rooms of growing room scale
+# Run from the repo root: python -m benchmarks.editor --output results.json
+# Compare with an older run: python -m benchmarks.editor --compare old_results.json
+
+from os import environ, path, remove
+from sys import exit, version
+import argparse
+import json
+import platform
+import shutil
+import statistics
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks import synthetic_room
+from benchmarks.peak_rss import get_peak_rss
+
+# Room scales to run, each room is half filled with ground and gets some entities
+ROOM_SCALES_LIST = [(1, 1), (4, 4), (8, 8), (16, 16)]
+ENTITIES_PER_ROOM_UNIT = 8
+
+# Frames per update / draw measure, the camera pans across the room
+FRAMES_COUNT = 240
+
+# Repeats for load / save / autotile measures
+REPEATS = 5
+
+# Brush strokes for the dirty autotile measure
+BRUSH_STROKES_COUNT = 200
+
+# Slower than the baseline by this ratio? regression
+REGRESSION_RATIO = 1.2
+
+
+# Times in seconds -> stats in ms
+def get_stats(times_list):
+    times_list = sorted(times_list)
+
+    def percentile(ratio):
+        return times_list[min(int(ratio * len(times_list)), len(times_list) - 1)] * 1000
+
+    return {
+        "count": len(times_list),
+        "mean_ms": statistics.fmean(times_list) * 1000,
+        "p50_ms": percentile(0.5),
+        "p90_ms": percentile(0.9),
+        "p99_ms": percentile(0.99),
+        "max_ms": times_list[-1] * 1000,
+        "throughput_per_s": len(times_list) / sum(times_list) if sum(times_list) else 0.0,
+    }
+
+
+# Run function count times, each call gets timed, then 1 more call tracks its python memory peak
+def measure(function, count):
+    times_list = []
+    for i in range(count):
+        start = time.perf_counter()
+        function(i)
+        times_list.append(time.perf_counter() - start)
+
+    # Tracing slows python down, keep it out of the timed calls
+    tracemalloc.start()
+    try:
+        function(count)
+        peak_memory = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    stats = get_stats(times_list)
+    stats["peak_memory_kb"] = peak_memory / 2 ** 10
+    return stats
+
+
+# Run every measure for 1 room scale
+def run_room_scale(main, room_scale, temp_dir):
+    results_list = []
+    cells_count = (
+        room_scale[0] * synthetic_room.ROOM_WIDTH_TILE_UNIT *
+        room_scale[1] * synthetic_room.ROOM_HEIGHT_TILE_UNIT
+    )
+    tiles_count = cells_count // 2
+    entities_count = room_scale[0] * room_scale[1] * ENTITIES_PER_ROOM_UNIT
+    json_path = synthetic_room.write_room(
+        room_scale, tiles_count, entities_count=entities_count
+    )
+    binary_path = path.join(temp_dir, "room" + main.ROOM_BINARY_EXTENSION)
+    save_json_path = path.join(temp_dir, "save" + main.ROOM_JSON_EXTENSION)
+    save_binary_path = path.join(temp_dir, "save" + main.ROOM_BINARY_EXTENSION)
+
+    def add(name, stats):
+        stats.update(
+            {
+                "name": name,
+                "room_scale": list(room_scale),
+                "tiles": tiles_count,
+                "entities": entities_count,
+            }
+        )
+        results_list.append(stats)
+        print(
+            f"{name:>22} scale={room_scale[0]}x{room_scale[1]} tiles={tiles_count} "
+            f"p50={stats['p50_ms']:.3f}ms p99={stats['p99_ms']:.3f}ms "
+            f"peak={stats['peak_memory_kb']:.0f}kb"
+        )
+
+    try:
+        # Room load
+        add(
+            "load_json",
+            measure(lambda i: main.RoomLoadEditor(json_path), REPEATS)
+        )
+        editor = main.RoomLoadEditor(json_path)
+        main.save_room_data(binary_path, editor.room_data)
+        add(
+            "load_binary",
+            measure(lambda i: main.RoomLoadEditor(binary_path), REPEATS)
+        )
+
+        # Room save, on this thread to time the serialization itself
+        add(
+            "save_json",
+            measure(
+                lambda i: main.save_room_data(
+                    save_json_path, editor.room_data.snapshot()
+                ),
+                REPEATS
+            )
+        )
+        add(
+            "save_binary",
+            measure(
+                lambda i: main.save_room_data(
+                    save_binary_path, editor.room_data.snapshot()
+                ),
+                REPEATS
+            )
+        )
+
+        # Autotile, whole room and 1 tile brush strokes
+        add(
+            "autotile_all",
+            measure(lambda i: editor.autotile_all(), REPEATS)
+        )
+
+        def brush_stroke(i):
+            x = editor.room_topleft_tile_unit[0] + \
+                i * 7 % editor.room_width_tile_unit
+            y = editor.room_topleft_tile_unit[1] + \
+                i * 3 % editor.room_height_tile_unit
+            sprite_id = editor.sprite_sheet.ids_dict["dirt_block"]
+            if editor.get_tile_from_room(x, y) == sprite_id:
+                sprite_id = 0
+            editor.set_tile_from_room(x, y, sprite_id)
+            editor.autotile_dirty()
+
+        add("autotile_dirty", measure(brush_stroke, BRUSH_STROKES_COUNT))
+
+        # Frames, camera pans over the room, chunk cache on and off
+        main.game.scene = editor
+
+        def pan(i):
+            editor.camera_frect.topleft = (
+                editor.room_topleft[0] + i * 7 % max(editor.room_width, 1),
+                editor.room_topleft[1] + i * 3 % max(editor.room_height, 1)
+            )
+
+        for is_chunk_cache in (True, False):
+            main.game.is_chunk_cache = is_chunk_cache
+            suffix = "chunks" if is_chunk_cache else "tiles"
+
+            def frame(i):
+                pan(i)
+                editor.fixed_update(main.game.timestep.tick_dt)
+                editor.update(1 / main.FPS)
+
+            add(f"update_{suffix}", measure(frame, FRAMES_COUNT))
+
+            def draw_layers(i):
+                pan(i)
+                for room, group in zip(editor.rooms_list, editor.groups_list):
+                    room.draw(editor.camera_frect, room is not editor.room)
+                    group.draw(editor.camera_frect, editor.group)
+
+            add(f"draw_layers_{suffix}", measure(draw_layers, FRAMES_COUNT))
+
+            def draw_groups(i):
+                pan(i)
+                for group in editor.groups_list:
+                    group.draw(editor.camera_frect, editor.group)
+
+            add(f"group_draw_{suffix}", measure(draw_groups, FRAMES_COUNT))
+        main.game.is_chunk_cache = True
+        main.game.scene = None
+    finally:
+        remove(json_path)
+
+    return results_list
+
+
+# Results, baseline results -> regressions list
+def get_regressions(results_list, baseline_results_list):
+    baseline_dict = {
+        (result["name"], tuple(result["room_scale"])): result for result in baseline_results_list
+    }
+    regressions_list = []
+    for result in results_list:
+        baseline = baseline_dict.get(
+            (result["name"], tuple(result["room_scale"])))
+        if baseline is None or not baseline["p50_ms"]:
+            continue
+        ratio = result["p50_ms"] / baseline["p50_ms"]
+        if ratio > REGRESSION_RATIO:
+            regressions_list.append(
+                {
+                    "name": result["name"],
+                    "room_scale": result["room_scale"],
+                    "baseline_p50_ms": baseline["p50_ms"],
+                    "p50_ms": result["p50_ms"],
+                    "ratio": ratio,
+                }
+            )
+    return regressions_list
+
+
+def run():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the editor hot paths headless"
+    )
+    parser.add_argument(
+        "--room-scales",
+        nargs="*",
+        default=[f"{x}x{y}" for x, y in ROOM_SCALES_LIST],
+        help="room scales like 4x4"
+    )
+    parser.add_argument("--output", help="write results json here")
+    parser.add_argument(
+        "--compare", help="results json of an older run, exit 1 on regressions")
+    args = parser.parse_args()
+
+    # No window, no sound
+    environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    environ.setdefault("SDL_AUDIODRIVER", "dummy")
+    import main
+    import pygame as pg
+
+    results_list = []
+    temp_dir = tempfile.mkdtemp()
+    try:
+        for room_scale in args.room_scales:
+            room_scale = tuple(int(value) for value in room_scale.split("x"))
+            results_list += run_room_scale(main, room_scale, temp_dir)
+    finally:
+        shutil.rmtree(temp_dir)
+
+    peak_rss = get_peak_rss()
+    results = {
+        "meta": {
+            "python": version.split()[0],
+            "pygame": pg.version.ver,
+            "platform": platform.platform(),
+            "frames": FRAMES_COUNT,
+            "repeats": REPEATS,
+        },
+        # None where it cannot be read
+        "peak_rss_kb": None if peak_rss is None else peak_rss // 1024,
+        "results": results_list,
+    }
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=4)
+
+    if args.compare:
+        with open(args.compare, "r") as file:
+            baseline_results = json.load(file)
+        regressions_list = get_regressions(
+            results_list, baseline_results["results"])
+        for regression in regressions_list:
+            print(
+                f"regression {regression['name']} scale={regression['room_scale']} "
+                f"{regression['baseline_p50_ms']:.3f}ms -> {regression['p50_ms']:.3f}ms "
+                f"x{regression['ratio']:.2f}"
+            )
+        if regressions_list:
+            exit(1)
+
+
+if __name__ == "__main__":
+    run()
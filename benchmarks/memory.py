@@ -0,0 +1,121 @@
+# Memory benchmark: load a synthetic room with and without the shared sprite sheet cache
+# Run from the repo root: python -m benchmarks.memory
+# python -m benchmarks.memory --include-copy also runs the old per sprite copies, about 5 GB at 10000 tiles
+
+from os import environ, remove
+from sys import executable
+import argparse
+import subprocess
+
+from benchmarks import synthetic_room
+from benchmarks.peak_rss import get_peak_rss
+
+TILES_COUNT = 10000
+
+# Mode, sprite name: only entities get a sprite, plain tiles only live in the room arrays
+RUNS_LIST = [
+    ("shared", "grass_block"),
+    ("shared", "green_actor"),
+]
+
+# Only with --include-copy, each sprite copies the whole sprite sheet so it can run out of memory
+COPY_RUNS_LIST = [
+    ("copy", "green_actor"),
+]
+
+
+# Load 1 room in this process and print its numbers
+def run_once(mode, sprite_name, tiles_count):
+    environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    import main
+    import pygame as pg
+
+    if mode == "copy":
+        class CopySprite(main.Sprite):
+            # The old sprite, owns a translucent copy of the whole sprite sheet
+
+            def __init__(self, *args):
+                super().__init__(*args)
+                self.image_translucent = self.image.copy()
+                self.image_translucent.set_alpha(128)
+
+        main.Sprite = CopySprite
+
+    room_json_path = synthetic_room.write_room(
+        synthetic_room.get_room_scale(tiles_count), tiles_count, sprite_name
+    )
+    try:
+        # Warm up shared surfaces so the delta is only the room
+        main.load_surface(main.SPRITE_SHEET_PNG_PATH)
+        main.load_surface(main.SPRITE_SHEET_PNG_PATH, 128)
+        peak_rss_before = get_peak_rss()
+        start = pg.time.get_ticks()
+        editor = main.RoomLoadEditor(room_json_path)
+        load_ms = pg.time.get_ticks() - start
+        peak_rss_after = get_peak_rss()
+    finally:
+        remove(room_json_path)
+
+    # Unique surfaces held by the room
+    surfaces_dict = {}
+    sprites_count = 0
+    for group in editor.groups_list:
+        for sprite in group:
+            sprites_count += 1
+            surfaces_dict[id(sprite.image)] = sprite.image
+            surfaces_dict[id(sprite.image_translucent)] = sprite.image_translucent
+    surfaces_bytes = sum(
+        surface.get_width() * surface.get_height() * surface.get_bytesize()
+        for surface in surfaces_dict.values()
+    )
+    arrays_bytes = sum(
+        room.sprite_ids.nbytes + room.frame_indexes.nbytes for room in editor.rooms_list
+    )
+
+    # No peak memory on this platform? leave it out
+    rss_delta = ""
+    if peak_rss_before is not None:
+        rss_delta = f"rss_delta_mb={(peak_rss_after - peak_rss_before) / 2 ** 20:.1f} "
+
+    print(
+        f"{mode:>6} {sprite_name:>12} tiles={tiles_count} sprites={sprites_count} "
+        f"surfaces={len(surfaces_dict)} surfaces_mb={surfaces_bytes / 2 ** 20:.1f} "
+        f"arrays_kb={arrays_bytes / 2 ** 10:.1f} "
+        f"{rss_delta}load_ms={load_ms}"
+    )
+
+
+def run():
+    parser = argparse.ArgumentParser(
+        description="Load a synthetic room with and without the shared sprite sheet cache"
+    )
+    parser.add_argument("--mode", choices=["shared", "copy"])
+    parser.add_argument("--sprite-name", default="green_actor")
+    parser.add_argument("--tiles", type=int, default=TILES_COUNT)
+    parser.add_argument("--include-copy", action="store_true",
+                        help="also run the per sprite copies, needs gigabytes at the default tiles")
+    args = parser.parse_args()
+
+    # 1 run? do it here
+    if args.mode:
+        run_once(args.mode, args.sprite_name, args.tiles)
+        return
+
+    # Else each run gets a fresh process so peak memory does not leak between runs
+    runs_list = RUNS_LIST
+    if args.include_copy:
+        runs_list = RUNS_LIST + COPY_RUNS_LIST
+    for mode, sprite_name in runs_list:
+        subprocess.run(
+            [
+                executable, "-m", "benchmarks.memory",
+                "--mode", mode,
+                "--sprite-name", sprite_name,
+                "--tiles", str(args.tiles)
+            ],
+            check=True
+        )
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,101 @@
+# Play test benchmark: a big room full of actors, simulation ticks and frames timed headless
+# Run from the repo root: python -m benchmarks.play --actors 500 --room-scale 8x8
+
+from os import environ, remove
+import argparse
+import statistics
+import time
+
+from benchmarks import synthetic_room
+
+FRAMES_COUNT = 240
+
+# Frame budget at 60 fps
+FRAME_BUDGET_MS = 1000 / 60
+
+
+def run():
+    parser = argparse.ArgumentParser(
+        description="Time the play test scene with many actors"
+    )
+    parser.add_argument("--actors", type=int, default=500)
+    parser.add_argument("--room-scale", default="8x8", help="room scale like 8x8")
+    parser.add_argument("--frames", type=int, default=FRAMES_COUNT)
+    args = parser.parse_args()
+
+    # No window, no sound
+    environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    environ.setdefault("SDL_AUDIODRIVER", "dummy")
+    import main
+    import numpy as np
+
+    # Actors spread over the room, the ground is laid out below
+    room_scale = tuple(int(value) for value in args.room_scale.split("x"))
+    room_json_path = synthetic_room.write_room(
+        room_scale, 0, entities_count=args.actors
+    )
+    try:
+        editor = main.RoomLoadEditor(room_json_path)
+    finally:
+        remove(room_json_path)
+    main.game.scene = editor
+
+    # A floor every 8 rows with gaps, actors fall through the gaps to the next one
+    ground_id = editor.sprite_sheet.ids_dict["dirt_block"]
+    room = editor.rooms_list[main.COLLISION_LAYER_INDEX]
+    for y in range(7, room.height_tile_unit, 8):
+        room.sprite_ids[y] = ground_id
+        room.sprite_ids[y, 5::11] = 0
+    room.mark_all_chunks_dirty()
+    room.autotile()
+    editor.camera_frect.center = (
+        editor.room_topleft[0] + editor.room_width / 2,
+        editor.room_topleft[1] + editor.room_height / 2
+    )
+
+    # Switch like the g key does
+    editor.play_test()
+    play_test = main.game.scene
+    tick_dt = main.game.timestep.tick_dt
+    ticks_per_frame = round(1 / 60 / tick_dt)
+
+    ticks_times_list = []
+    draws_times_list = []
+    for _ in range(args.frames):
+        start = time.perf_counter()
+        for _ in range(ticks_per_frame):
+            play_test.fixed_update(tick_dt)
+        ticks_times_list.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        play_test.update(1 / 60)
+        draws_times_list.append(time.perf_counter() - start)
+
+    # Back to the editor, nothing reloaded
+    play_test.input(main.pg.event.Event(main.pg.KEYDOWN, key=main.pg.K_g, mod=0))
+    play_test.update(1 / 60)
+    assert main.game.scene is editor
+
+    frames_times_list = [
+        ticks + draw for ticks, draw in zip(ticks_times_list, draws_times_list)
+    ]
+    print(
+        f"actors={play_test.actors_count} room scale={room_scale[0]}x{room_scale[1]} "
+        f"frames={args.frames} ticks per frame={ticks_per_frame}"
+    )
+    for name, times_list in (
+        ("ticks", ticks_times_list),
+        ("draw", draws_times_list),
+        ("frame", frames_times_list),
+    ):
+        print(
+            f"{name:>8} median={statistics.median(times_list) * 1000:.3f}ms "
+            f"max={max(times_list) * 1000:.3f}ms"
+        )
+    over_count = int(np.count_nonzero(
+        np.array(frames_times_list) * 1000 > FRAME_BUDGET_MS))
+    print(f"frames over the 60 fps budget: {over_count}/{args.frames}")
+
+
+if __name__ == "__main__":
+    run()
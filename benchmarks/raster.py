@@ -0,0 +1,91 @@
+# Overview rasterizer scaling: 1 big full room rendered with more and more raster threads
+# Run from the repo root: python -m benchmarks.raster
+
+from os import environ, cpu_count, remove
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import statistics
+import time
+
+from benchmarks import synthetic_room
+
+REPEATS = 5
+
+
+def run():
+    parser = argparse.ArgumentParser(
+        description="Time the overview rasterizer across thread counts"
+    )
+    parser.add_argument("--room-scale", default="16x16", help="room scale like 16x16")
+    parser.add_argument("--scale", type=float, default=1.0,
+                        help="size of the result relative to the room")
+    parser.add_argument(
+        "--workers",
+        nargs="*",
+        type=int,
+        help="thread counts, defaults to powers of 2 up to the core count"
+    )
+    args = parser.parse_args()
+
+    # No window, no sound
+    environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    environ.setdefault("SDL_AUDIODRIVER", "dummy")
+    import main
+    import pygame as pg
+
+    workers_list = args.workers
+    if not workers_list:
+        workers_list = [1]
+        while workers_list[-1] * 2 <= (cpu_count() or 1):
+            workers_list.append(workers_list[-1] * 2)
+
+    # Every cell filled, entities included, so every chunk has work
+    room_scale = tuple(int(value) for value in args.room_scale.split("x"))
+    cells_count = (
+        room_scale[0] * synthetic_room.ROOM_WIDTH_TILE_UNIT *
+        room_scale[1] * synthetic_room.ROOM_HEIGHT_TILE_UNIT
+    )
+    room_json_path = synthetic_room.write_room(
+        room_scale, cells_count, entities_count=cells_count // 8
+    )
+    try:
+        sprite_sheet = main.SpriteSheet(
+            main.SPRITE_SHEET_PNG_PATH,
+            main.SPRITE_SHEET_JSON_PATH
+        )
+        room_data = main.load_room_data(room_json_path, sprite_sheet)
+    finally:
+        remove(room_json_path)
+    for tile_map in room_data.tile_maps_list:
+        tile_map.autotile()
+    frect = pg.FRect(room_data.topleft, (room_data.width, room_data.height))
+
+    print(
+        f"room scale={room_scale[0]}x{room_scale[1]} tiles={cells_count} "
+        f"size={int(frect.width)}x{int(frect.height)} scale={args.scale} cores={cpu_count()}"
+    )
+    one_worker_ms = None
+    for workers_count in workers_list:
+        with ThreadPoolExecutor(workers_count) as executor:
+            # Warm up the threads
+            main.rasterize_layers(
+                room_data.tile_maps_list, frect, args.scale, executor=executor
+            )
+            times_list = []
+            for _ in range(REPEATS):
+                start = time.perf_counter()
+                main.rasterize_layers(
+                    room_data.tile_maps_list, frect, args.scale, executor=executor
+                )
+                times_list.append((time.perf_counter() - start) * 1000)
+        median_ms = statistics.median(times_list)
+        if one_worker_ms is None:
+            one_worker_ms = median_ms
+        print(
+            f"workers={workers_count:>3} median={median_ms:.1f}ms "
+            f"min={min(times_list):.1f}ms speedup=x{one_worker_ms / median_ms:.2f}"
+        )
+
+
+if __name__ == "__main__":
+    run()
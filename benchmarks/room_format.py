@@ -0,0 +1,69 @@
+# Room format benchmark: json vs binary load / save time and file size
+# Run from the repo root: python -m benchmarks.room_format
+
+from os import environ, path, remove
+import argparse
+import tempfile
+import time
+
+from benchmarks import synthetic_room
+
+# Tiles count per run, rooms grow to fit them
+TILES_COUNTS_LIST = [1000, 10000, 100000]
+
+# Repeat each measure, keep the best
+REPEATS = 3
+
+
+# Function -> best time in ms
+def get_best_ms(function):
+    best = float("inf")
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def run():
+    parser = argparse.ArgumentParser(
+        description="Compare json and binary room load / save time and size"
+    )
+    parser.add_argument(
+        "--tiles", type=int, nargs="*", default=TILES_COUNTS_LIST
+    )
+    args = parser.parse_args()
+
+    environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    import main
+
+    sprite_sheet = main.SpriteSheet(
+        main.SPRITE_SHEET_PNG_PATH,
+        main.SPRITE_SHEET_JSON_PATH
+    )
+    for tiles_count in args.tiles:
+        room_scale = synthetic_room.get_room_scale(tiles_count)
+        json_path = synthetic_room.write_room(room_scale, tiles_count)
+        room_data = main.load_room_data(json_path, sprite_sheet)
+        temp_dir = tempfile.mkdtemp()
+        try:
+            for extension in (main.ROOM_JSON_EXTENSION, main.ROOM_BINARY_EXTENSION):
+                room_path = path.join(temp_dir, f"room{extension}")
+                save_ms = get_best_ms(
+                    lambda: main.save_room_data(room_path, room_data)
+                )
+                load_ms = get_best_ms(
+                    lambda: main.load_room_data(room_path, sprite_sheet)
+                )
+                print(
+                    f"{extension:>6} tiles={tiles_count} scale={room_scale[0]}x{room_scale[1]} "
+                    f"size_kb={path.getsize(room_path) / 2 ** 10:.1f} "
+                    f"save_ms={save_ms:.2f} load_ms={load_ms:.2f}"
+                )
+                remove(room_path)
+        finally:
+            remove(json_path)
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,83 @@
+# Cold start benchmark: import, init, scene construction and first frame, each run in a fresh process
+# Run from the repo root: python -m benchmarks.startup
+
+from os import environ
+from sys import executable
+import argparse
+import json
+import statistics
+import subprocess
+import time
+
+REPEATS = 5
+
+PHASES_LIST = ["import", "init", "scene", "first_frame"]
+
+
+# Time 1 cold start in this process and print its phases as json
+def run_once(room_path):
+    environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    environ.setdefault("SDL_AUDIODRIVER", "dummy")
+    times_list = [time.perf_counter()]
+
+    import main
+    times_list.append(time.perf_counter())
+
+    main.init()
+    times_list.append(time.perf_counter())
+
+    editor = main.RoomLoadEditor(room_path or main.LOAD_ROOM_JSON_PATH)
+    main.game.scene = editor
+    times_list.append(time.perf_counter())
+
+    editor.update(1 / main.FPS)
+    times_list.append(time.perf_counter())
+
+    print(
+        json.dumps(
+            {
+                phase: (end - start) * 1000
+                for phase, start, end in zip(PHASES_LIST, times_list, times_list[1:])
+            }
+        )
+    )
+
+
+def run():
+    parser = argparse.ArgumentParser(
+        description="Time the editor cold start phases"
+    )
+    parser.add_argument("--once", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--room-path", help="room to open, defaults to the editor one")
+    parser.add_argument("--repeats", type=int, default=REPEATS)
+    args = parser.parse_args()
+
+    # 1 run? do it here
+    if args.once:
+        run_once(args.room_path)
+        return
+
+    # Else each run gets a fresh process, imports and caches start cold
+    runs_list = []
+    for i in range(args.repeats):
+        command = [executable, "-m", "benchmarks.startup", "--once"]
+        if args.room_path:
+            command += ["--room-path", args.room_path]
+        output = subprocess.run(
+            command, check=True, capture_output=True, text=True
+        ).stdout
+        runs_list.append(json.loads(output.strip().splitlines()[-1]))
+
+    for phase in PHASES_LIST + ["total"]:
+        if phase == "total":
+            times_list = [sum(run.values()) for run in runs_list]
+        else:
+            times_list = [run[phase] for run in runs_list]
+        print(
+            f"{phase:>12} median={statistics.median(times_list):.1f}ms "
+            f"min={min(times_list):.1f}ms max={max(times_list):.1f}ms"
+        )
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,82 @@
+from json import dump
+from os import path
+import tempfile
+
+# Synthetic rooms, same json layout the editor saves
+
+TILE_SIZE = 18
+ROOM_WIDTH_TILE_UNIT = 24
+ROOM_HEIGHT_TILE_UNIT = 16
+
+
+# Room scale, tiles count, sprite name -> room json data
+# Entities go on the second layer, spread evenly over the room
+def make_room_data(room_scale, tiles_count, sprite_name="grass_block", layers_count=3, entities_count=0, entity_name="green_actor"):
+    room_width_tile_unit = ROOM_WIDTH_TILE_UNIT * room_scale[0]
+    room_height_tile_unit = ROOM_HEIGHT_TILE_UNIT * room_scale[1]
+    cells_count = room_width_tile_unit * room_height_tile_unit
+    tiles_count = min(tiles_count, cells_count)
+    entities_count = min(entities_count, cells_count)
+
+    # Fill the first layer row by row
+    room = []
+    for i in range(tiles_count):
+        room.append(
+            {
+                "name": sprite_name,
+                "position_x": float(i % room_width_tile_unit * TILE_SIZE),
+                "position_y": float(i // room_width_tile_unit * TILE_SIZE),
+                "frame_index": 0,
+            }
+        )
+    rooms_list = [room] + [[] for _ in range(layers_count - 1)]
+
+    # Spread entities on the second layer, actors are 6 pixels taller than a tile
+    if entities_count and layers_count > 1:
+        step = cells_count / entities_count
+        for i in range(entities_count):
+            cell_index = int(i * step)
+            rooms_list[1].append(
+                {
+                    "name": entity_name,
+                    "position_x": float(cell_index % room_width_tile_unit * TILE_SIZE),
+                    "position_y": float(cell_index // room_width_tile_unit * TILE_SIZE - 6),
+                    "frame_index": 0,
+                }
+            )
+
+    return {
+        "sprite_sheet_path": path.join("images", "sprite_sheet.png"),
+        "room_topleft_room_unit_x": 0,
+        "room_topleft_room_unit_y": 0,
+        "room_scale_x": room_scale[0],
+        "room_scale_y": room_scale[1],
+        "room_width_tile_unit": room_width_tile_unit,
+        "room_height_tile_unit": room_height_tile_unit,
+        "room_width": room_width_tile_unit * TILE_SIZE,
+        "room_height": room_height_tile_unit * TILE_SIZE,
+        "rooms_list": rooms_list
+    }
+
+
+# Smallest room scale that fits tiles count, wider than tall
+def get_room_scale(tiles_count):
+    room_scale = [1, 1]
+    while room_scale[0] * room_scale[1] * ROOM_WIDTH_TILE_UNIT * ROOM_HEIGHT_TILE_UNIT < tiles_count:
+        if room_scale[0] <= room_scale[1]:
+            room_scale[0] += 1
+        else:
+            room_scale[1] += 1
+    return tuple(room_scale)
+
+
+# Write a synthetic room to a temp file, returns its path
+def write_room(room_scale, tiles_count, sprite_name="grass_block", entities_count=0):
+    with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as file:
+        dump(
+            make_room_data(
+                room_scale, tiles_count, sprite_name, entities_count=entities_count
+            ),
+            file
+        )
+    return file.name
@@ -0,0 +1,55 @@
+# Convert room files between json and binary
+# python convert_rooms.py                 -> every rooms/*.json to rooms/*.room
+# python convert_rooms.py --to json a.room -> a.json
+
+from os import environ, path
+from glob import glob
+import argparse
+
+# No window needed
+environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import main
+
+
+def run():
+    parser = argparse.ArgumentParser(
+        description="Convert room files between json and binary"
+    )
+    parser.add_argument(
+        "paths",
+        nargs="*",
+        help="room files, defaults to every room file in the other format"
+    )
+    parser.add_argument(
+        "--to",
+        choices=["room", "json"],
+        default="room",
+        help="output format"
+    )
+    args = parser.parse_args()
+
+    # Output extension, input defaults to the other one
+    if args.to == "room":
+        extension = main.ROOM_BINARY_EXTENSION
+        other_extension = main.ROOM_JSON_EXTENSION
+    else:
+        extension = main.ROOM_JSON_EXTENSION
+        other_extension = main.ROOM_BINARY_EXTENSION
+    room_paths_list = args.paths or sorted(
+        glob(path.join(main.ROOMS_DIR_PATH, f"*{other_extension}"))
+    )
+
+    sprite_sheet = main.SpriteSheet(
+        main.SPRITE_SHEET_PNG_PATH,
+        main.SPRITE_SHEET_JSON_PATH
+    )
+    for room_path in room_paths_list:
+        output_path = path.splitext(room_path)[0] + extension
+        room_data = main.load_room_data(room_path, sprite_sheet)
+        main.save_room_data(output_path, room_data)
+        print(f"{room_path} -> {output_path}")
+
+
+if __name__ == "__main__":
+    run()
@@ -1,9 +1,18 @@
 import pygame as pg
+import numpy as np
 from sys import exit
-from os import path
-from json import dump, load
-
-pg.init()
+from os import path, listdir, remove, replace, stat, close
+from tempfile import mkstemp
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+import re
+from json import dump, load, loads
+from hashlib import sha1
+from collections import OrderedDict, deque
+from time import perf_counter
+from fractions import Fraction
+from math import ceil, floor
+from struct import Struct
 
 # Constants
 
@@ -22,10 +31,15 @@ ROOM_HEIGHT = ROOM_HEIGHT_tile_unit * TILE_SIZE
 # Font
 FONT_PATH = path.join('fonts', 'cg-pixel-3x5.ttf')
 FONT_HEIGHT = 5
-FONT = pg.font.Font(
-    FONT_PATH,
-    FONT_HEIGHT
-)
+
+# Rendered texts kept around, least recently used get dropped
+TEXT_CACHE_SIZE = 128
+
+# Profiler, frames kept for the debug graph and trace dumps, graph width is 1 frame budget
+PROFILER_HISTORY_FRAMES_COUNT = 120
+PROFILER_GRAPH_WIDTH = 120
+PROFILER_GRAPH_HEIGHT = 24
+PROFILER_TRACE_JSON_PATH = 'profile_trace.json'
 
 # Paths
 GRID_PNG_PATH = path.join('images', 'grid.png')
@@ -42,20 +56,165 @@ NATIVE_RECT = pg.Rect(
     ROOM_HEIGHT_tile_unit * TILE_SIZE
 )
 
-# Blit everything here
-NATIVE_SURFACE = pg.Surface(
-    (
-        NATIVE_RECT.width,
-        NATIVE_RECT.height
-    )
-)
-
 # Dt generator and loop speed limiter
 CLOCK = pg.time.Clock()
 
-# Game max fps
+# Game max fps, draws happen at most this often, 0 is uncapped
 FPS = 60
 
+# Window scale the editor opens with, native pixels -> window pixels
+WINDOW_SCALE = 3
+
+# Fractional scales are rounded down to steps of 1 / this, native rects aligned to its denominator scale without seams
+FRACTIONAL_SCALE_STEP = 4
+
+# Fullscreen bars around the scaled native surface
+LETTERBOX_COLOR = "black"
+
+# Simulation runs in fixed ticks, a slow frame runs at most this many, the rest of the backlog is dropped
+TICK_RATE = 120
+MAX_TICKS_PER_FRAME = 8
+
+# Spatial index bucket size, must be bigger than the biggest sprite frame
+SPATIAL_BUCKET_SIZE = TILE_SIZE * 6
+
+# Sprites with this name suffix get their own sprite, the rest only live in the room arrays
+ENTITY_NAME_SUFFIX = "_actor"
+
+# Ground sprites autotile with each other
+GROUND_NAMES_LIST = ["grass_block", "dirt_block", "snow_block"]
+
+# Collision, tiles on this layer stop actors, one way tiles only stop them from above, hazards only report them
+COLLISION_LAYER_INDEX = 0
+COLLISION_AIR = 0
+COLLISION_SOLID = 1
+COLLISION_ONE_WAY = 2
+COLLISION_HAZARD = 3
+SOLID_NAMES_LIST = GROUND_NAMES_LIST + [
+    "blue_pipe", "lock", "crate", "blank_block", "dot_block", "exclamation_block", "brick", "stone"
+]
+ONE_WAY_NAMES_LIST = ["metal_thin_tile", "wood_thin_tile"]
+HAZARD_NAMES_LIST = ["spike"]
+
+# Play test actors, pixels per second, flyers ignore gravity
+ACTOR_WALK_SPEED = 60.0
+ACTOR_GRAVITY = 900.0
+ACTOR_MAX_FALL_SPEED = 540.0
+FLYING_ACTOR_NAMES_LIST = ["bat_actor"]
+
+# Animated sprites, name -> (ms per step, cycles of frame indexes), cycles of 1 sprite are as long, frames in none stay still
+# Autotiled sprites cycle each of their frames with its own animation frame so autotile picks stay valid
+ANIMATIONS_DICT = {
+    "water": (120, [[0, 1]]),
+    "water_fall": (120, [[0, 3], [1, 4], [2, 5]]),
+    "coin": (150, [[0, 1]]),
+    "flag": (150, [[1, 2]]),
+    "lever": (300, [[0, 1, 2]]),
+    "red_roomba_actor": (120, [[0, 1, 2]]),
+    "blue_roomba_actor": (120, [[0, 1, 2]]),
+    "big_blue_roomba_actor": (160, [[0, 1, 2]]),
+    "bat_actor": (100, [[0, 1, 2]]),
+}
+
+# Room files, json is the import / export format, binary loads without parsing
+ROOM_LAYERS_COUNT = 3
+ROOM_JSON_EXTENSION = ".json"
+ROOM_BINARY_EXTENSION = ".room"
+ROOM_BINARY_MAGIC = b"PPRM"
+ROOM_BINARY_VERSION = 1
+ROOM_BINARY_HEADER_STRUCT = Struct("<4sHiiHHHH")
+ROOM_BINARY_ALIGNMENT = 16
+ROOM_TEMP_EXTENSION = ".tmp"
+ROOM_FILENAME_PATTERN = re.compile(r"room(\d+)\.")
+
+# World mode, rooms within this many pixels of the camera get loaded
+WORLD_LOAD_MARGIN = ROOM_WIDTH
+
+# Most 1 room unit rooms that can be near the camera at once, a span touches at most ceil(span / room) + 1 room units
+WORLD_NEAR_ROOMS_COUNT = (
+    (-(-(NATIVE_RECT.width + 2 * WORLD_LOAD_MARGIN) // ROOM_WIDTH) + 1)
+    * (-(-(NATIVE_RECT.height + 2 * WORLD_LOAD_MARGIN) // ROOM_HEIGHT) + 1)
+)
+
+# At most this many stay loaded, every room near the camera plus a few recently seen ones
+WORLD_RESIDENT_ROOMS_COUNT = WORLD_NEAR_ROOMS_COUNT + 8
+
+# Chunk cache, groups pre render their sprites into 1 room unit sized surfaces
+CHUNK_WIDTH = NATIVE_RECT.width
+CHUNK_HEIGHT = NATIVE_RECT.height
+
+# Sprite sheet json compiled to arrays next to it, rebuilt when the json changes
+ATLAS_CACHE_EXTENSION = ".atlas"
+ATLAS_CACHE_MAGIC = b"PPAT"
+ATLAS_CACHE_VERSION = 1
+ATLAS_CACHE_HEADER_STRUCT = Struct("<4sHqq20sHII")
+ATLAS_CACHE_ALIGNMENT = 16
+
+# Overview rasterizer, rooms are split in chunks of this many pixels and rendered on a thread pool
+RASTER_CHUNK_SIZE = 512
+
+# Minimap fits in this box, rebuilt at most this often in ms while the room changes
+MINIMAP_WIDTH = NATIVE_RECT.width // 4
+MINIMAP_HEIGHT = NATIVE_RECT.height // 4
+MINIMAP_REBUILD_INTERVAL = 500
+
+# Editor mouse tools
+TOOLS_LIST = ["brush", "rect", "flood", "copy", "paste"]
+
+# Undo keeps this many strokes, the oldest get dropped
+EDIT_HISTORY_SIZE = 256
+
+# Autotile changing more tiles than this re renders every chunk instead of looking them up
+AUTOTILE_MARK_ALL_CHUNKS_DIRTY_COUNT = 256
+
+# Input, action -> bindings, a binding is a pygame key name or "mouse <button>", with ctrl+ shift+ alt+ in front if needed
+# Scenes skip the actions they do not use, so 1 key can do different things in different scenes
+# The json, when there is one, rebinds the actions it lists, like {"save": ["ctrl+s"], "move_up": ["w", "up"]}
+INPUT_BINDINGS_JSON_PATH = path.join('data', 'input_bindings.json')
+INPUT_MODIFIERS_DICT = {
+    "ctrl": pg.KMOD_CTRL,
+    "shift": pg.KMOD_SHIFT,
+    "alt": pg.KMOD_ALT,
+}
+DEFAULT_INPUT_BINDINGS_DICT = {
+    # Held
+    "move_right": ["d"],
+    "move_left": ["a"],
+    "move_up": ["w"],
+    "move_down": ["s"],
+    "paint": ["mouse 1"],
+    "erase": ["mouse 3"],
+
+    # Pressed
+    "debug": ["p"],
+    "chunk_cache": ["c"],
+    "autotile_all": ["t"],
+    "tool_brush": ["b"],
+    "tool_rect": ["r"],
+    "tool_flood": ["f"],
+    "tool_copy": ["x"],
+    "tool_paste": ["v"],
+    "undo": ["ctrl+z"],
+    "redo": ["ctrl+y", "ctrl+shift+z"],
+    "minimap": ["n"],
+    "world_mode": ["m"],
+    "play_test": ["g"],
+    "restart": ["r"],
+    "scale_1": ["1"],
+    "scale_2": ["2"],
+    "scale_3": ["3"],
+    "scale_4": ["4"],
+    "fullscreen": ["f11"],
+    "integer_scale": ["f10"],
+    "group_previous": ["q"],
+    "group_next": ["e"],
+    "frame_next": ["up"],
+    "frame_previous": ["down"],
+    "save": ["space"],
+    "export_json": ["j"],
+    "dump_profile": ["o"],
+}
+
 
 class Game():
     # Stores non constant game data that you can change, it has automatic setters and getters.
@@ -67,51 +226,590 @@ class Game():
         # Debug flag
         self.is_debug = False
 
-        # Resolution scale
-        self.resolution_scale = 3
+        # Chunk cache flag, off draws each sprite every frame
+        self.is_chunk_cache = True
 
-        # Blit NATIVE_SURFACE here
-        self.window_surface = pg.display.set_mode(
-            (
-                NATIVE_RECT.width * self.resolution_scale,
-                NATIVE_RECT.height * self.resolution_scale
-            )
-        )
+        # Scene fixed_update runs at this rate, update draws in between
+        self.timestep = FixedTimestep(TICK_RATE, MAX_TICKS_PER_FRAME)
+
+        # Key / button -> action, shared by the scenes so held keys survive a scene switch
+        self.input_map = InputMap(load_input_bindings(INPUT_BINDINGS_JSON_PATH))
+
+        # Owns the window, NATIVE_SURFACE is scaled onto it each frame
+        self.presenter = Presenter(NATIVE_SURFACE, WINDOW_SCALE)
 
     # SET self.resolution_scale:
-        # window_surface
+        # presenter.window_scale
     @property
     def resolution_scale(self):
-        return self._resoltion_scale
+        return self.presenter.window_scale
 
     @resolution_scale.setter
     def resolution_scale(self, value):
-        # Resolution scale
-        self._resoltion_scale = value
+        self.presenter.window_scale = value
 
-        self.window_surface = pg.display.set_mode(
-            (
-                NATIVE_RECT.width * self.resolution_scale,
-                NATIVE_RECT.height * self.resolution_scale
+
+class Presenter():
+    # Native surface -> window, the window is only made again when its size or mode changes
+    # Scale 1 blits, integer scales scale, fractional scales scale native rects aligned so they match the whole frame
+    # Fullscreen fits the native surface in the screen, integer scales only unless turned off, bars around it
+
+    def __init__(self, native_surface, window_scale):
+        self.native_surface = native_surface
+
+        # (size, flags) of the window made last, None before the first one
+        self.mode = None
+
+        # Window scale is used windowed, fullscreen fits the screen
+        self._is_fullscreen = False
+        self._is_integer_scale = True
+        self.window_scale = window_scale
+
+    # SET self.window_scale:
+        # window_surface, scale, viewport_rect
+    @property
+    def window_scale(self):
+        return self._window_scale
+
+    @window_scale.setter
+    def window_scale(self, value):
+        self._window_scale = value
+        self.resize()
+
+    # SET self.is_fullscreen:
+        # window_surface, scale, viewport_rect
+    @property
+    def is_fullscreen(self):
+        return self._is_fullscreen
+
+    @is_fullscreen.setter
+    def is_fullscreen(self, value):
+        self._is_fullscreen = value
+        self.resize()
+
+    # SET self.is_integer_scale:
+        # scale, viewport_rect
+    @property
+    def is_integer_scale(self):
+        return self._is_integer_scale
+
+    @is_integer_scale.setter
+    def is_integer_scale(self, value):
+        self._is_integer_scale = value
+        self.resize()
+
+    # Window made again only if it has to be, then the scale and where the native surface lands in it
+    def resize(self):
+        native_width, native_height = self.native_surface.get_size()
+        if self.is_fullscreen:
+            mode = ((0, 0), pg.FULLSCREEN)
+        else:
+            mode = (
+                (ceil(native_width * self.window_scale), ceil(native_height * self.window_scale)),
+                0
+            )
+        if mode != self.mode:
+            self.window_surface = pg.display.set_mode(*mode)
+            self.mode = mode
+        else:
+            self.window_surface = pg.display.get_surface()
+        window_width, window_height = self.window_surface.get_size()
+
+        # Biggest scale that fits, integer when asked and possible, else in fractional steps
+        fit_scale = min(window_width / native_width, window_height / native_height)
+        if self.is_fullscreen and self.is_integer_scale and fit_scale >= 1:
+            scale = Fraction(floor(fit_scale))
+        else:
+            scale = Fraction(
+                max(floor(fit_scale * FRACTIONAL_SCALE_STEP), 1), FRACTIONAL_SCALE_STEP
             )
+        self.scale = scale
+
+        # Native rects start and end on multiples of this, so their window rects have whole pixel edges
+        self.alignment = scale.denominator
+
+        self.viewport_rect = pg.Rect(
+            0, 0, floor(native_width * scale), floor(native_height * scale)
+        )
+        self.viewport_rect.center = (window_width // 2, window_height // 2)
+
+        # Garbage or old frame in the window, bars included
+        self.is_full_present = True
+
+    # Window position -> native position, clamped so the bars act like the nearest edge
+    def window_to_native(self, pos):
+        native_width, native_height = self.native_surface.get_size()
+        return (
+            min(max(floor((pos[0] - self.viewport_rect.x) / self.scale), 0), native_width - 1),
+            min(max(floor((pos[1] - self.viewport_rect.y) / self.scale), 0), native_height - 1)
+        )
+
+    # Native rect -> window rect, grown to the alignment first
+    def get_window_rect(self, rect):
+        alignment = self.alignment
+        left = rect.left // alignment * alignment
+        top = rect.top // alignment * alignment
+        native_rect = pg.Rect(
+            left,
+            top,
+            -(-rect.right // alignment) * alignment - left,
+            -(-rect.bottom // alignment) * alignment - top
+        ).clip(self.native_surface.get_rect())
+        window_rect = pg.Rect(
+            self.viewport_rect.x + int(native_rect.x * self.scale),
+            self.viewport_rect.y + int(native_rect.y * self.scale),
+            int(native_rect.width * self.scale),
+            int(native_rect.height * self.scale)
         )
+        return native_rect, window_rect
+
+    # Scene dirty rects in native pixels -> window, None is the whole frame, empty skips the window update
+    def present(self, dirty_rects_list):
+        profiler.begin("present")
+
+        # Just made or resized? bars and all
+        if self.is_full_present:
+            self.window_surface.fill(LETTERBOX_COLOR)
+            dirty_rects_list = None
+            self.is_full_present = False
+
+        profiler.begin("scale")
+        if dirty_rects_list is None:
+            # Same size? a blit
+            if self.scale == 1:
+                self.window_surface.blit(self.native_surface, self.viewport_rect)
+            else:
+                pg.transform.scale(
+                    self.native_surface,
+                    self.viewport_rect.size,
+                    self.window_surface.subsurface(self.viewport_rect)
+                )
+        else:
+            window_rects_list = []
+            for rect in dirty_rects_list:
+                native_rect, window_rect = self.get_window_rect(rect)
+                if not native_rect:
+                    continue
+                if self.scale == 1:
+                    self.window_surface.blit(self.native_surface, window_rect, native_rect)
+                else:
+                    pg.transform.scale(
+                        self.native_surface.subsurface(native_rect),
+                        window_rect.size,
+                        self.window_surface.subsurface(window_rect)
+                    )
+                window_rects_list.append(window_rect)
+        profiler.end()
+
+        # Update window, idle frames skip it
+        profiler.begin("display.update")
+        if dirty_rects_list is None:
+            pg.display.update()
+        elif window_rects_list:
+            pg.display.update(window_rects_list)
+        profiler.end()
+
+        profiler.end()
+
+
+class FixedTimestep():
+    # Frame dt in, whole simulation ticks out, the leftover time is how far to interpolate the draw
+
+    def __init__(self, tick_rate, max_ticks_per_frame):
+        # Seconds not simulated yet
+        self.accumulator = 0.0
+
+        # Between the last 2 ticks, 0 is the previous one, 1 the latest
+        self.alpha = 0.0
+
+        # Ticks dropped to catch up, a growing number means the simulation is too slow
+        self.dropped_ticks_count = 0
+
+        self.max_ticks_per_frame = max_ticks_per_frame
+        self.tick_rate = tick_rate
+
+    # SET self.tick_rate:
+        # tick_dt
+    @property
+    def tick_rate(self):
+        return self._tick_rate
+
+    @tick_rate.setter
+    def tick_rate(self, value):
+        self._tick_rate = value
+        self.tick_dt = 1 / value
+
+    # Frame dt -> ticks to run now
+    def advance(self, dt):
+        self.accumulator += dt
+        ticks_count = int(self.accumulator / self.tick_dt)
+
+        # Too far behind? run the limit and drop the rest, or slow ticks pile up more ticks
+        if ticks_count > self.max_ticks_per_frame:
+            self.dropped_ticks_count += ticks_count - self.max_ticks_per_frame
+            ticks_count = self.max_ticks_per_frame
+            self.accumulator = self.accumulator % self.tick_dt + ticks_count * self.tick_dt
+
+        self.accumulator -= ticks_count * self.tick_dt
+        self.alpha = self.accumulator / self.tick_dt
+        return ticks_count
+
+
+class TextCache():
+    # Renders text once, (text, color) -> surface, so unchanged hud text costs nothing per frame
+
+    def __init__(self, font, size):
+        self.font = font
+        self.size = size
+        self.surfaces_dict = OrderedDict()
+
+        # Debug counters
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, text, color):
+        key = (text, color)
+        surface = self.surfaces_dict.get(key)
+
+        # Hit? mark it as recently used
+        if surface is not None:
+            self.hits += 1
+            self.surfaces_dict.move_to_end(key)
+            return surface
+
+        # Miss? render it and drop the least recently used
+        self.misses += 1
+        surface = self.font.render(text, False, color)
+        self.surfaces_dict[key] = surface
+        if len(self.surfaces_dict) > self.size:
+            self.surfaces_dict.popitem(last=False)
+        return surface
+
+
+class Profiler():
+    # Times named scopes every frame, begin / end pairs nest, keeps the last frames around
+
+    def __init__(self, history_frames_count):
+        # Each frame: (start, duration, events list), each event: [name, depth, start, duration]
+        self.frames_deque = deque(maxlen=history_frames_count)
+
+        # Current frame, scopes outside a frame are not recorded, like scenes driven by benchmarks
+        self.is_frame_open = False
+        self.frame_start = perf_counter()
+        self.events_list = []
+        self.open_events_list = []
+
+    def start_frame(self):
+        self.is_frame_open = True
+        self.frame_start = perf_counter()
+        self.events_list = []
+        self.open_events_list = []
+
+    def end_frame(self):
+        # Close scopes left open, an exception or an early return skipped their end
+        while self.open_events_list:
+            self.end()
+        self.is_frame_open = False
+        self.frames_deque.append(
+            (self.frame_start, perf_counter() - self.frame_start, self.events_list)
+        )
+
+    def begin(self, name):
+        if not self.is_frame_open:
+            return
+        event = [name, len(self.open_events_list), perf_counter(), 0.0]
+        self.events_list.append(event)
+        self.open_events_list.append(event)
+
+    def end(self):
+        if not self.open_events_list:
+            return
+        event = self.open_events_list.pop()
+        event[3] = perf_counter() - event[2]
+
+    # Name -> (depth, mean ms per frame) over the history, in first seen order
+    def get_averages_dict(self):
+        totals_dict = {}
+        for frame_start, frame_duration, events_list in self.frames_deque:
+            for name, depth, start, duration in events_list:
+                total = totals_dict.get(name)
+                if total is None:
+                    totals_dict[name] = [depth, duration]
+                else:
+                    total[1] += duration
+        frames_count = max(len(self.frames_deque), 1)
+        return {
+            name: (depth, total * 1000 / frames_count) for name, (depth, total) in totals_dict.items()
+        }
+
+    def draw(self, surface, topleft):
+        budget_ms = 1000 / FPS
+        x, y = topleft
+
+        # Frame times, 1 column per frame, red ones went over budget
+        for i, (frame_start, frame_duration, events_list) in enumerate(self.frames_deque):
+            frame_ms = frame_duration * 1000
+            height = min(int(frame_ms / budget_ms * PROFILER_GRAPH_HEIGHT), PROFILER_GRAPH_HEIGHT * 2)
+            pg.draw.line(
+                surface,
+                "red" if frame_ms > budget_ms else "green",
+                (x + i, y + PROFILER_GRAPH_HEIGHT * 2),
+                (x + i, y + PROFILER_GRAPH_HEIGHT * 2 - height)
+            )
+
+        # Budget line
+        pg.draw.line(
+            surface,
+            "white",
+            (x, y + PROFILER_GRAPH_HEIGHT),
+            (x + PROFILER_HISTORY_FRAMES_COUNT, y + PROFILER_GRAPH_HEIGHT)
+        )
+        y += PROFILER_GRAPH_HEIGHT * 2 + FONT_HEIGHT
+
+        # Scope bars, full width is 1 frame budget
+        for name, (depth, mean_ms) in self.get_averages_dict().items():
+            width = min(int(mean_ms / budget_ms * PROFILER_GRAPH_WIDTH), PROFILER_GRAPH_WIDTH)
+            pg.draw.rect(
+                surface,
+                "grey20",
+                (x, y, PROFILER_GRAPH_WIDTH, FONT_HEIGHT)
+            )
+            pg.draw.rect(
+                surface,
+                "orange" if depth else "yellow",
+                (x, y, width, FONT_HEIGHT)
+            )
+
+            # Means change every frame, caching them would only evict the rest
+            text_surface = FONT.render(
+                f"{'  ' * depth}{name}: {mean_ms:.2f}ms",
+                False,
+                "white"
+            )
+            surface.blit(
+                text_surface,
+                (x + PROFILER_GRAPH_WIDTH + FONT_HEIGHT, y)
+            )
+            y += FONT_HEIGHT + 2
+
+    # Chrome trace event format, open it in chrome://tracing or perfetto
+    def dump_chrome_trace(self, trace_path):
+        if not self.frames_deque:
+            return
+        origin = self.frames_deque[0][0]
+        events_list = []
+        for frame_start, frame_duration, frame_events_list in self.frames_deque:
+            events_list.append(
+                {
+                    "name": "frame",
+                    "ph": "X",
+                    "ts": (frame_start - origin) * 1e6,
+                    "dur": frame_duration * 1e6,
+                    "pid": 0,
+                    "tid": 0,
+                }
+            )
+            for name, depth, start, duration in frame_events_list:
+                events_list.append(
+                    {
+                        "name": name,
+                        "ph": "X",
+                        "ts": (start - origin) * 1e6,
+                        "dur": duration * 1e6,
+                        "pid": 0,
+                        "tid": 0,
+                    }
+                )
+        with open(trace_path, "w") as file:
+            dump({"traceEvents": events_list, "displayTimeUnit": "ms"}, file)
+
+
+profiler = Profiler(PROFILER_HISTORY_FRAMES_COUNT)
+
+
+# Binding text -> (device, modifiers), device is ("key", key code) or ("mouse", button)
+def parse_input_binding(binding):
+    *modifier_names_list, device_name = binding.lower().split("+")
+    modifiers = 0
+    for modifier_name in modifier_names_list:
+        if modifier_name not in INPUT_MODIFIERS_DICT:
+            raise ValueError(f"unknown modifier {modifier_name!r} in {binding!r}")
+        modifiers |= INPUT_MODIFIERS_DICT[modifier_name]
+    if device_name.startswith("mouse "):
+        return ("mouse", int(device_name[len("mouse "):])), modifiers
+    return ("key", pg.key.key_code(device_name)), modifiers
+
+
+# Bindings json path -> action -> bindings list, the json replaces the bindings of the actions it lists
+def load_input_bindings(json_path):
+    bindings_dict = dict(DEFAULT_INPUT_BINDINGS_DICT)
+    if not path.exists(json_path):
+        return bindings_dict
+    with open(json_path, 'r') as file:
+        json_bindings_dict = load(file)
+    for action, bindings_list in json_bindings_dict.items():
+        if not isinstance(bindings_list, list) or not all(isinstance(binding, str) for binding in bindings_list):
+            raise ValueError(f"{json_path}: {action} needs a list of bindings")
+        bindings_dict[action] = bindings_list
+    return bindings_dict
+
+
+class InputMap():
+    # Events -> actions through dict lookups, so the cost per event stays the same however many bindings there are
+    # Pressed and released actions pile up until the scene takes them once per frame, held actions are polled
+
+    def __init__(self, bindings_dict):
+        # (device, modifiers) -> actions list, a device can trigger actions of different scenes
+        self.pressed_bindings_dict = {}
+
+        # Device -> actions list it holds, bindings with modifiers are never held
+        self.held_bindings_dict = {}
+        for action, bindings_list in bindings_dict.items():
+            for binding in bindings_list:
+                try:
+                    device, modifiers = parse_input_binding(binding)
+                except ValueError as error:
+                    raise ValueError(f"{action}: {error}") from None
+                self.pressed_bindings_dict.setdefault(
+                    (device, modifiers), []).append(action)
+                if not modifiers:
+                    self.held_bindings_dict.setdefault(device, []).append(action)
+
+        # Devices down now and how many of them hold each action
+        self.held_devices_set = set()
+        self.held_counts_dict = {}
+
+        # Since the scene last took them
+        self.pressed_actions_list = []
+        self.released_actions_list = []
+
+    def process(self, event):
+        if event.type == pg.KEYDOWN:
+            self.press(("key", event.key), event.mod)
+        elif event.type == pg.KEYUP:
+            self.release(("key", event.key))
+        elif event.type == pg.MOUSEBUTTONDOWN:
+            self.press(("mouse", event.button), pg.key.get_mods())
+        elif event.type == pg.MOUSEBUTTONUP:
+            self.release(("mouse", event.button))
+
+        # Window lost focus? its key ups go elsewhere, let go of everything
+        elif event.type == pg.WINDOWFOCUSLOST:
+            for device in list(self.held_devices_set):
+                self.release(device)
+
+    def press(self, device, mod):
+        modifiers = 0
+        for modifier in INPUT_MODIFIERS_DICT.values():
+            if mod & modifier:
+                modifiers |= modifier
+
+        # No binding with these modifiers? the plain one
+        actions_list = self.pressed_bindings_dict.get((device, modifiers))
+        if actions_list is None:
+            actions_list = self.pressed_bindings_dict.get((device, 0), ())
+        self.pressed_actions_list += actions_list
+
+        if device in self.held_devices_set:
+            return
+        self.held_devices_set.add(device)
+        for action in self.held_bindings_dict.get(device, ()):
+            self.held_counts_dict[action] = self.held_counts_dict.get(action, 0) + 1
+
+    def release(self, device):
+        if device not in self.held_devices_set:
+            return
+        self.held_devices_set.discard(device)
+        for action in self.held_bindings_dict.get(device, ()):
+            self.held_counts_dict[action] -= 1
+            self.released_actions_list.append(action)
+
+    def is_held(self, action):
+        return self.held_counts_dict.get(action, 0) > 0
+
+    # Actions pressed and released since the last call, in event order, the held state stays
+    def pop_actions(self):
+        pressed_actions_list = self.pressed_actions_list
+        released_actions_list = self.released_actions_list
+        self.pressed_actions_list = []
+        self.released_actions_list = []
+        return pressed_actions_list, released_actions_list
+
+
+# Made by init, not at import, so tools can import this module without opening a window
+LAZY_NAMES_LIST = ["FONT", "NATIVE_SURFACE", "game", "text_cache"]
+
+
+# Start pygame and make the lazy resources, safe to call again
+def init():
+    global FONT, NATIVE_SURFACE, game, text_cache
+    if "game" in globals():
+        return
+
+    pg.init()
+
+    # Font
+    FONT = pg.font.Font(
+        FONT_PATH,
+        FONT_HEIGHT
+    )
+
+    # Blit everything here
+    NATIVE_SURFACE = pg.Surface(
+        (
+            NATIVE_RECT.width,
+            NATIVE_RECT.height
+        )
+    )
+
+    text_cache = TextCache(FONT, TEXT_CACHE_SIZE)
+
+    # Opens the window, set last, the rest is ready when someone sees it
+    game = Game()
+
+
+# Other modules reading a lazy resource before init? init first
+def __getattr__(name):
+    if name in LAZY_NAMES_LIST:
+        init()
+        return globals()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
-game = Game()
+# Loaded surfaces, (path, alpha) -> surface, everyone shares these instead of copying
+surfaces_dict = {}
+
+
+# Path -> shared surface, alpha None is the original
+def load_surface(surface_path, alpha=None):
+    key = (surface_path, alpha)
+    surface = surfaces_dict.get(key)
+    if surface is None:
+        # Convert needs the window
+        init()
+
+        # Translucent? copy the original once
+        if alpha is None:
+            surface = pg.image.load(surface_path).convert_alpha()
+        else:
+            surface = load_surface(surface_path).copy()
+            surface.set_alpha(alpha)
+        surfaces_dict[key] = surface
+    return surface
 
 
 class Sprite(pg.sprite.Sprite):
     # Needs a sprite sheet, has regions list to indicate the regions in the sprite sheet that it owns
 
-    def __init__(self, groups, sprite_sheet_surface, position, frames_list, name):
-        super().__init__(groups)
-        # Sprite sheet
-        self.image = sprite_sheet_surface
+    def __init__(self, groups, sprite_sheet_path, position, frames_list, name, sprite_id=0):
+        # Join groups at the end, groups need the position to index this sprite
+        super().__init__()
+        # Sprite sheet, shared with every sprite using it
+        self.image = load_surface(sprite_sheet_path)
         self.rect = self.image.get_frect()
 
-        # Sprite sheet with alpha
-        self.image_translucent = self.image.copy()
-        self.image_translucent.set_alpha(128)
+        # Sprite sheet with alpha, shared too
+        self.image_translucent = load_surface(sprite_sheet_path, 128)
 
         # Frames list
         self.frames_list = frames_list
@@ -137,25 +835,38 @@ class Sprite(pg.sprite.Sprite):
         # Name
         self.name = name
 
+        # Sprite sheet id, groups with an animation clock animate it with the other sprites of this id
+        self.sprite_id = sprite_id
+
+        # Groups
+        self.add(groups)
+
     # SET self.position:
         # self.rect.x
         # self.rect.y
         # self.frame_frect.x
         # self.frame_frect.y
+        # groups spatial index and chunk cache
     @property
     def position(self):
         return self._position
 
     @position.setter
     def position(self, value):
+        # Groups clear the chunks it leaves
+        old_frame_frect = self.frame_frect.copy()
+
         self._position = value
         self.rect.x = self.position.x
         self.rect.y = self.position.y
         self.frame_frect.x = self.position.x
         self.frame_frect.y = self.position.y
+        for group in self.groups():
+            group.move_in_buckets(self, old_frame_frect)
 
     # SET frame_index:
         # self.frame
+        # groups chunk cache
     @property
     def frame_index(self):
         return self._frame_index
@@ -165,78 +876,1928 @@ class Sprite(pg.sprite.Sprite):
         if 0 <= value < self.frames_list_len:
             self._frame_index = value
             self.frame = self.frames_list[self.frame_index]
+            for group in self.groups():
+                group.mark_chunks_dirty(self)
 
 
 class Group(pg.sprite.Group):
     # Acts like a layer, draws each sprite with camera offset
+    # Sprites are bucketed in a uniform grid so draw only visits sprites near the camera
 
-    def __init__(self):
+    def __init__(self, animation_clock=None):
         super().__init__()
+        # Animated sprites read their frame from here, None draws frame_index as is
+        self.animation_clock = animation_clock
+
+        # Bucket (x, y) -> {sprite: None}, a sprite lives in the bucket of its top left
+        self.buckets_dict = {}
+
+        # Sprite -> bucket, to find it again on move / kill
+        self.sprite_bucket_dict = {}
+
+        # Chunk (x, y) -> pre rendered surface of the sprites in it
+        self.chunks_dict = {}
+
+        # Chunks that changed since they were rendered
+        self.dirty_chunks_set = set()
+
+        # Chunk (x, y) -> animation it was rendered with, only chunks with animated sprites
+        self.chunk_animations_dict = {}
+
+    def get_bucket(self, sprite):
+        return (
+            int(sprite.rect.x // SPATIAL_BUCKET_SIZE),
+            int(sprite.rect.y // SPATIAL_BUCKET_SIZE)
+        )
+
+    def add_internal(self, sprite, layer=None):
+        super().add_internal(sprite, layer)
+        self.add_to_buckets(sprite)
+
+    def remove_internal(self, sprite):
+        super().remove_internal(sprite)
+        self.remove_from_buckets(sprite)
+
+    def add_to_buckets(self, sprite):
+        bucket = self.get_bucket(sprite)
+        self.buckets_dict.setdefault(bucket, {})[sprite] = None
+        self.sprite_bucket_dict[sprite] = bucket
+        self.mark_chunks_dirty(sprite)
+
+    def remove_from_buckets(self, sprite):
+        bucket = self.sprite_bucket_dict.pop(sprite)
+        bucket_sprites = self.buckets_dict[bucket]
+        del bucket_sprites[sprite]
+        # Empty bucket? forget it
+        if not bucket_sprites:
+            del self.buckets_dict[bucket]
+        self.mark_chunks_dirty(sprite)
+
+    # Sprite moved, move it to its new bucket, the chunks it left and the ones it is in need a re render
+    def move_in_buckets(self, sprite, old_frame_frect):
+        bucket = self.get_bucket(sprite)
+        old_bucket = self.sprite_bucket_dict[sprite]
+        if bucket != old_bucket:
+            bucket_sprites = self.buckets_dict[old_bucket]
+            del bucket_sprites[sprite]
+            # Empty bucket? forget it
+            if not bucket_sprites:
+                del self.buckets_dict[old_bucket]
+            self.buckets_dict.setdefault(bucket, {})[sprite] = None
+            self.sprite_bucket_dict[sprite] = bucket
+        self.mark_chunks_dirty_in_frect(old_frame_frect)
+        self.mark_chunks_dirty(sprite)
+
+    # Camera -> sprites that may overlap it
+    def get_sprites_in_frect(self, frect):
+        # Sprites are smaller than a bucket, so start 1 bucket before to catch the ones that poke in
+        left = int(frect.left // SPATIAL_BUCKET_SIZE) - 1
+        top = int(frect.top // SPATIAL_BUCKET_SIZE) - 1
+        right = int(frect.right // SPATIAL_BUCKET_SIZE)
+        bottom = int(frect.bottom // SPATIAL_BUCKET_SIZE)
+        for y in range(top, bottom + 1):
+            for x in range(left, right + 1):
+                bucket_sprites = self.buckets_dict.get((x, y))
+                if bucket_sprites:
+                    yield from bucket_sprites
+
+    # Sprite changed, its chunks need a re render
+    def mark_chunks_dirty(self, sprite):
+        self.mark_chunks_dirty_in_frect(sprite.frame_frect)
+
+    def mark_chunks_dirty_in_frect(self, frect):
+        left = int(frect.left // CHUNK_WIDTH)
+        top = int(frect.top // CHUNK_HEIGHT)
+        right = int((frect.right - 1) // CHUNK_WIDTH)
+        bottom = int((frect.bottom - 1) // CHUNK_HEIGHT)
+        for y in range(top, bottom + 1):
+            for x in range(left, right + 1):
+                self.dirty_chunks_set.add((x, y))
+
+    # Sprites with an id set in is_id_array that may overlap frect -> their in game frects
+    def get_frects_with_ids(self, frect, is_id_array):
+        return [
+            sprite.frame_frect.copy() for sprite in self.get_sprites_in_frect(frect)
+            if is_id_array[sprite.sprite_id]
+        ]
+
+    # Sprite -> frame to draw, frame_index moved on by the clock of its sprite id
+    def get_frame(self, sprite):
+        if self.animation_clock is None:
+            return sprite.frame
+        return sprite.frames_list[
+            self.animation_clock.get_frame_index(sprite.sprite_id, sprite.frame_index)
+        ]
+
+    # Chunk -> surface, None if there is nothing in it
+    def render_chunk(self, chunk):
+        chunk_frect = pg.FRect(
+            chunk[0] * CHUNK_WIDTH,
+            chunk[1] * CHUNK_HEIGHT,
+            CHUNK_WIDTH,
+            CHUNK_HEIGHT
+        )
+        chunk_surface = self.chunks_dict.get(chunk)
+        is_empty = True
+        # Animated sprites and the rect they cover in the chunk
+        animated_ids_list = []
+        animated_rects_list = []
+        for sprite in self.get_sprites_in_frect(chunk_frect):
+            if chunk_surface is None:
+                chunk_surface = pg.Surface(
+                    (CHUNK_WIDTH, CHUNK_HEIGHT), pg.SRCALPHA
+                )
+            if is_empty:
+                chunk_surface.fill((0, 0, 0, 0))
+                is_empty = False
+            rect = chunk_surface.blit(
+                sprite.image,
+                (
+                    sprite.rect.x - chunk_frect.x,
+                    sprite.rect.y - chunk_frect.y
+                ),
+                self.get_frame(sprite),
+            )
+            if self.animation_clock is not None and self.animation_clock.is_animated_array[sprite.sprite_id]:
+                animated_ids_list.append(sprite.sprite_id)
+                animated_rects_list.append(rect)
+
+        # Nothing in it? forget it
+        self.chunk_animations_dict.pop(chunk, None)
+        if is_empty:
+            self.chunks_dict.pop(chunk, None)
+            return None
+        self.chunks_dict[chunk] = chunk_surface
+
+        # Animated sprites in it? re render it when their clocks move
+        if animated_ids_list:
+            self.chunk_animations_dict[chunk] = self.animation_clock.get_animation(
+                np.array(animated_ids_list),
+                pg.FRect(animated_rects_list[0].unionall(animated_rects_list[1:])).move(chunk_frect.topleft)
+            )
+        return chunk_surface
 
     def draw(self, camera_frect, group):
-        # Draw each sprite in this group
-        for sprite in self:
+        # Not the selected group? choose translucent version
+        is_translucent = group is not self
+
+        # Translucent sprites blend 1 at a time, a chunk blended as a whole would show their overlaps once
+        if game.is_chunk_cache and not is_translucent:
+            self.draw_chunks(camera_frect)
+        else:
+            self.draw_sprites(camera_frect, is_translucent)
+
+        if game.is_debug:
+            self.draw_debug(camera_frect)
+
+    def draw_chunks(self, camera_frect):
+        left = int(camera_frect.left // CHUNK_WIDTH)
+        top = int(camera_frect.top // CHUNK_HEIGHT)
+        right = int(camera_frect.right // CHUNK_WIDTH)
+        bottom = int(camera_frect.bottom // CHUNK_HEIGHT)
+        for y in range(top, bottom + 1):
+            for x in range(left, right + 1):
+                chunk = (x, y)
+
+                # Changed or animated since? re render it, else reuse it
+                animation = self.chunk_animations_dict.get(chunk)
+                if chunk in self.dirty_chunks_set or (animation and self.animation_clock.is_stale(animation)):
+                    self.dirty_chunks_set.discard(chunk)
+                    chunk_surface = self.render_chunk(chunk)
+                else:
+                    chunk_surface = self.chunks_dict.get(chunk)
+
+                # Nothing here? check other chunk
+                if chunk_surface is None:
+                    continue
+
+                # Render with camera offset position
+                NATIVE_SURFACE.blit(
+                    chunk_surface,
+                    (
+                        x * CHUNK_WIDTH - camera_frect.x,
+                        y * CHUNK_HEIGHT - camera_frect.y
+                    )
+                )
+
+    def draw_sprites(self, camera_frect, is_translucent):
+        # Draw each sprite near the camera in this group
+        for sprite in self.get_sprites_in_frect(camera_frect):
             # Original or translucnet version?
             image = sprite.image
-
-            # Not on group? choose translucent version
-            if group != sprite.groups()[0]:
+            if is_translucent:
                 image = sprite.image_translucent
 
+            # Render with camera offset position
+            NATIVE_SURFACE.blit(
+                image,
+                (
+                    sprite.rect.x - camera_frect.x,
+                    sprite.rect.y - camera_frect.y
+                ),
+                self.get_frame(sprite),
+            )
+
+    def draw_debug(self, camera_frect):
+        for sprite in self.get_sprites_in_frect(camera_frect):
             # Get camera offset position
             sprite_rect_render_position = (
                 sprite.rect.x - camera_frect.x,
                 sprite.rect.y - camera_frect.y
             )
 
-            # Render with camera offset position
+            # Render frame in real position
             NATIVE_SURFACE.blit(
-                image,
-                sprite_rect_render_position,
+                sprite.image,
+                (sprite.rect.x, sprite.rect.y),
                 sprite.frame,
             )
 
-            # Debug draw
-            if game.is_debug:
-                # Render frame in real position
-                NATIVE_SURFACE.blit(
+            # Render sprite sheet rect in real position
+            pg.draw.rect(
+                NATIVE_SURFACE,
+                "red",
+                sprite.rect,
+                1
+            )
+
+            # Render frame rect in real position
+            pg.draw.rect(
+                NATIVE_SURFACE,
+                "green",
+                sprite.frame_frect,
+                1
+            )
+
+            # Draw frame rect with camera offset
+            pg.draw.rect(
+                NATIVE_SURFACE,
+                "red",
+                pg.FRect(
+                    sprite_rect_render_position[0],
+                    sprite_rect_render_position[1],
+                    sprite.frame_frect.width,
+                    sprite.frame_frect.height
+                ),
+                1
+            )
+
+
+# Sprite sheet json bytes -> names list, frame starts array, frames array, bitmasks array
+def compile_atlas(json_bytes):
+    json_data = loads(json_bytes)
+    names_list = list(json_data)
+
+    # Id i frames are frames_array[frame_starts_array[i]:frame_starts_array[i + 1]], id 0 is air
+    frames_counts_list = [0] + [
+        len(json_data[name]["frames_list"]) for name in names_list
+    ]
+    frame_starts_array = np.zeros(len(frames_counts_list) + 1, np.uint32)
+    np.cumsum(frames_counts_list, out=frame_starts_array[1:])
+    frames_array = np.array(
+        [
+            (frame["x"], frame["y"], frame["w"], frame["h"])
+            for name in names_list
+            for frame in json_data[name]["frames_list"]
+        ],
+        np.int16
+    ).reshape(-1, 4)
+
+    # Id, mask id -> frame index, -1 if that sprite has no such bitmask
+    bitmasks_array = np.full((len(names_list) + 1, 256), -1, np.int16)
+    for sprite_id, name in enumerate(names_list, 1):
+        for mask_id, frame_index in json_data[name]["bitmasks"].items():
+            bitmasks_array[sprite_id, int(mask_id)] = frame_index
+
+    return names_list, frame_starts_array, frames_array, bitmasks_array
+
+
+# Atlas cache -> (json mtime, json size, json hash), compiled atlas, None if it is missing or broken
+def load_atlas_cache(cache_path):
+    try:
+        with open(cache_path, 'rb') as file:
+            data = file.read()
+        magic, version, mtime_ns, size, digest, names_count, frames_count, names_size = ATLAS_CACHE_HEADER_STRUCT.unpack_from(
+            data
+        )
+        if magic != ATLAS_CACHE_MAGIC or version != ATLAS_CACHE_VERSION:
+            return None
+
+        offset = ATLAS_CACHE_HEADER_STRUCT.size
+        names_list = data[offset:offset + names_size].decode("utf-8").split("\n")
+        offset += names_size
+
+        # Arrays start aligned, in file order, a cut off file is too short for them
+        arrays_list = []
+        for dtype, shape in (
+            ("<u4", (names_count + 2,)),
+            ("<i2", (frames_count, 4)),
+            ("<i2", (names_count + 1, 256)),
+        ):
+            offset = -(-offset // ATLAS_CACHE_ALIGNMENT) * ATLAS_CACHE_ALIGNMENT
+            count = int(np.prod(shape))
+            arrays_list.append(
+                np.frombuffer(data, dtype, count, offset).reshape(shape)
+            )
+            offset += count * np.dtype(dtype).itemsize
+    except (OSError, ValueError, UnicodeDecodeError):
+        return None
+    return (mtime_ns, size, digest), (names_list, *arrays_list)
+
+
+def save_atlas_cache(cache_path, json_stamp, atlas):
+    mtime_ns, size, digest = json_stamp
+    names_list, frame_starts_array, frames_array, bitmasks_array = atlas
+    names = "\n".join(names_list).encode("utf-8")
+    with open(cache_path, 'wb') as file:
+        file.write(
+            ATLAS_CACHE_HEADER_STRUCT.pack(
+                ATLAS_CACHE_MAGIC,
+                ATLAS_CACHE_VERSION,
+                mtime_ns,
+                size,
+                digest,
+                len(names_list),
+                len(frames_array),
+                len(names)
+            )
+        )
+        file.write(names)
+        for array, dtype in (
+            (frame_starts_array, "<u4"),
+            (frames_array, "<i2"),
+            (bitmasks_array, "<i2"),
+        ):
+            file.write(bytes(-file.tell() % ATLAS_CACHE_ALIGNMENT))
+            file.write(array.astype(dtype).tobytes())
+
+
+# Sprite sheet json -> compiled atlas, from the cache next to it when the json did not change
+def load_atlas(json_path):
+    cache_path = path.splitext(json_path)[0] + ATLAS_CACHE_EXTENSION
+    json_stat_result = stat(json_path)
+    json_stat = (json_stat_result.st_mtime_ns, json_stat_result.st_size)
+    cache = load_atlas_cache(cache_path)
+
+    # Same mtime and size? trust it without reading the json
+    if cache and cache[0][:2] == json_stat:
+        return cache[1]
+
+    # Touched but same bytes? still good
+    with open(json_path, 'rb') as file:
+        json_bytes = file.read()
+    digest = sha1(json_bytes).digest()
+    if cache and cache[0][2] == digest:
+        atlas = cache[1]
+    else:
+        atlas = compile_atlas(json_bytes)
+
+    # Write next to it then swap, a read only checkout just compiles every time
+    # Each process gets its own temp file, batch workers rebuild a stale cache at the same time
+    temp_path = None
+    try:
+        file_descriptor, temp_path = mkstemp(
+            ROOM_TEMP_EXTENSION, path.basename(cache_path), path.dirname(cache_path) or "."
+        )
+        close(file_descriptor)
+        save_atlas_cache(temp_path, (*json_stat, digest), atlas)
+        replace(temp_path, cache_path)
+    except OSError:
+        if temp_path and path.exists(temp_path):
+            remove(temp_path)
+    return atlas
+
+
+class SpriteSheet():
+    # Sprite sheet surface and json data, gives each sprite name an id so rooms can store ids instead of sprites
+
+    def __init__(self, png_path, json_path):
+        # Surfaces
+        self.surface = load_surface(png_path)
+        self.surface_translucent = load_surface(png_path, 128)
+
+        # Compiled json, parsed once then loaded from its cache
+        names_list, frame_starts_array, frames_array, self.bitmasks_array = load_atlas(
+            json_path
+        )
+
+        # To iterate over the sprites
+        self.sprite_names_list = names_list
+
+        # Id -> sprite data, id 0 is air
+        self.names_list = [None] + self.sprite_names_list
+        self.ids_dict = {
+            name: i for i, name in enumerate(self.names_list) if name}
+        frames_list = [tuple(frame) for frame in frames_array.tolist()]
+        frame_starts_list = frame_starts_array.tolist()
+        self.frames_lists = [
+            frames_list[frame_starts_list[i]:frame_starts_list[i + 1]] for i in range(len(self.names_list))
+        ]
+        # Autotile kinds, they have at least 1 bitmask
+        self.is_autotile_list = (self.bitmasks_array >= 0).any(axis=1).tolist()
+        # Big tiles bottom left is snapped to grid, so they are drawn this much higher
+        self.offsets_y_list = [0] + [
+            frames_list[0][3] - TILE_SIZE for frames_list in self.frames_lists[1:]
+        ]
+        # Biggest frame width and height, what any frame of a sprite can cover
+        self.max_frame_sizes_list = [(0, 0)] + [
+            (max(frame[2] for frame in frames_list), max(frame[3] for frame in frames_list))
+            for frames_list in self.frames_lists[1:]
+        ]
+        self.is_entity_list = [False] + [
+            name.endswith(ENTITY_NAME_SUFFIX) for name in self.sprite_names_list
+        ]
+        self.is_entity_array = np.array(self.is_entity_list)
+
+        # Name -> frames list
+        self.sprite_sheet_dict = {
+            name: {
+                "frames_list": self.frames_lists[i],
+            } for i, name in enumerate(self.names_list) if name
+        }
+
+        # Id -> kind id, ground sprites share the first ground id, air stays 0
+        self.kind_ids_array = np.arange(len(self.names_list), dtype=np.uint16)
+        ground_ids_list = [
+            self.ids_dict[name] for name in GROUND_NAMES_LIST if name in self.ids_dict
+        ]
+        if ground_ids_list:
+            self.kind_ids_array[ground_ids_list] = min(ground_ids_list)
+
+        # Id -> collision kind, air and unlisted sprites let actors through
+        self.collision_kinds_array = np.full(
+            len(self.names_list), COLLISION_AIR, np.uint8
+        )
+        for names_list, collision_kind in (
+            (SOLID_NAMES_LIST, COLLISION_SOLID),
+            (ONE_WAY_NAMES_LIST, COLLISION_ONE_WAY),
+            (HAZARD_NAMES_LIST, COLLISION_HAZARD)
+        ):
+            self.collision_kinds_array[
+                [self.ids_dict[name] for name in names_list if name in self.ids_dict]
+            ] = collision_kind
+
+        # How many tiles a sprite can poke out of its cell, right and up
+        self.margin_tile_unit = (
+            max(
+                -(-frames_list[0][2] // TILE_SIZE) - 1
+                for frames_list in self.frames_lists[1:]
+            ),
+            max(
+                -(-offset_y // TILE_SIZE)
+                for offset_y in self.offsets_y_list
+            )
+        )
+
+        # Animated sprites step together, everything drawing with this sheet shares the clock
+        self.animation_clock = AnimationClock(self)
+
+
+class AnimationClock():
+    # 1 step counter per animated sprite id, every tile and actor of that id reads it instead of counting its own
+
+    def __init__(self, sprite_sheet):
+        ids_count = len(sprite_sheet.names_list)
+        max_frames_count = max(len(frames_list) for frames_list in sprite_sheet.frames_lists)
+        max_cycle_len = max(
+            [len(cycles_list[0]) for _, cycles_list in ANIMATIONS_DICT.values()] + [1]
+        )
+
+        # Id, frame index, step -> frame index to draw, frames in no cycle stay on themselves
+        self.frames_table = np.tile(
+            np.arange(max_frames_count, dtype=np.uint16)[None, :, None],
+            (ids_count, 1, max_cycle_len)
+        )
+        # Id -> seconds per step, 0 is still, and steps before the cycle starts over
+        self.durations_array = np.zeros(ids_count)
+        self.cycle_lens_array = np.ones(ids_count, np.int64)
+        for name, (duration, cycles_list) in ANIMATIONS_DICT.items():
+            sprite_id = sprite_sheet.ids_dict.get(name)
+            if sprite_id is None:
+                continue
+            cycle_len = len(cycles_list[0])
+            for cycle in cycles_list:
+                for position, frame_index in enumerate(cycle):
+                    for step in range(cycle_len):
+                        self.frames_table[sprite_id, frame_index, step] = cycle[
+                            (position + step) % cycle_len
+                        ]
+            self.durations_array[sprite_id] = duration / 1000
+            self.cycle_lens_array[sprite_id] = cycle_len
+        self.animated_ids = np.flatnonzero(self.durations_array)
+        self.is_animated_array = self.durations_array > 0
+
+        # Id -> current step, still sprites stay at 0
+        self.steps_array = np.zeros(ids_count, np.int64)
+        self.time = 0.0
+
+    # Every animated id steps at once, whatever the number of tiles and actors using it
+    def update(self, dt):
+        self.time += dt
+        animated_ids = self.animated_ids
+        self.steps_array[animated_ids] = (
+            self.time // self.durations_array[animated_ids]
+        ).astype(np.int64) % self.cycle_lens_array[animated_ids]
+
+    # Sprite ids array, frame indexes array -> frame indexes to draw
+    def get_frame_indexes(self, sprite_ids, frame_indexes):
+        return self.frames_table[sprite_ids, frame_indexes, self.steps_array[sprite_ids]]
+
+    def get_frame_index(self, sprite_id, frame_index):
+        return int(self.frames_table[sprite_id, frame_index, self.steps_array[sprite_id]])
+
+    # Sprite ids in a rendered chunk, in game frect they cover -> its animation, (animated ids, their steps, frect), None if still
+    def get_animation(self, sprite_ids, frect):
+        sprite_ids = np.unique(sprite_ids)
+        sprite_ids = sprite_ids[self.is_animated_array[sprite_ids]]
+        if not len(sprite_ids):
+            return None
+        return sprite_ids, self.steps_array[sprite_ids].copy(), frect
+
+    # Animation from get_animation -> clocks moved since it was rendered
+    def is_stale(self, animation):
+        return bool((self.steps_array[animation[0]] != animation[1]).any())
+
+    # Chunk animations dict, camera -> in game frects of stale chunk animations the camera sees
+    def get_stale_frects(self, chunk_animations_dict, camera_frect):
+        return [
+            animation[2] for animation in chunk_animations_dict.values()
+            if animation[2].colliderect(camera_frect) and self.is_stale(animation)
+        ]
+
+
+class TileMap():
+    # A layer of tiles, stores a sprite id and a frame index per cell in arrays instead of a sprite per cell
+
+    def __init__(self, sprite_sheet, topleft_tile_unit, width_tile_unit, height_tile_unit, sprite_ids=None, frame_indexes=None):
+        self.sprite_sheet = sprite_sheet
+
+        # Room position and size
+        self.topleft_tile_unit = topleft_tile_unit
+        self.width_tile_unit = width_tile_unit
+        self.height_tile_unit = height_tile_unit
+
+        # Cells, 0 is air, loaded rooms hand over their arrays
+        if sprite_ids is None:
+            sprite_ids = np.zeros(
+                (height_tile_unit, width_tile_unit), np.uint16
+            )
+        if frame_indexes is None:
+            frame_indexes = np.zeros(
+                (height_tile_unit, width_tile_unit), np.uint16
+            )
+        self.sprite_ids = sprite_ids
+        self.frame_indexes = frame_indexes
+
+        # Chunk (x, y) -> pre rendered surface of the still tiles in it
+        self.chunks_dict = {}
+
+        # Chunks that changed since they were rendered
+        self.dirty_chunks_set = set()
+
+        # Animated tiles get their own chunks on top, re rendered when their clocks move and the still ones are not
+        self.animated_chunks_dict = {}
+        self.dirty_animated_chunks_set = set()
+
+        # Chunk (x, y) -> animation its animated chunk was rendered with
+        self.chunk_animations_dict = {}
+
+        # Tiles placed or removed since the last autotile
+        self.dirty_tile_units_set = set()
+
+        # Recording? list of (ys, xs, old sprite ids, old frame indexes, new sprite ids, new frame indexes) in change order
+        self.changes_list = None
+
+    # Local coordinate -> sprite id
+    def get_tile(self, x_tile_unit, y_tile_unit):
+        return int(self.sprite_ids[y_tile_unit, x_tile_unit])
+
+    # Recording? keep the changes, arrays or lists of local coordinates and values
+    def record_changes(self, ys, xs, old_sprite_ids, old_frame_indexes, sprite_ids, frame_indexes):
+        self.changes_list.append(
+            (ys, xs, old_sprite_ids, old_frame_indexes, sprite_ids, frame_indexes)
+        )
+
+    # Recorded changes -> flat indexes array, values array of old id, old frame, new id, new frame
+    # A cell keeps its first old and its last new values, cells back to where they started are dropped
+    def pop_changes(self):
+        changes_list = self.changes_list
+        self.changes_list = None
+        if not changes_list:
+            return None
+        ys, xs, *values_list = (
+            np.concatenate([np.asarray(change[i], np.int64) for change in changes_list]) for i in range(6)
+        )
+        all_indexes = ys * self.width_tile_unit + xs
+        indexes, first_positions = np.unique(all_indexes, return_index=True)
+        # Unique on the reversed indexes gives the last positions in the same order
+        last_positions = len(all_indexes) - 1 - \
+            np.unique(all_indexes[::-1], return_index=True)[1]
+        values = np.stack(
+            (
+                values_list[0][first_positions],
+                values_list[1][first_positions],
+                values_list[2][last_positions],
+                values_list[3][last_positions]
+            ),
+            axis=1
+        ).astype(np.uint16)
+        is_changed = (values[:, :2] != values[:, 2:]).any(axis=1)
+        if not is_changed.any():
+            return None
+        return indexes[is_changed].astype(np.uint32), values[is_changed]
+
+    # Set sprite id and frame index with local coordinate
+    def set_tile(self, x_tile_unit, y_tile_unit, sprite_id, frame_index=0):
+        old_sprite_id = int(self.sprite_ids[y_tile_unit, x_tile_unit])
+        old_frame_index = int(self.frame_indexes[y_tile_unit, x_tile_unit])
+        if old_sprite_id == sprite_id and old_frame_index == frame_index:
+            return
+        if self.changes_list is not None:
+            self.record_changes(
+                [y_tile_unit], [x_tile_unit], [old_sprite_id], [old_frame_index], [sprite_id], [frame_index]
+            )
+        self.sprite_ids[y_tile_unit, x_tile_unit] = sprite_id
+        self.frame_indexes[y_tile_unit, x_tile_unit] = frame_index
+        self.mark_chunks_dirty(x_tile_unit, y_tile_unit, old_sprite_id)
+        self.mark_chunks_dirty(x_tile_unit, y_tile_unit, sprite_id)
+
+        # Autotile kind placed or removed? autotile it and its neighbours on the next autotile_dirty
+        is_autotile_list = self.sprite_sheet.is_autotile_list
+        if is_autotile_list[old_sprite_id] or is_autotile_list[sprite_id]:
+            self.dirty_tile_units_set.add((x_tile_unit, y_tile_unit))
+
+    # Set frame index with local coordinate
+    def set_frame_index(self, x_tile_unit, y_tile_unit, frame_index):
+        old_frame_index = int(self.frame_indexes[y_tile_unit, x_tile_unit])
+        if old_frame_index == frame_index:
+            return
+        if self.changes_list is not None:
+            sprite_id = int(self.sprite_ids[y_tile_unit, x_tile_unit])
+            self.record_changes(
+                [y_tile_unit], [x_tile_unit], [sprite_id], [old_frame_index], [sprite_id], [frame_index]
+            )
+        self.frame_indexes[y_tile_unit, x_tile_unit] = frame_index
+        self.mark_chunks_dirty(
+            x_tile_unit, y_tile_unit, int(
+                self.sprite_ids[y_tile_unit, x_tile_unit])
+        )
+
+    # Every chunk needs a re render
+    def mark_all_chunks_dirty(self):
+        left = self.topleft_tile_unit[0] * TILE_SIZE // CHUNK_WIDTH
+        top = self.topleft_tile_unit[1] * TILE_SIZE // CHUNK_HEIGHT
+        right = (
+            (self.topleft_tile_unit[0] + self.width_tile_unit) * TILE_SIZE - 1
+        ) // CHUNK_WIDTH
+        bottom = (
+            (self.topleft_tile_unit[1] + self.height_tile_unit) * TILE_SIZE - 1
+        ) // CHUNK_HEIGHT
+        # Big tiles poke 1 chunk up and right at most
+        for y in range(top - 1, bottom + 1):
+            for x in range(left, right + 2):
+                self.dirty_chunks_set.add((x, y))
+                self.dirty_animated_chunks_set.add((x, y))
+
+    # Autotile every tile at once
+    def autotile(self):
+        self.dirty_tile_units_set.clear()
+        self.autotile_rect(0, 0, self.width_tile_unit, self.height_tile_unit)
+
+    # Autotile the dirty tiles and their neighbours once, no matter how many times they changed
+    def autotile_dirty(self):
+        if not self.dirty_tile_units_set:
+            return
+        xs = np.array([tile_unit[0] for tile_unit in self.dirty_tile_units_set])
+        ys = np.array([tile_unit[1] for tile_unit in self.dirty_tile_units_set])
+        self.dirty_tile_units_set.clear()
+        self.autotile_tile_units(xs, ys)
+
+    # Autotile local coordinate arrays and their neighbours in 1 pass
+    def autotile_tile_units(self, xs, ys):
+        # Tiles bounding rect grown by 1
+        left = max(int(xs.min()) - 1, 0)
+        top = max(int(ys.min()) - 1, 0)
+        right = min(int(xs.max()) + 2, self.width_tile_unit)
+        bottom = min(int(ys.max()) + 2, self.height_tile_unit)
+
+        # Tiles and their 1 ring, tiles padded by 1 so the 9 shifted views stay inside
+        tiles = np.zeros((bottom - top + 2, right - left + 2), bool)
+        tiles[ys - top + 1, xs - left + 1] = True
+        region = np.zeros((bottom - top, right - left), bool)
+        for dy in (0, 1, 2):
+            for dx in (0, 1, 2):
+                region |= tiles[dy:dy + bottom - top, dx:dx + right - left]
+        self.autotile_rect(left, top, right, bottom, region)
+
+    # Autotile tiles in local rect, region limits it further to some tiles in it
+    def autotile_rect(self, left, top, right, bottom, region=None):
+        # Rect grown by 1 for the neighbours, outside room is air
+        grown_left = max(left - 1, 0)
+        grown_top = max(top - 1, 0)
+        grown_right = min(right + 1, self.width_tile_unit)
+        grown_bottom = min(bottom + 1, self.height_tile_unit)
+
+        # Sprite id -> kind
+        kind_ids = np.pad(
+            self.sprite_sheet.kind_ids_array[
+                self.sprite_ids[grown_top:grown_bottom, grown_left:grown_right]
+            ],
+            (
+                (1 - (top - grown_top), 1 - (grown_bottom - bottom)),
+                (1 - (left - grown_left), 1 - (grown_right - right))
+            )
+        )
+        center = kind_ids[1:-1, 1:-1]
+        is_tile = center != 0
+
+        # Neighbour is same kind? shifted array compare
+        def is_same_kind(dx, dy):
+            neighbour = kind_ids[
+                1 + dy:kind_ids.shape[0] - 1 + dy,
+                1 + dx:kind_ids.shape[1] - 1 + dx
+            ]
+            return (neighbour == center) & is_tile
+
+        # Raw bits
+        t = is_same_kind(0, -1)
+        r = is_same_kind(1, 0)
+        b = is_same_kind(0, 1)
+        l = is_same_kind(-1, 0)
+        tr = is_same_kind(1, -1) & t & r
+        tl = is_same_kind(-1, -1) & t & l
+        br = is_same_kind(1, 1) & b & r
+        bl = is_same_kind(-1, 1) & b & l
+        mask_ids = (
+            (br.astype(np.uint8) << 7) | (b.astype(np.uint8) << 6) |
+            (bl.astype(np.uint8) << 5) | (r.astype(np.uint8) << 4) |
+            (l.astype(np.uint8) << 3) | (tr.astype(np.uint8) << 2) |
+            (t.astype(np.uint8) << 1) | tl.astype(np.uint8)
+        )
+
+        # Mask id -> frame index with each tile own bitmasks, no bitmask keeps its frame
+        sprite_ids = self.sprite_ids[top:bottom, left:right]
+        old_frame_indexes = self.frame_indexes[top:bottom, left:right]
+        frame_indexes = self.sprite_sheet.bitmasks_array[sprite_ids, mask_ids]
+        is_changed = (frame_indexes >= 0) & (frame_indexes != old_frame_indexes)
+        if region is not None:
+            is_changed &= region
+        ys, xs = np.nonzero(is_changed)
+        if not len(ys):
+            return
+        if self.changes_list is not None:
+            self.record_changes(
+                top + ys,
+                left + xs,
+                sprite_ids[ys, xs],
+                old_frame_indexes[ys, xs],
+                sprite_ids[ys, xs],
+                frame_indexes[ys, xs]
+            )
+        old_frame_indexes[ys, xs] = frame_indexes[ys, xs]
+
+        # Changed tiles need their chunks re rendered
+        if len(ys) > AUTOTILE_MARK_ALL_CHUNKS_DIRTY_COUNT:
+            self.mark_all_chunks_dirty()
+            return
+        for y, x, sprite_id in zip(ys.tolist(), xs.tolist(), sprite_ids[ys, xs].tolist()):
+            self.mark_chunks_dirty(left + x, top + y, sprite_id)
+
+    # Write a block of cells with its topleft at a local coordinate, mask picks the cells to write, 1 autotile pass at the end
+    # Returns changed local ys, xs and their old sprite ids
+    def write_block(self, left, top, sprite_ids, frame_indexes, mask=None):
+        height, width = sprite_ids.shape
+        if mask is None:
+            mask = np.ones((height, width), bool)
+
+        # Clip to the room
+        clip_left = max(left, 0)
+        clip_top = max(top, 0)
+        clip_right = min(left + width, self.width_tile_unit)
+        clip_bottom = min(top + height, self.height_tile_unit)
+        empty = np.zeros(0, np.int64)
+        if clip_left >= clip_right or clip_top >= clip_bottom:
+            return empty, empty, empty
+        block_slices = (
+            slice(clip_top - top, clip_bottom - top),
+            slice(clip_left - left, clip_right - left)
+        )
+        sprite_ids = sprite_ids[block_slices]
+        frame_indexes = frame_indexes[block_slices]
+        old_sprite_ids = self.sprite_ids[clip_top:clip_bottom, clip_left:clip_right]
+        old_frame_indexes = self.frame_indexes[clip_top:clip_bottom, clip_left:clip_right]
+
+        ys, xs = np.nonzero(
+            mask[block_slices] & (
+                (old_sprite_ids != sprite_ids) | (old_frame_indexes != frame_indexes)
+            )
+        )
+        if not len(ys):
+            return empty, empty, empty
+        changed_old_sprite_ids = old_sprite_ids[ys, xs]
+        if self.changes_list is not None:
+            self.record_changes(
+                clip_top + ys,
+                clip_left + xs,
+                changed_old_sprite_ids,
+                old_frame_indexes[ys, xs],
+                sprite_ids[ys, xs],
+                frame_indexes[ys, xs]
+            )
+        old_sprite_ids[ys, xs] = sprite_ids[ys, xs]
+        old_frame_indexes[ys, xs] = frame_indexes[ys, xs]
+        ys += clip_top
+        xs += clip_left
+
+        # Changed tiles need their chunks re rendered
+        if len(ys) > AUTOTILE_MARK_ALL_CHUNKS_DIRTY_COUNT:
+            self.mark_all_chunks_dirty()
+        else:
+            for y, x, old_sprite_id, sprite_id in zip(
+                ys.tolist(),
+                xs.tolist(),
+                changed_old_sprite_ids.tolist(),
+                self.sprite_ids[ys, xs].tolist()
+            ):
+                self.mark_chunks_dirty(x, y, old_sprite_id)
+                self.mark_chunks_dirty(x, y, sprite_id)
+
+        self.autotile_tile_units(xs, ys)
+        return ys, xs, changed_old_sprite_ids
+
+    # Local coordinate -> mask of the cells 4 way connected to it with its sprite id
+    def get_flood_mask(self, x_tile_unit, y_tile_unit):
+        is_match = self.sprite_ids == self.sprite_ids[y_tile_unit, x_tile_unit]
+
+        # Runs of matching cells in each row, row major, ends are exclusive
+        edges = np.diff(
+            np.pad(is_match.astype(np.int8), ((0, 0), (1, 1))), axis=1
+        )
+        run_ys, run_starts = np.nonzero(edges == 1)
+        run_ends = np.nonzero(edges == -1)[1]
+        row_starts = np.searchsorted(run_ys, np.arange(self.height_tile_unit + 1))
+
+        # Flood runs instead of cells, a run touches the runs it overlaps in the rows above and below
+        run_ys = run_ys.tolist()
+        run_starts = run_starts.tolist()
+        run_ends = run_ends.tolist()
+        row_starts = row_starts.tolist()
+        first_run = row_starts[y_tile_unit] + next(
+            i for i in range(row_starts[y_tile_unit + 1] - row_starts[y_tile_unit])
+            if run_starts[row_starts[y_tile_unit] + i] <= x_tile_unit < run_ends[row_starts[y_tile_unit] + i]
+        )
+        mask = np.zeros((self.height_tile_unit, self.width_tile_unit), bool)
+        is_seen = {first_run}
+        runs_list = [first_run]
+        while runs_list:
+            run = runs_list.pop()
+            y = run_ys[run]
+            mask[y, run_starts[run]:run_ends[run]] = True
+            for other_y in (y - 1, y + 1):
+                if not 0 <= other_y < self.height_tile_unit:
+                    continue
+                for other_run in range(row_starts[other_y], row_starts[other_y + 1]):
+                    if other_run not in is_seen and run_starts[other_run] < run_ends[run] and run_starts[run] < run_ends[other_run]:
+                        is_seen.add(other_run)
+                        runs_list.append(other_run)
+        return mask
+
+    # Write cells by flat index without autotiling them, undo and redo write cells that were autotiled already
+    def write_cells(self, indexes, sprite_ids, frame_indexes):
+        ys, xs = np.divmod(indexes, self.width_tile_unit)
+        old_sprite_ids = self.sprite_ids[ys, xs]
+        self.sprite_ids[ys, xs] = sprite_ids
+        self.frame_indexes[ys, xs] = frame_indexes
+
+        # Changed tiles need their chunks re rendered
+        if len(indexes) > AUTOTILE_MARK_ALL_CHUNKS_DIRTY_COUNT:
+            self.mark_all_chunks_dirty()
+            return
+        for y, x, old_sprite_id, sprite_id in zip(
+            ys.tolist(), xs.tolist(), old_sprite_ids.tolist(), sprite_ids.tolist()
+        ):
+            self.mark_chunks_dirty(x, y, old_sprite_id)
+            self.mark_chunks_dirty(x, y, sprite_id)
+
+    # Local coordinate -> in game frect of the sprite there
+    def get_tile_frect(self, x_tile_unit, y_tile_unit, sprite_id):
+        frame = self.sprite_sheet.frames_lists[sprite_id][0]
+        return pg.FRect(
+            (self.topleft_tile_unit[0] + x_tile_unit) * TILE_SIZE,
+            (self.topleft_tile_unit[1] + y_tile_unit) *
+            TILE_SIZE - self.sprite_sheet.offsets_y_list[sprite_id],
+            frame[2],
+            frame[3]
+        )
+
+    # In game frect -> local tile range of the tiles that may overlap it, big tiles poke right and up so look further left and down
+    def get_tile_range(self, frect):
+        margin_tile_unit = self.sprite_sheet.margin_tile_unit
+        left = int(frect.left // TILE_SIZE) - \
+            self.topleft_tile_unit[0] - margin_tile_unit[0]
+        top = int(frect.top // TILE_SIZE) - self.topleft_tile_unit[1]
+        right = int((frect.right - 1) // TILE_SIZE) - \
+            self.topleft_tile_unit[0] + 1
+        bottom = int((frect.bottom - 1) // TILE_SIZE) - \
+            self.topleft_tile_unit[1] + margin_tile_unit[1] + 1
+        return (
+            max(left, 0),
+            max(top, 0),
+            min(right, self.width_tile_unit),
+            min(bottom, self.height_tile_unit)
+        )
+
+    # Tiles with an id set in is_id_array that may overlap frect -> their in game frects, entities are drawn by their group
+    def get_frects_with_ids(self, frect, is_id_array):
+        left, top, right, bottom = self.get_tile_range(frect)
+        if left >= right or top >= bottom:
+            return []
+        sprite_ids = self.sprite_ids[top:bottom, left:right]
+        ys, xs = np.nonzero(
+            is_id_array[sprite_ids] & ~self.sprite_sheet.is_entity_array[sprite_ids]
+        )
+        return [
+            self.get_tile_frect(left + x, top + y, sprite_id)
+            for y, x, sprite_id in zip(ys.tolist(), xs.tolist(), sprite_ids[ys, xs].tolist())
+        ]
+
+    # Tile changed, its chunks need a re render
+    # Animated tiles decide which still tiles go on the animated layer, so they dirty both layers
+    def mark_chunks_dirty(self, x_tile_unit, y_tile_unit, sprite_id):
+        # Air or entity? Not in chunks
+        if sprite_id == 0 or self.sprite_sheet.is_entity_list[sprite_id]:
+            return
+        is_animated = self.sprite_sheet.animation_clock.is_animated_array[sprite_id]
+        frect = self.get_tile_frect(x_tile_unit, y_tile_unit, sprite_id)
+        left = int(frect.left // CHUNK_WIDTH)
+        top = int(frect.top // CHUNK_HEIGHT)
+        right = int((frect.right - 1) // CHUNK_WIDTH)
+        bottom = int((frect.bottom - 1) // CHUNK_HEIGHT)
+        for y in range(top, bottom + 1):
+            for x in range(left, right + 1):
+                self.dirty_chunks_set.add((x, y))
+                if is_animated or (x, y) in self.animated_chunks_dict:
+                    self.dirty_animated_chunks_set.add((x, y))
+
+    # Tiles in blit order -> which go on the animated layer
+    # Animated tiles and every tile after one of them that covers a tile already on it, so overlaps keep their order
+    def get_animated_layer_mask(self, ys, xs, sprite_ids):
+        is_animated = self.sprite_sheet.animation_clock.is_animated_array[sprite_ids]
+        is_layer = is_animated.copy()
+        if not is_animated.any():
+            return is_layer
+        offsets_y_list = self.sprite_sheet.offsets_y_list
+        max_frame_sizes_list = self.sprite_sheet.max_frame_sizes_list
+        layer_rects_list = []
+        first = int(np.argmax(is_animated))
+        for i, (y, x, sprite_id) in enumerate(
+            zip(ys[first:].tolist(), xs[first:].tolist(), sprite_ids[first:].tolist()), first
+        ):
+            rect = pg.Rect(
+                x * TILE_SIZE,
+                y * TILE_SIZE - offsets_y_list[sprite_id],
+                *max_frame_sizes_list[sprite_id]
+            )
+            if is_layer[i] or rect.collidelist(layer_rects_list) >= 0:
+                is_layer[i] = True
+                layer_rects_list.append(rect)
+        return is_layer
+
+    # Blit tiles that may overlap frect, frect topleft lands on surface topleft, animated tiles at their clock frame
+    # is_animated None blits every tile, True only the animated layer, False the rest, see get_animated_layer_mask
+    # Returns the blitted sprite ids, with the in game frect their animated tiles cover when asked, None if there are none
+    def blit_tiles_in_frect(self, surface, image, frect, is_entity_included=False, is_animated=None, is_bounds_returned=False):
+        left, top, right, bottom = self.get_tile_range(frect)
+        if left >= right or top >= bottom:
+            sprite_ids = np.zeros(0, np.uint16)
+            return (sprite_ids, None) if is_bounds_returned else sprite_ids
+
+        # Skip air and entities, entities are drawn by their group unless asked for
+        sprite_ids = self.sprite_ids[top:bottom, left:right]
+        frame_indexes = self.frame_indexes[top:bottom, left:right]
+        is_drawn = sprite_ids != 0
+        if not is_entity_included:
+            is_drawn &= ~self.sprite_sheet.is_entity_array[sprite_ids]
+        animation_clock = self.sprite_sheet.animation_clock
+        ys, xs = np.nonzero(is_drawn)
+        sprite_ids = sprite_ids[ys, xs]
+        if is_animated is not None:
+            is_layer = self.get_animated_layer_mask(ys, xs, sprite_ids) == is_animated
+            ys = ys[is_layer]
+            xs = xs[is_layer]
+            sprite_ids = sprite_ids[is_layer]
+        frames_lists = self.sprite_sheet.frames_lists
+        offsets_y_list = self.sprite_sheet.offsets_y_list
+        origin_x = (self.topleft_tile_unit[0] + left) * TILE_SIZE - frect.x
+        origin_y = (self.topleft_tile_unit[1] + top) * TILE_SIZE - frect.y
+        # 1 call for every tile, the loop runs in C
+        rects_list = surface.blits(
+            [
+                (
                     image,
-                    (sprite.rect.x, sprite.rect.y),
-                    sprite.frame,
+                    (
+                        origin_x + x * TILE_SIZE,
+                        origin_y + y * TILE_SIZE - offsets_y_list[sprite_id]
+                    ),
+                    frames_lists[sprite_id][frame_index],
                 )
+                for y, x, sprite_id, frame_index in zip(
+                    ys.tolist(),
+                    xs.tolist(),
+                    sprite_ids.tolist(),
+                    animation_clock.get_frame_indexes(
+                        sprite_ids, frame_indexes[ys, xs]
+                    ).tolist()
+                )
+            ],
+            doreturn=is_bounds_returned
+        )
+        if not is_bounds_returned:
+            return sprite_ids
+        # Still tiles over animated ones look the same every step
+        rects_list = [
+            rect for rect, is_animated in zip(
+                rects_list, animation_clock.is_animated_array[sprite_ids].tolist()
+            ) if is_animated
+        ]
+        if not rects_list:
+            return sprite_ids, None
+        return sprite_ids, pg.FRect(rects_list[0].unionall(rects_list[1:])).move(frect.topleft)
+
+    # Chunk -> surface, None if there is nothing in it
+    def render_chunk(self, chunk):
+        chunk_frect = pg.FRect(
+            chunk[0] * CHUNK_WIDTH,
+            chunk[1] * CHUNK_HEIGHT,
+            CHUNK_WIDTH,
+            CHUNK_HEIGHT
+        )
+        chunk_surface = self.chunks_dict.get(chunk)
+        if chunk_surface is None:
+            chunk_surface = pg.Surface(
+                (CHUNK_WIDTH, CHUNK_HEIGHT), pg.SRCALPHA
+            )
+        chunk_surface.fill((0, 0, 0, 0))
+
+        # Nothing in it? forget it
+        if not len(self.blit_tiles_in_frect(chunk_surface, self.sprite_sheet.surface, chunk_frect, is_animated=False)):
+            self.chunks_dict.pop(chunk, None)
+            return None
+        self.chunks_dict[chunk] = chunk_surface
+        return chunk_surface
+
+    # Chunk -> surface of its animated tiles at their clock frames, None if there are none
+    def render_animated_chunk(self, chunk):
+        chunk_frect = pg.FRect(
+            chunk[0] * CHUNK_WIDTH,
+            chunk[1] * CHUNK_HEIGHT,
+            CHUNK_WIDTH,
+            CHUNK_HEIGHT
+        )
+        chunk_surface = self.animated_chunks_dict.get(chunk)
+        if chunk_surface is None:
+            chunk_surface = pg.Surface(
+                (CHUNK_WIDTH, CHUNK_HEIGHT), pg.SRCALPHA
+            )
+        chunk_surface.fill((0, 0, 0, 0))
+
+        # Nothing in it? forget it
+        self.chunk_animations_dict.pop(chunk, None)
+        sprite_ids, bounds_frect = self.blit_tiles_in_frect(
+            chunk_surface, self.sprite_sheet.surface, chunk_frect, is_animated=True, is_bounds_returned=True
+        )
+        if not len(sprite_ids):
+            self.animated_chunks_dict.pop(chunk, None)
+            return None
+        self.animated_chunks_dict[chunk] = chunk_surface
+
+        # Re render it when these clocks move
+        self.chunk_animations_dict[chunk] = self.sprite_sheet.animation_clock.get_animation(
+            sprite_ids, bounds_frect
+        )
+        return chunk_surface
+
+    def draw(self, camera_frect, is_translucent):
+        # Translucent tiles blend 1 at a time, a chunk blended as a whole would show their overlaps once
+        if game.is_chunk_cache and not is_translucent:
+            self.draw_chunks(camera_frect)
+        else:
+            self.draw_tiles(camera_frect, is_translucent)
+
+    def draw_chunks(self, camera_frect):
+        animation_clock = self.sprite_sheet.animation_clock
+        left = int(camera_frect.left // CHUNK_WIDTH)
+        top = int(camera_frect.top // CHUNK_HEIGHT)
+        right = int(camera_frect.right // CHUNK_WIDTH)
+        bottom = int(camera_frect.bottom // CHUNK_HEIGHT)
+        for y in range(top, bottom + 1):
+            for x in range(left, right + 1):
+                chunk = (x, y)
+
+                # Changed? re render it, else reuse it
+                if chunk in self.dirty_chunks_set:
+                    self.dirty_chunks_set.discard(chunk)
+                    chunk_surface = self.render_chunk(chunk)
+                else:
+                    chunk_surface = self.chunks_dict.get(chunk)
+
+                # Animated tiles changed or clocks moved? re render only the animated layer, the still one stays as it is
+                animation = self.chunk_animations_dict.get(chunk)
+                if chunk in self.dirty_animated_chunks_set or (animation and animation_clock.is_stale(animation)):
+                    self.dirty_animated_chunks_set.discard(chunk)
+                    animated_chunk_surface = self.render_animated_chunk(chunk)
+                else:
+                    animated_chunk_surface = self.animated_chunks_dict.get(chunk)
+
+                for surface in (chunk_surface, animated_chunk_surface):
+                    # Nothing here? check other chunk
+                    if surface is None:
+                        continue
+
+                    # Render with camera offset position
+                    NATIVE_SURFACE.blit(
+                        surface,
+                        (
+                            x * CHUNK_WIDTH - camera_frect.x,
+                            y * CHUNK_HEIGHT - camera_frect.y
+                        )
+                    )
+
+    def draw_tiles(self, camera_frect, is_translucent):
+        # Original or translucent version?
+        image = self.sprite_sheet.surface
+        if is_translucent:
+            image = self.sprite_sheet.surface_translucent
+
+        # Render each tile the camera sees with camera offset position
+        self.blit_tiles_in_frect(NATIVE_SURFACE, image, camera_frect)
+
+
+class EditHistory():
+    # Undo / redo of tile maps, each entry is 1 stroke of changed cells instead of a copy of the layers
+
+    def __init__(self, tile_maps_list, size):
+        self.tile_maps_list = tile_maps_list
+
+        # Entry: list of (layer index, flat indexes array, values array of old id, old frame, new id, new frame)
+        self.undo_deque = deque(maxlen=size)
+        self.redo_list = []
+
+        # Tile maps are recording
+        self.is_stroke_open = False
+
+    # Start recording, every change until end_stroke becomes 1 entry
+    def begin_stroke(self):
+        if self.is_stroke_open:
+            return
+        self.is_stroke_open = True
+        for tile_map in self.tile_maps_list:
+            tile_map.changes_list = []
+
+    def end_stroke(self):
+        if not self.is_stroke_open:
+            return
+        self.is_stroke_open = False
+        entry = []
+        for i, tile_map in enumerate(self.tile_maps_list):
+            changes = tile_map.pop_changes()
+            if changes:
+                entry.append((i, *changes))
+        if entry:
+            self.undo_deque.append(entry)
+            self.redo_list.clear()
+
+    # Latest entry -> old values written back, returns the entry, None if there is none
+    def undo(self):
+        self.end_stroke()
+        if not self.undo_deque:
+            return None
+        entry = self.undo_deque.pop()
+        for i, indexes, values in entry:
+            self.tile_maps_list[i].write_cells(indexes, values[:, 0], values[:, 1])
+        self.redo_list.append(entry)
+        return entry
+
+    # Latest undone entry -> new values written again, returns the entry, None if there is none
+    def redo(self):
+        self.end_stroke()
+        if not self.redo_list:
+            return None
+        entry = self.redo_list.pop()
+        for i, indexes, values in entry:
+            self.tile_maps_list[i].write_cells(indexes, values[:, 2], values[:, 3])
+        self.undo_deque.append(entry)
+        return entry
+
+
+class TileCollider():
+    # Moves actor boxes through a tile layer, actors are arrays of lefts, tops, widths and heights in pixels
+    # Each actor only reads the tiles its box enters, so a tick costs the tiles touched, not the room size
+
+    def __init__(self, tile_map):
+        self.tile_map = tile_map
+        self.collision_kinds_array = tile_map.sprite_sheet.collision_kinds_array
+
+    # Coordinate arrays -> collision kinds array, outside the room is solid like get_tile_from_room -1
+    def get_kinds(self, xs_tile_unit, ys_tile_unit):
+        tile_map = self.tile_map
+        xs = xs_tile_unit - tile_map.topleft_tile_unit[0]
+        ys = ys_tile_unit - tile_map.topleft_tile_unit[1]
+        is_inside = (
+            (xs >= 0) & (xs < tile_map.width_tile_unit) &
+            (ys >= 0) & (ys < tile_map.height_tile_unit)
+        )
+        kinds = np.full(len(xs), COLLISION_SOLID, np.uint8)
+        kinds[is_inside] = self.collision_kinds_array[
+            tile_map.sprite_ids[ys[is_inside], xs[is_inside]]
+        ]
+        return kinds
+
+    # Boxes along 1 axis -> new starts array, hit mask
+    # Tile lines the leading edge enters are checked in move order, the first blocking one stops the box flush with it
+    def sweep(self, starts, sizes, cross_starts, cross_sizes, deltas, is_vertical):
+        ends = starts + sizes
+        is_forward = deltas > 0
+        steps = np.where(is_forward, 1, -1)
+        first_lines = np.where(
+            is_forward,
+            np.ceil(ends / TILE_SIZE),
+            np.floor(starts / TILE_SIZE) - 1
+        ).astype(np.int64)
+        last_lines = np.where(
+            is_forward,
+            np.ceil((ends + deltas) / TILE_SIZE) - 1,
+            np.floor((starts + deltas) / TILE_SIZE)
+        ).astype(np.int64)
+        lines_counts = (last_lines - first_lines) * steps + 1
+        cross_firsts = np.floor(cross_starts / TILE_SIZE).astype(np.int64)
+        cross_counts = np.ceil(
+            (cross_starts + cross_sizes) / TILE_SIZE
+        ).astype(np.int64) - cross_firsts
+
+        new_starts = starts + deltas
+        is_hit = np.zeros(len(starts), bool)
+
+        # Boxes still moving, indexes into the arrays
+        active = np.flatnonzero(lines_counts > 0)
+        k = 0
+        while len(active):
+            lines = first_lines[active] + k * steps[active]
+            is_blocked = np.zeros(len(active), bool)
+            for r in range(int(cross_counts[active].max())):
+                is_row = cross_counts[active] > r
+                crosses = cross_firsts[active][is_row] + r
+                if is_vertical:
+                    kinds = self.get_kinds(crosses, lines[is_row])
+                    # One way tiles only stop boxes going down, lines entered going down are always below the box
+                    is_blocked[is_row] |= (kinds == COLLISION_SOLID) | (
+                        (kinds == COLLISION_ONE_WAY) & is_forward[active][is_row]
+                    )
+                else:
+                    kinds = self.get_kinds(lines[is_row], crosses)
+                    is_blocked[is_row] |= kinds == COLLISION_SOLID
+
+            # Blocked? flush with the line, forward stops before it, backward after it
+            hits = active[is_blocked]
+            hit_lines = lines[is_blocked]
+            new_starts[hits] = np.where(
+                is_forward[hits],
+                hit_lines * TILE_SIZE - sizes[hits],
+                (hit_lines + 1) * TILE_SIZE
+            )
+            is_hit[hits] = True
+
+            k += 1
+            active = active[~is_blocked]
+            active = active[lines_counts[active] > k]
+        return new_starts, is_hit
+
+    def move_x(self, lefts, tops, widths, heights, dxs):
+        return self.sweep(lefts, widths, tops, heights, dxs, False)
+
+    def move_y(self, lefts, tops, widths, heights, dys):
+        return self.sweep(tops, heights, lefts, widths, dys, True)
+
+    # Boxes -> mask of the ones overlapping a hazard tile
+    def get_hazard_mask(self, lefts, tops, widths, heights):
+        xs = np.floor(lefts / TILE_SIZE).astype(np.int64)
+        ys = np.floor(tops / TILE_SIZE).astype(np.int64)
+        xs_counts = np.ceil((lefts + widths) / TILE_SIZE).astype(np.int64) - xs
+        ys_counts = np.ceil((tops + heights) / TILE_SIZE).astype(np.int64) - ys
+        is_hazard = np.zeros(len(lefts), bool)
+        if not len(lefts):
+            return is_hazard
+        for r in range(int(ys_counts.max())):
+            for c in range(int(xs_counts.max())):
+                is_cell = (ys_counts > r) & (xs_counts > c)
+                is_hazard[is_cell] |= self.get_kinds(
+                    xs[is_cell] + c, ys[is_cell] + r
+                ) == COLLISION_HAZARD
+        return is_hazard
+
+
+# Boxes arrays -> (i, j) arrays of overlapping boxes, i < j, each pair once
+# Broadphase: boxes are bucketed by their top left like in Group, only boxes in neighbouring buckets get compared
+def get_overlapping_pairs(lefts, tops, widths, heights):
+    boxes_count = len(lefts)
+    buckets_xs = np.floor(lefts / SPATIAL_BUCKET_SIZE).astype(np.int64)
+    buckets_ys = np.floor(tops / SPATIAL_BUCKET_SIZE).astype(np.int64)
+    stride = 1 << 32
+    keys = buckets_ys * stride + buckets_xs
+    order = np.argsort(keys, kind="stable")
+    sorted_keys = keys[order]
+    positions = np.arange(boxes_count)
+
+    # Own bucket and half of the neighbours, the other half find this bucket themselves
+    is_list = []
+    js_list = []
+    for dx, dy in ((0, 0), (1, 0), (-1, 1), (0, 1), (1, 1)):
+        if dx == 0 and dy == 0:
+            # Own bucket, only the boxes sorted after this one
+            firsts = positions + 1
+        else:
+            firsts = np.searchsorted(sorted_keys, sorted_keys + dy * stride + dx, "left")
+        lasts = np.searchsorted(sorted_keys, sorted_keys + dy * stride + dx, "right")
+        counts = np.maximum(lasts - firsts, 0)
+        total = int(counts.sum())
+        if not total:
+            continue
+        offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+        is_list.append(order[np.repeat(positions, counts)])
+        js_list.append(order[np.repeat(firsts, counts) + offsets])
+    if not is_list:
+        return np.zeros(0, np.int64), np.zeros(0, np.int64)
+    is_array = np.concatenate(is_list)
+    js_array = np.concatenate(js_list)
+
+    # Narrowphase, boxes touching edges do not overlap
+    is_overlapping = (
+        (lefts[is_array] < lefts[js_array] + widths[js_array]) &
+        (lefts[js_array] < lefts[is_array] + widths[is_array]) &
+        (tops[is_array] < tops[js_array] + heights[js_array]) &
+        (tops[js_array] < tops[is_array] + heights[is_array])
+    )
+    is_array = is_array[is_overlapping]
+    js_array = js_array[is_overlapping]
+    return np.minimum(is_array, js_array), np.maximum(is_array, js_array)
+
+
+class RoomData():
+    # Room settings and tile layers, what room files hold
+
+    def __init__(self, sprite_sheet, sprite_sheet_path, topleft_room_unit, scale, arrays_list=None):
+        self.sprite_sheet = sprite_sheet
+        self.sprite_sheet_path = sprite_sheet_path
+
+        # Room settings
+        self.topleft_room_unit = topleft_room_unit
+        self.scale = scale
+
+        # Room size: To make the arrays
+        self.width_tile_unit = ROOM_WIDTH_TILE_UNIT * self.scale[0]
+        self.height_tile_unit = ROOM_HEIGHT_tile_unit * self.scale[1]
+
+        # To get / set tile from arrays
+        self.topleft_tile_unit = (
+            self.topleft_room_unit[0] * ROOM_WIDTH_TILE_UNIT,
+            self.topleft_room_unit[1] * ROOM_HEIGHT_tile_unit
+        )
+
+        # For drawing limit and bringing camera to rect
+        self.topleft = (
+            self.topleft_room_unit[0] * ROOM_WIDTH,
+            self.topleft_room_unit[1] * ROOM_HEIGHT
+        )
+        self.width = self.width_tile_unit * TILE_SIZE
+        self.height = self.height_tile_unit * TILE_SIZE
+
+        # Tile layers, (sprite ids, frame indexes) per layer or empty
+        if arrays_list is None:
+            arrays_list = [(None, None)] * ROOM_LAYERS_COUNT
+        self.tile_maps_list = [
+            TileMap(
+                self.sprite_sheet,
+                self.topleft_tile_unit,
+                self.width_tile_unit,
+                self.height_tile_unit,
+                sprite_ids,
+                frame_indexes
+            ) for sprite_ids, frame_indexes in arrays_list
+        ]
+
+    # Copy that does not change when this one is edited, cheap enough for the main loop
+    def snapshot(self):
+        return RoomData(
+            self.sprite_sheet,
+            self.sprite_sheet_path,
+            self.topleft_room_unit,
+            self.scale,
+            [
+                (tile_map.sprite_ids.copy(), tile_map.frame_indexes.copy())
+                for tile_map in self.tile_maps_list
+            ]
+        )
+
+
+# Room file path -> room data, format by extension
+def load_room_data(room_path, sprite_sheet):
+    if room_path.endswith(ROOM_BINARY_EXTENSION):
+        return load_room_binary(room_path, sprite_sheet)
+    return load_room_json(room_path, sprite_sheet)
+
+
+# Save room data, format by extension
+def save_room_data(room_path, room_data):
+    # Write next to it then swap, a crash never leaves half a room behind
+    temp_path = room_path + ROOM_TEMP_EXTENSION
+    try:
+        if room_path.endswith(ROOM_BINARY_EXTENSION):
+            save_room_binary(temp_path, room_data)
+        else:
+            save_room_json(temp_path, room_data)
+        replace(temp_path, room_path)
+    except BaseException:
+        if path.exists(temp_path):
+            remove(temp_path)
+        raise
+
+
+# Room file path -> (topleft room unit, scale) without loading its tiles
+def read_room_header(room_path):
+    if room_path.endswith(ROOM_BINARY_EXTENSION):
+        with open(room_path, 'rb') as file:
+            magic, version, topleft_x, topleft_y, scale_x, scale_y, layers_count, names_count = ROOM_BINARY_HEADER_STRUCT.unpack(
+                file.read(ROOM_BINARY_HEADER_STRUCT.size)
+            )
+        if magic != ROOM_BINARY_MAGIC or version != ROOM_BINARY_VERSION:
+            raise ValueError(f"{room_path} is not a version {ROOM_BINARY_VERSION} binary room")
+        return (topleft_x, topleft_y), (scale_x, scale_y)
+
+    # Json has no header, parse it all
+    with open(room_path, 'r') as file:
+        json_data = load(file)
+    return (
+        (json_data["room_topleft_room_unit_x"], json_data["room_topleft_room_unit_y"]),
+        (json_data["room_scale_x"], json_data["room_scale_y"])
+    )
+
+
+# Room paths -> bounds in room unit, rooms with a broken header are left out, runs on a thread
+def read_room_rects_dict(room_paths_list):
+    room_rects_dict = {}
+    for room_path in room_paths_list:
+        try:
+            topleft_room_unit, scale = read_room_header(room_path)
+        except Exception:
+            continue
+        room_rects_dict[room_path] = pg.Rect(topleft_room_unit, scale)
+    return room_rects_dict
+
+
+# Rooms dir -> biggest N of roomN files in any format, temp files too
+def get_latest_room_index(rooms_dir_path):
+    latest_room_index = 0
+    for filename in listdir(rooms_dir_path):
+        match = ROOM_FILENAME_PATTERN.match(filename)
+        if match:
+            latest_room_index = max(latest_room_index, int(match[1]))
+    return latest_room_index
+
+
+def load_room_json(room_path, sprite_sheet):
+    with open(room_path, 'r') as file:
+        json_data = load(file)
+
+    room_data = RoomData(
+        sprite_sheet,
+        json_data["sprite_sheet_path"],
+        (
+            json_data["room_topleft_room_unit_x"],
+            json_data["room_topleft_room_unit_y"]
+        ),
+        (
+            json_data["room_scale_x"],
+            json_data["room_scale_y"]
+        )
+    )
+
+    for tile_map, room in zip(room_data.tile_maps_list, json_data["rooms_list"]):
+        if not room:
+            continue
+        sprite_ids = np.array(
+            [sprite_sheet.ids_dict[cell["name"]] for cell in room], np.uint16
+        )
+        frame_indexes = np.array(
+            [cell["frame_index"] for cell in room], np.uint16
+        )
+        # Position -> local cell, big tiles bottom left is snapped to grid
+        xs = np.array(
+            [cell["position_x"] for cell in room]
+        ) // TILE_SIZE - room_data.topleft_tile_unit[0]
+        ys = (
+            np.array([cell["position_y"] for cell in room]) +
+            np.array(sprite_sheet.offsets_y_list)[sprite_ids]
+        ) // TILE_SIZE - room_data.topleft_tile_unit[1]
+        xs = xs.astype(np.int64)
+        ys = ys.astype(np.int64)
+        is_inside = (
+            (0 <= xs) & (xs < room_data.width_tile_unit) &
+            (0 <= ys) & (ys < room_data.height_tile_unit)
+        )
+        tile_map.sprite_ids[ys[is_inside], xs[is_inside]] = sprite_ids[is_inside]
+        tile_map.frame_indexes[ys[is_inside],
+                               xs[is_inside]] = frame_indexes[is_inside]
+        tile_map.mark_all_chunks_dirty()
+
+    return room_data
+
+
+def save_room_json(room_path, room_data):
+    # Cells -> dict per tile
+    processed_rooms_list = []
+    for tile_map in room_data.tile_maps_list:
+        processed_room = []
+        ys, xs = np.nonzero(tile_map.sprite_ids)
+        for y, x in zip(ys.tolist(), xs.tolist()):
+            sprite_id = int(tile_map.sprite_ids[y, x])
+            frame_frect = tile_map.get_tile_frect(x, y, sprite_id)
+            processed_cell = {
+                "name": room_data.sprite_sheet.names_list[sprite_id],
+                "position_x": frame_frect.x,
+                "position_y": frame_frect.y,
+                "frame_index": int(tile_map.frame_indexes[y, x]),
+            }
+            processed_room.append(processed_cell)
+        processed_rooms_list.append(processed_room)
+
+    # Package room data
+    data = {
+        "sprite_sheet_path": room_data.sprite_sheet_path,
+        "room_topleft_room_unit_x": room_data.topleft_room_unit[0],
+        "room_topleft_room_unit_y": room_data.topleft_room_unit[1],
+        "room_scale_x": room_data.scale[0],
+        "room_scale_y": room_data.scale[1],
+        "room_width_tile_unit": room_data.width_tile_unit,
+        "room_height_tile_unit": room_data.height_tile_unit,
+        "room_width": room_data.width,
+        "room_height": room_data.height,
+        "rooms_list": processed_rooms_list
+    }
+
+    # Serialize the room data to JSON and save it to a file
+    with open(room_path, "w") as f:
+        dump(data, f, indent=4)
+
+
+# Binary room:
+    # header: magic, version, room_topleft_room_unit_x / y, room_scale_x / y, layers count, names count
+    # sprite_sheet_path: uint16 length, utf-8
+    # sprite names table, id 1 onward: uint8 length, utf-8 each
+    # zero padding to ROOM_BINARY_ALIGNMENT
+    # per layer: uint16 sprite ids array, uint16 frame indexes array, row by row
+def load_room_binary(room_path, sprite_sheet):
+    with open(room_path, 'rb') as file:
+        header = file.read(ROOM_BINARY_HEADER_STRUCT.size)
+        magic, version, topleft_x, topleft_y, scale_x, scale_y, layers_count, names_count = ROOM_BINARY_HEADER_STRUCT.unpack(
+            header
+        )
+        if magic != ROOM_BINARY_MAGIC or version != ROOM_BINARY_VERSION:
+            raise ValueError(f"{room_path} is not a version {ROOM_BINARY_VERSION} binary room")
+
+        # Sprite sheet path
+        length = int.from_bytes(file.read(2), "little")
+        sprite_sheet_path = file.read(length).decode("utf-8")
+
+        # File sprite names table, id 0 is air
+        names_list = [None]
+        for _ in range(names_count):
+            length = file.read(1)[0]
+            names_list.append(file.read(length).decode("utf-8"))
+        offset = -(-file.tell() // ROOM_BINARY_ALIGNMENT) * ROOM_BINARY_ALIGNMENT
+
+    room_data = RoomData(
+        sprite_sheet,
+        sprite_sheet_path,
+        (topleft_x, topleft_y),
+        (scale_x, scale_y)
+    )
 
-                # Render sprite sheet rect in real position
-                pg.draw.rect(
-                    NATIVE_SURFACE,
-                    "red",
-                    sprite.rect,
-                    1
+    # Map the arrays, copy on write so the editor can change them without touching the file
+    arrays = np.memmap(
+        room_path,
+        np.uint16,
+        "c",
+        offset,
+        (layers_count, 2, room_data.height_tile_unit, room_data.width_tile_unit)
+    )
+
+    # File ids are the sprite sheet ids? use the mapped arrays as they are, else remap them
+    sprite_ids_array = np.array(
+        [0] + [sprite_sheet.ids_dict[name] for name in names_list[1:]], np.uint16
+    )
+    is_same_ids = np.array_equal(
+        sprite_ids_array, np.arange(len(sprite_ids_array))
+    )
+    arrays_list = []
+    for layer in arrays:
+        sprite_ids = layer[0] if is_same_ids else sprite_ids_array[layer[0]]
+        arrays_list.append((sprite_ids, layer[1]))
+
+    room_data.tile_maps_list = [
+        TileMap(
+            sprite_sheet,
+            room_data.topleft_tile_unit,
+            room_data.width_tile_unit,
+            room_data.height_tile_unit,
+            sprite_ids,
+            frame_indexes
+        ) for sprite_ids, frame_indexes in arrays_list
+    ]
+    for tile_map in room_data.tile_maps_list:
+        tile_map.mark_all_chunks_dirty()
+    return room_data
+
+
+def save_room_binary(room_path, room_data):
+    sprite_sheet_path = room_data.sprite_sheet_path.encode("utf-8")
+    names_list = room_data.sprite_sheet.names_list[1:]
+    with open(room_path, 'wb') as file:
+        file.write(
+            ROOM_BINARY_HEADER_STRUCT.pack(
+                ROOM_BINARY_MAGIC,
+                ROOM_BINARY_VERSION,
+                room_data.topleft_room_unit[0],
+                room_data.topleft_room_unit[1],
+                room_data.scale[0],
+                room_data.scale[1],
+                len(room_data.tile_maps_list),
+                len(names_list)
+            )
+        )
+        file.write(len(sprite_sheet_path).to_bytes(2, "little"))
+        file.write(sprite_sheet_path)
+        for name in names_list:
+            name = name.encode("utf-8")
+            file.write(bytes([len(name)]))
+            file.write(name)
+        file.write(bytes(-file.tell() % ROOM_BINARY_ALIGNMENT))
+        for tile_map in room_data.tile_maps_list:
+            file.write(tile_map.sprite_ids.astype("<u2").tobytes())
+            file.write(tile_map.frame_indexes.astype("<u2").tobytes())
+
+
+# Room files store paths with forward slashes, they work everywhere, windows saves used to write backslashes
+def get_portable_path(file_path):
+    return file_path.replace("\\", "/")
+
+
+# Room data -> problems list, empty if it is fine
+def validate_room_data(room_data):
+    problems_list = []
+    sprite_sheet = room_data.sprite_sheet
+
+    if room_data.sprite_sheet_path != get_portable_path(room_data.sprite_sheet_path):
+        problems_list.append(
+            f"sprite_sheet_path {room_data.sprite_sheet_path!r} has backslashes")
+    elif not path.exists(room_data.sprite_sheet_path):
+        problems_list.append(
+            f"sprite_sheet_path {room_data.sprite_sheet_path!r} does not exist")
+
+    # Frame index past the last frame of its sprite
+    frames_counts_array = np.array(
+        [len(frames_list) for frames_list in sprite_sheet.frames_lists]
+    )
+    for i, tile_map in enumerate(room_data.tile_maps_list):
+        if tile_map.sprite_ids.max(initial=0) >= len(frames_counts_array):
+            problems_list.append(f"layer {i} has unknown sprite ids")
+            continue
+        ys, xs = np.nonzero(
+            (tile_map.sprite_ids != 0) &
+            (tile_map.frame_indexes >= frames_counts_array[tile_map.sprite_ids])
+        )
+        for y, x in zip(ys.tolist()[:8], xs.tolist()[:8]):
+            sprite_id = int(tile_map.sprite_ids[y, x])
+            problems_list.append(
+                f"layer {i} tile ({x}, {y}) {sprite_sheet.names_list[sprite_id]} frame {int(tile_map.frame_indexes[y, x])} of {frames_counts_array[sprite_id]}"
+            )
+        if len(ys) > 8:
+            problems_list.append(f"layer {i} has {len(ys) - 8} more bad frame indexes")
+    return problems_list
+
+
+# 1 raster chunk -> surface scaled to its part of the result, runs on a raster thread
+def rasterize_chunk(tile_maps_list, groups_list, chunk_frect, size):
+    chunk_surface = pg.Surface(chunk_frect.size, pg.SRCALPHA)
+    for i, tile_map in enumerate(tile_maps_list):
+        # No groups? entities come from the arrays
+        tile_map.blit_tiles_in_frect(
+            chunk_surface,
+            tile_map.sprite_sheet.surface,
+            chunk_frect,
+            groups_list is None
+        )
+        if groups_list is not None:
+            for sprite in groups_list[i].get_sprites_in_frect(chunk_frect):
+                chunk_surface.blit(
+                    sprite.image,
+                    (
+                        sprite.rect.x - chunk_frect.x,
+                        sprite.rect.y - chunk_frect.y
+                    ),
+                    groups_list[i].get_frame(sprite),
                 )
 
-                # Render frame rect in real position
-                pg.draw.rect(
-                    NATIVE_SURFACE,
-                    "green",
-                    sprite.frame_frect,
-                    1
+    # Shrink here too, scaling also lets go of the gil
+    if size != chunk_surface.get_size():
+        chunk_surface = pg.transform.smoothscale(chunk_surface, size)
+    return chunk_surface
+
+
+# Layers in frect -> 1 surface, chunks render at the same time on executor threads then get pasted together
+def rasterize_layers(tile_maps_list, frect, scale=1, groups_list=None, executor=None):
+    width = max(round(frect.width * scale), 1)
+    height = max(round(frect.height * scale), 1)
+
+    # Chunk -> its rect in the result, rounded edges so scaled chunks tile without gaps
+    jobs_list = []
+    for top in range(0, int(frect.height), RASTER_CHUNK_SIZE):
+        bottom = min(top + RASTER_CHUNK_SIZE, int(frect.height))
+        for left in range(0, int(frect.width), RASTER_CHUNK_SIZE):
+            right = min(left + RASTER_CHUNK_SIZE, int(frect.width))
+            rect = pg.Rect(
+                round(left * scale),
+                round(top * scale),
+                round(right * scale) - round(left * scale),
+                round(bottom * scale) - round(top * scale)
+            )
+            if rect.width and rect.height:
+                chunk_frect = pg.FRect(
+                    frect.x + left, frect.y + top, right - left, bottom - top
                 )
+                jobs_list.append((chunk_frect, rect))
+
+    # No executor? use 1 just for this
+    if executor is None:
+        with ThreadPoolExecutor() as executor:
+            return rasterize_layers(tile_maps_list, frect, scale, groups_list, executor)
+
+    futures_list = [
+        executor.submit(
+            rasterize_chunk, tile_maps_list, groups_list, chunk_frect, rect.size
+        ) for chunk_frect, rect in jobs_list
+    ]
+    surface = pg.Surface((width, height), pg.SRCALPHA)
+    surface.blits(
+        [
+            (future.result(), rect)
+            for future, (chunk_frect, rect) in zip(futures_list, jobs_list)
+        ],
+        doreturn=False
+    )
+    return surface
 
-                # Draw frame rect with camera offset
-                pg.draw.rect(
-                    NATIVE_SURFACE,
-                    "red",
-                    pg.FRect(
-                        sprite_rect_render_position[0],
-                        sprite_rect_render_position[1],
-                        sprite.frame_frect.width,
-                        sprite.frame_frect.height
-                    ),
-                    1
+
+class World():
+    # Every room file in a dir indexed by its room unit bounds, rooms near the camera load on a thread
+
+    def __init__(self, sprite_sheet, rooms_dir_path, skip_room_path=None):
+        self.sprite_sheet = sprite_sheet
+        self.rooms_dir_path = rooms_dir_path
+
+        # The room being edited, it is not drawn twice
+        self.skip_room_path = skip_room_path
+
+        # Room path -> bounds in room unit
+        self.room_rects_dict = {}
+
+        # Room unit (x, y) -> room paths touching it
+        self.room_units_dict = {}
+
+        # Resident rooms, room path -> room data, least recently seen first
+        self.rooms_dict = OrderedDict()
+
+        # Loading rooms, room path -> future
+        self.loading_dict = {}
+        self.load_executor = ThreadPoolExecutor(max_workers=1)
+
+        # Headers being read, json ones are parsed whole so it runs on the load thread
+        self.index_future = None
+        self.index()
+
+    # Read each room header once on the load thread, binary beats json when both exist
+    def index(self):
+        self.room_rects_dict.clear()
+        self.room_units_dict.clear()
+        room_paths_dict = {}
+        for filename in sorted(listdir(self.rooms_dir_path)):
+            stem, extension = path.splitext(filename)
+            if extension == ROOM_BINARY_EXTENSION or (extension == ROOM_JSON_EXTENSION and stem not in room_paths_dict):
+                room_paths_dict[stem] = path.join(
+                    self.rooms_dir_path, filename)
+
+        # Editing it? skip both its formats
+        if self.skip_room_path:
+            room_paths_dict.pop(path.splitext(path.basename(self.skip_room_path))[0], None)
+        self.index_future = self.load_executor.submit(
+            read_room_rects_dict, list(room_paths_dict.values())
+        )
+
+    # Headers read? put each room in both indexes
+    def update_index(self):
+        if self.index_future is None or not self.index_future.done():
+            return
+        room_rects_dict = self.index_future.result()
+        self.index_future = None
+        for room_path, room_rect in room_rects_dict.items():
+            self.room_rects_dict[room_path] = room_rect
+            for y in range(room_rect.top, room_rect.bottom):
+                for x in range(room_rect.left, room_rect.right):
+                    self.room_units_dict.setdefault(
+                        (x, y), []).append(room_path)
+
+    # Out of both indexes, the camera never asks for it again
+    def unindex(self, room_path):
+        room_rect = self.room_rects_dict.pop(room_path, None)
+        if room_rect is None:
+            return
+        for y in range(room_rect.top, room_rect.bottom):
+            for x in range(room_rect.left, room_rect.right):
+                room_paths_list = self.room_units_dict[(x, y)]
+                room_paths_list.remove(room_path)
+                if not room_paths_list:
+                    del self.room_units_dict[(x, y)]
+
+    # Camera -> room paths near it
+    def get_room_paths_near(self, camera_frect):
+        left = int((camera_frect.left - WORLD_LOAD_MARGIN) // ROOM_WIDTH)
+        top = int((camera_frect.top - WORLD_LOAD_MARGIN) // ROOM_HEIGHT)
+        right = int((camera_frect.right + WORLD_LOAD_MARGIN) // ROOM_WIDTH)
+        bottom = int((camera_frect.bottom + WORLD_LOAD_MARGIN) // ROOM_HEIGHT)
+        room_paths_dict = {}
+        for y in range(top, bottom + 1):
+            for x in range(left, right + 1):
+                for room_path in self.room_units_dict.get((x, y), ()):
+                    room_paths_dict[room_path] = None
+        return room_paths_dict
+
+    # Load rooms the camera approaches, drop the least recently seen over the limit
+    def update(self, camera_frect):
+        self.update_index()
+
+        # Loaded? make it resident
+        for room_path, future in list(self.loading_dict.items()):
+            if not future.done():
+                continue
+            del self.loading_dict[room_path]
+            # Broken room? skip it, it stays out of the world and is not loaded again
+            if future.exception():
+                self.unindex(room_path)
+                continue
+            self.rooms_dict[room_path] = future.result()
+
+        # Near camera? keep it fresh or start loading it
+        room_paths_near = self.get_room_paths_near(camera_frect)
+        for room_path in room_paths_near:
+            if room_path in self.rooms_dict:
+                self.rooms_dict.move_to_end(room_path)
+            elif room_path not in self.loading_dict:
+                self.loading_dict[room_path] = self.load_executor.submit(
+                    load_room_data, room_path, self.sprite_sheet
                 )
 
+        # Too many? drop the least recently seen, the ones near camera always fit under the limit
+        for room_path in list(self.rooms_dict):
+            if len(self.rooms_dict) <= WORLD_RESIDENT_ROOMS_COUNT:
+                break
+            if room_path not in room_paths_near:
+                del self.rooms_dict[room_path]
+
+    def draw(self, camera_frect):
+        for room_path, room_data in self.rooms_dict.items():
+            room_rect = self.room_rects_dict.get(room_path)
+            if room_rect is None:
+                continue
+            if not camera_frect.colliderect(
+                room_data.topleft[0], room_data.topleft[1], room_data.width, room_data.height
+            ):
+                continue
+
+            # Not being edited, draw it translucent
+            for tile_map in room_data.tile_maps_list:
+                tile_map.draw(camera_frect, True)
+
+    # Stop loading, drop every room
+    def close(self):
+        self.load_executor.shutdown(wait=False, cancel_futures=True)
+        self.loading_dict.clear()
+        self.rooms_dict.clear()
+
 
 class RoomLoadEditor():
-    def __init__(self):
+    def __init__(self, room_path=LOAD_ROOM_JSON_PATH):
+        # Scenes need the window, font and native surface
+        init()
+
         # Things are drawn relative to this
 
         self.camera_frect = pg.FRect(
@@ -247,23 +2808,17 @@ class RoomLoadEditor():
         )
         self.camera_velocity = pg.math.Vector2()
         self.camera_max_speed = 180.0
+        # Velocity moves this much of the way to its target every camera_lerp_dt seconds
         self.camera_lerp_weight = 0.12
+        self.camera_lerp_dt = 1 / 60
 
-        # Key inputs
-        self.is_right_pressed = 0
-        self.is_left_pressed = 0
-        self.is_up_pressed = 0
-        self.is_down_pressed = 0
-
-        # Mouse input
-        self.is_lmb_pressed = False
-        self.is_rmb_pressed = False
-
-        # Sprite sheet surface
+        # Sprite sheet surface and data
         self.sprite_sheet_path = SPRITE_SHEET_PNG_PATH  # To be saved
-        self.sprite_sheet_surface = pg.image.load(
-            self.sprite_sheet_path
-        ).convert_alpha()
+        self.sprite_sheet = SpriteSheet(
+            self.sprite_sheet_path,
+            SPRITE_SHEET_JSON_PATH
+        )
+        self.sprite_sheet_surface = self.sprite_sheet.surface
 
         # Grid
         self.grid_surface = pg.image.load(
@@ -272,157 +2827,188 @@ class RoomLoadEditor():
         self.grid_rect = self.grid_surface.get_frect()
 
         # To iterate over the sprites
-        self.sprite_names_list = []
-
-        # Pre process json
-        with open(SPRITE_SHEET_JSON_PATH, 'r') as file:
-            json_data = load(file)
-        for sprite_name, sprite_data in json_data.items():
-            # Fill sprite names list
-            self.sprite_names_list.append(sprite_name)
-            frames_list = []
-            # Frames_list: dict -> tuple
-            for frame in sprite_data["frames_list"]:
-                tuple_frame = (
-                    frame["x"], frame["y"], frame["w"], frame["h"]
-                )
-                frames_list.append((tuple_frame))
-            sprite_data["frames_list"] = frames_list
-            # Bitmasks key: str -> int
-            sprite_data["bitmasks"] = {
-                int(key): value for key, value in sprite_data["bitmasks"].items()}
+        self.sprite_names_list = self.sprite_sheet.sprite_names_list
 
         # self.sprite_sheet_dict ready
-        self.sprite_sheet_dict = json_data
+        self.sprite_sheet_dict = self.sprite_sheet.sprite_sheet_dict
         self.sprite_names_list_len = len(self.sprite_names_list)
         self.sprite_name_index = 0
         self.sprite_name = self.sprite_names_list[self.sprite_name_index]
         self.sprite_frames_list = self.sprite_sheet_dict[self.sprite_name]["frames_list"]
         self.sprite_frames_list_len = len(self.sprite_frames_list)
-        self.sprite_bitmasks = self.sprite_sheet_dict[self.sprite_name]["bitmasks"]
         self.frame_index = 0
 
+        # Saves run here one at a time so the main loop keeps going
+        self.save_executor = ThreadPoolExecutor(max_workers=1)
+        self.save_futures_list = []
+        self.latest_room_index = 0
+        self.save_status = ""
+
+        # World mode, off until m key
+        self.world = None
+
         # Sprite name text
-        self.sprite_name_text_surface = FONT.render(
+        self.sprite_name_text_surface = text_cache.render(
             f"mouse wheel sprite: {self.sprite_name}",
-            False,
             "white"
         )
         self.sprite_name_text_rect = self.sprite_name_text_surface.get_rect(
             topright=(NATIVE_RECT.width - FONT_HEIGHT, FONT_HEIGHT)
         )
 
-        with open(LOAD_ROOM_JSON_PATH, 'r') as file:
-            json_data = load(file)
-
-        # Room settings
-        self.room_topleft_room_unit = (
-            json_data["room_topleft_room_unit_x"],
-            json_data["room_topleft_room_unit_y"]
-        )
-        # self.room_scale = (3, 1)
-        self.room_scale = (
-            json_data["room_scale_x"],
-            json_data["room_scale_y"]
-        )
+        # Room settings and tile layers
+        self.room_path = room_path
+        self.room_data = load_room_data(room_path, self.sprite_sheet)
+        self.room_data.sprite_sheet_path = get_portable_path(
+            self.sprite_sheet_path)  # To be saved
+        self.room_topleft_room_unit = self.room_data.topleft_room_unit
+        self.room_scale = self.room_data.scale
 
         # Room size: To make the list
-        self.room_width_tile_unit = ROOM_WIDTH_TILE_UNIT * self.room_scale[0]
-        self.room_height_tile_unit = ROOM_HEIGHT_tile_unit * self.room_scale[1]
+        self.room_width_tile_unit = self.room_data.width_tile_unit
+        self.room_height_tile_unit = self.room_data.height_tile_unit
 
         # To get / set tile from list
-        self.room_topleft_tile_unit = (
-            self.room_topleft_room_unit[0] * ROOM_WIDTH_TILE_UNIT,
-            self.room_topleft_room_unit[1] * ROOM_HEIGHT_tile_unit
-        )
+        self.room_topleft_tile_unit = self.room_data.topleft_tile_unit
 
         # For drawing limit and bringing camera to rect
-        self.room_topleft = (
-            self.room_topleft_room_unit[0] * ROOM_WIDTH,
-            self.room_topleft_room_unit[1] * ROOM_HEIGHT
-        )
-        self.room_width = self.room_width_tile_unit * TILE_SIZE
-        self.room_height = self.room_height_tile_unit * TILE_SIZE
+        self.room_topleft = self.room_data.topleft
+        self.room_width = self.room_data.width
+        self.room_height = self.room_data.height
 
         # Bring camera to room top left
         self.camera_frect.topleft = self.room_topleft
 
-        room = []
-        total = self.room_width_tile_unit * self.room_height_tile_unit
-        for _ in range(total):
-            room.append(0)
+        # Camera at the tick before, draws happen somewhere in between
+        self.camera_previous_topleft = pg.math.Vector2(self.camera_frect.topleft)
+        self.render_camera_frect = self.camera_frect.copy()
 
-        self.rooms_list = [
-            room.copy(),
-            room.copy(),
-            room.copy(),
-        ]
+        # What this frame changed on NATIVE_SURFACE for the main loop, None is everything, empty is idle
+        self.dirty_rects_list = None
 
-        # Groups
+        # Draw state of the last drawn frame, a different one redraws everything
+        self.draw_state = None
+
+        # Tile edits since the last draw in pixels, a full redraw for changes without a rect
+        self.edit_frects_list = []
+        self.is_full_redraw = True
+
+        # Animation steps of the last drawn frame, without chunks a step redraws everything
+        self.drawn_animation_steps = None
+
+        # Minimap, the whole room rasterized small, rebuilt when stale
+        self.raster_executor = ThreadPoolExecutor()
+        self.is_minimap = False
+        self.minimap_surface = None
+        self.is_minimap_stale = True
+        self.minimap_built_ticks = 0
+
+        # Rebuild running on raster_executor, its result is swapped in once it is done
+        self.minimap_future = None
+
+        # Tile layers
+        self.rooms_list = self.room_data.tile_maps_list
+
+        # Entity layers: cell (x, y) -> sprite, only entities get a sprite
+        self.entity_sprites_list = [{}, {}, {}]
+
+        # Groups, draw the entities, animated ones step with the sprite sheet clock
         self.groups_list = [
-            Group(),
-            Group(),
-            Group(),
+            Group(self.sprite_sheet.animation_clock),
+            Group(self.sprite_sheet.animation_clock),
+            Group(self.sprite_sheet.animation_clock),
         ]
         self.groups_list_len = len(self.groups_list)
         self.group_index = 0
         self.group = self.groups_list[self.group_index]
         self.room = self.rooms_list[self.group_index]
+        self.entity_sprites = self.entity_sprites_list[self.group_index]
 
         # Group text
-        self.group_text_surface = FONT.render(
+        self.group_text_surface = text_cache.render(
             f"q/e group: {self.group_index}",
-            False,
             "white"
         )
         self.group_text_rect = self.group_text_surface.get_rect(
             topleft=(FONT_HEIGHT, FONT_HEIGHT)
         )
+        self.tool_text_rect = pg.Rect(
+            self.group_text_rect.x, self.group_text_rect.bottom + FONT_HEIGHT, 0, 0
+        )
 
         # Info text
-        self.info_text_surface = FONT.render(
-            f"p key: debug\n\nspace key: save\n\nwasd keys: move camera",
-            False,
+        self.info_text_surface = text_cache.render(
+            f"p key: debug\n\nc key: chunk cache\n\nt key: autotile all\n\nctrl z / y keys: undo / redo\n\nb/r/f/x/v keys: brush / rect / flood / copy / paste\n\nm key: world mode\n\nn key: minimap\n\ng key: play test\n\nf11 / f10 keys: fullscreen / integer scale\n\nspace key: save\n\nj key: export json\n\no key: dump profile\n\nq / e keys: group\n\nup / down keys: sprite frame\n\nwasd keys: move camera",
             "white"
         )
         self.info_text_rect = self.info_text_surface.get_rect(
             bottomleft=(FONT_HEIGHT, NATIVE_RECT.height - FONT_HEIGHT)
         )
 
-        for i, room in enumerate(json_data["rooms_list"]):
+        # Undo / redo, mouse strokes and other edits get recorded
+        self.edit_history = EditHistory(self.rooms_list, EDIT_HISTORY_SIZE)
+
+        # Action -> handler, camera and brush poll their held actions instead
+        self.pressed_actions_dict = {
+            "debug": self.toggle_debug,
+            "chunk_cache": self.toggle_chunk_cache,
+            "autotile_all": self.autotile_all_stroke,
+            "undo": self.undo,
+            "redo": self.redo,
+            "minimap": self.toggle_minimap,
+            "world_mode": self.toggle_world,
+            "play_test": self.play_test,
+            "fullscreen": self.toggle_fullscreen,
+            "integer_scale": self.toggle_integer_scale,
+            "group_previous": lambda: setattr(self, "group_index", self.group_index - 1),
+            "group_next": lambda: setattr(self, "group_index", self.group_index + 1),
+            "frame_next": self.next_frame_index,
+            "frame_previous": self.previous_frame_index,
+            "save": partial(self.save_room, ROOM_BINARY_EXTENSION),
+            "export_json": partial(self.save_room, ROOM_JSON_EXTENSION),
+            "dump_profile": self.dump_profile,
+            # Region tools act once per click
+            "paint": partial(self.use_tool_on_press, 1),
+            "erase": partial(self.use_tool_on_press, 3),
+        }
+        for tool in TOOLS_LIST:
+            self.pressed_actions_dict[f"tool_{tool}"] = partial(
+                setattr, self, "tool", tool)
+        for scale in range(1, 5):
+            self.pressed_actions_dict[f"scale_{scale}"] = partial(
+                setattr, game, "resolution_scale", scale)
+        # Drag tools act on release
+        self.released_actions_dict = {
+            "paint": partial(self.use_tool_on_release, 1),
+            "erase": partial(self.use_tool_on_release, 3),
+        }
+
+        # Mouse tool, rect and copy drag from here, stamp holds copied cells of every layer
+        self.tool = TOOLS_LIST[0]
+        self.drag_start_tile_unit = None
+        self.stamp_list = None
+
+        # Loaded entities get their sprite
+        for i, room in enumerate(self.rooms_list):
             self.group_index = i
-            for cell in room:
-                self.sprite_name = cell["name"]
-                # Instance tile on mouse click
-                sprite = Sprite(
-                    self.group,
-                    self.sprite_sheet_surface,
-                    (cell["position_x"], cell["position_y"]),
-                    self.sprite_frames_list,
-                    self.sprite_name
-                )
-                sprite.frame_index = cell["frame_index"]
-                # Save this sprite to room map
-                mouse_snapped_in_game = (  # For tile placement clicks
-                    (cell["position_x"] +
-                        self.camera_frect.x) // TILE_SIZE * TILE_SIZE,
-                    (cell["position_y"] +
-                        self.camera_frect.y) // TILE_SIZE * TILE_SIZE
-                )
-                mouse_snapped_in_game_tile_unit = (  # For collision check
-                    int(mouse_snapped_in_game[0] // TILE_SIZE),
-                    int(mouse_snapped_in_game[1] // TILE_SIZE)
-                )
+            ys, xs = np.nonzero(
+                self.sprite_sheet.is_entity_array[room.sprite_ids]
+            )
+            for y, x in zip(ys.tolist(), xs.tolist()):
                 self.set_tile_from_room(
-                    mouse_snapped_in_game_tile_unit[0],
-                    mouse_snapped_in_game_tile_unit[1],
-                    sprite
+                    self.room_topleft_tile_unit[0] + x,
+                    self.room_topleft_tile_unit[1] + y,
+                    int(room.sprite_ids[y, x]),
+                    int(room.frame_indexes[y, x])
                 )
+        self.group_index = 0
+
+        # Autotile the loaded room
+        self.autotile_all()
 
     # SET self.sprite_name
         # self.sprite_frames_list
         # self.sprite_frames_list_len
-        # self.sprite_bitmasks
         # self.frame_index
         # self.sprite_name_text_surface
     @property
@@ -435,11 +3021,9 @@ class RoomLoadEditor():
             self._sprite_name = value
             self.sprite_frames_list = self.sprite_sheet_dict[self.sprite_name]["frames_list"]
             self.sprite_frames_list_len = len(self.sprite_frames_list)
-            self.sprite_bitmasks = self.sprite_sheet_dict[self.sprite_name]["bitmasks"]
             self.frame_index = 0
-            self.sprite_name_text_surface = FONT.render(
+            self.sprite_name_text_surface = text_cache.render(
                 f"mouse wheel sprite: {self.sprite_name}",
-                False,
                 "white"
             )
 
@@ -459,6 +3043,7 @@ class RoomLoadEditor():
         # self.group
         # self.group_text_surface
         # self.room
+        # self.entity_sprites
     @property
     def group_index(self):
         return self._group_index
@@ -468,137 +3053,331 @@ class RoomLoadEditor():
         if 0 <= value < self.groups_list_len:
             self._group_index = value
             self.group = self.groups_list[self.group_index]
-            self.group_text_surface = FONT.render(
+            self.group_text_surface = text_cache.render(
                 f"q/e group: {self.group_index}",
-                False,
                 "white"
             )
             self.room = self.rooms_list[self.group_index]
+            self.entity_sprites = self.entity_sprites_list[self.group_index]
+
+    # SET self.tool
+        # self.drag_start_tile_unit
+        # self.tool_text_surface
+    @property
+    def tool(self):
+        return self._tool
+
+    @tool.setter
+    def tool(self, value):
+        self._tool = value
+        self.drag_start_tile_unit = None
+        self.tool_text_surface = text_cache.render(
+            f"b/r/f/x/v tool: {self.tool}",
+            "white"
+        )
 
-    # Coordinate -> Object
+    # Coordinate -> sprite id, 0 is air, -1 is outside room
     def get_tile_from_room(self, x_tile_unit, y_tile_unit):
         # Bring room back to origin - array top left is always 0 0
         x_tile_unit -= self.room_topleft_tile_unit[0]
         y_tile_unit -= self.room_topleft_tile_unit[1]
         if (0 <= x_tile_unit < self.room_width_tile_unit) and (0 <= y_tile_unit < self.room_height_tile_unit):
-            return self.room[y_tile_unit * self.room_width_tile_unit + x_tile_unit]
+            return self.room.get_tile(x_tile_unit, y_tile_unit)
         return -1
 
-    # Set object with coordinate
-    def set_tile_from_room(self, x_tile_unit, y_tile_unit, value):
+    # Set sprite id and frame index with coordinate, entities also get a sprite
+    def set_tile_from_room(self, x_tile_unit, y_tile_unit, sprite_id, frame_index=0):
+        position_tile_unit = (x_tile_unit, y_tile_unit)
         # Bring room back to origin - array top left is always 0 0
         x_tile_unit -= self.room_topleft_tile_unit[0]
         y_tile_unit -= self.room_topleft_tile_unit[1]
-        if (0 <= x_tile_unit < self.room_width_tile_unit) and (0 <= y_tile_unit < self.room_height_tile_unit):
-            self.room[y_tile_unit *
-                      self.room_width_tile_unit + x_tile_unit] = value
+        if not ((0 <= x_tile_unit < self.room_width_tile_unit) and (0 <= y_tile_unit < self.room_height_tile_unit)):
+            return
+        self.room.set_tile(x_tile_unit, y_tile_unit, sprite_id, frame_index)
+        self.add_edit_frect(*position_tile_unit)
+        self.sync_entity_sprite(self.group_index, x_tile_unit, y_tile_unit)
+
+    # Local coordinate in a layer -> its entity sprite killed and made again to match the arrays
+    def sync_entity_sprite(self, layer_index, x_tile_unit, y_tile_unit):
+        room = self.rooms_list[layer_index]
+        entity_sprites = self.entity_sprites_list[layer_index]
+        position_tile_unit = (
+            self.room_topleft_tile_unit[0] + x_tile_unit,
+            self.room_topleft_tile_unit[1] + y_tile_unit
+        )
 
-    # Autotile
-    def update_bitmasks(self, this, position_tile_unit, last=False):
-        if game.is_debug:
-            # Get in_game position
-            sprite_rect_render_position = (
-                this.frame_frect.x - self.camera_frect.x,
-                this.frame_frect.y - self.camera_frect.y
+        # Had an entity here? kill it
+        sprite = entity_sprites.pop(position_tile_unit, None)
+        if sprite:
+            sprite.kill()
+
+        # Entity? instance its sprite
+        sprite_id = room.get_tile(x_tile_unit, y_tile_unit)
+        if self.sprite_sheet.is_entity_list[sprite_id]:
+            frame_frect = room.get_tile_frect(
+                x_tile_unit, y_tile_unit, sprite_id
             )
-            pg.draw.rect(
-                NATIVE_SURFACE,
-                "green",
-                pg.FRect(
-                    sprite_rect_render_position[0],
-                    sprite_rect_render_position[1],
-                    this.frame_frect.width,
-                    this.frame_frect.height
-                ),
+            sprite = Sprite(
+                self.groups_list[layer_index],
+                self.sprite_sheet_path,
+                frame_frect.topleft,
+                self.sprite_sheet.frames_lists[sprite_id],
+                self.sprite_sheet.names_list[sprite_id],
+                sprite_id
             )
+            sprite.frame_index = int(room.frame_indexes[y_tile_unit, x_tile_unit])
+            entity_sprites[position_tile_unit] = sprite
+
+    # Block of cells at a coordinate on a layer -> written in bulk with 1 autotile pass, entities and redraw catch up
+    def write_block_to_room(self, layer_index, x_tile_unit, y_tile_unit, sprite_ids, frame_indexes, mask=None):
+        room = self.rooms_list[layer_index]
+        ys, xs, old_sprite_ids = room.write_block(
+            x_tile_unit - self.room_topleft_tile_unit[0],
+            y_tile_unit - self.room_topleft_tile_unit[1],
+            sprite_ids,
+            frame_indexes,
+            mask
+        )
+        if len(ys) > AUTOTILE_MARK_ALL_CHUNKS_DIRTY_COUNT:
+            self.is_full_redraw = True
+            self.is_minimap_stale = True
+        else:
+            for y, x in zip(ys.tolist(), xs.tolist()):
+                self.add_edit_frect(
+                    self.room_topleft_tile_unit[0] + x,
+                    self.room_topleft_tile_unit[1] + y
+                )
 
-        # Raw bits
-        br, b, bl, r, l, tr, t, tl = 0, 0, 0, 0, 0, 0, 0, 0
-
-        x = position_tile_unit[0]
-        y = position_tile_unit[1]
-        neighbour_tile_units = [
-            (x - 1, y - 1), (x - 0, y - 1), (x + 1, y - 1),
-            (x - 1, y - 0),                 (x + 1, y - 0),
-            (x - 1, y + 1), (x - 0, y + 1), (x + 1, y + 1)
-        ]
-        found_neighbours_list = []
-        for pos in neighbour_tile_units:
-            # Get tile from map
-            neighbour = self.get_tile_from_room(pos[0], pos[1])
-
-            # Air? check other position
-            if neighbour == 0:
-                continue
-
-            # Outside room? check other position
-            if neighbour == -1:
-                continue
-
-            # I'm ground tile?
-            if this.name in ["grass_block", "dirt_block", "snow_block"]:
-                # But neighbour is not?
-                if neighbour.name not in ["grass_block", "dirt_block", "snow_block"]:
-                    continue
+        # Only cells that were or became an entity
+        is_entity = self.sprite_sheet.is_entity_array[old_sprite_ids] | \
+            self.sprite_sheet.is_entity_array[room.sprite_ids[ys, xs]]
+        for y, x in zip(ys[is_entity].tolist(), xs[is_entity].tolist()):
+            self.sync_entity_sprite(layer_index, x, y)
+
+    # 2 corners -> (left, top, width, height) in tile unit
+    def get_tile_rect(self, corner_tile_unit, other_corner_tile_unit):
+        left = min(corner_tile_unit[0], other_corner_tile_unit[0])
+        top = min(corner_tile_unit[1], other_corner_tile_unit[1])
+        return (
+            left,
+            top,
+            max(corner_tile_unit[0], other_corner_tile_unit[0]) - left + 1,
+            max(corner_tile_unit[1], other_corner_tile_unit[1]) - top + 1
+        )
 
-            # I'm not ground?
+    # Fill a rect of the selected layer, sprite id 0 clears it
+    def fill_rect(self, corner_tile_unit, other_corner_tile_unit, sprite_id):
+        left, top, width, height = self.get_tile_rect(
+            corner_tile_unit, other_corner_tile_unit)
+        self.edit_history.begin_stroke()
+        self.write_block_to_room(
+            self.group_index,
+            left,
+            top,
+            np.full((height, width), sprite_id, np.uint16),
+            np.full((height, width), self.frame_index if sprite_id else 0, np.uint16)
+        )
+        self.edit_history.end_stroke()
+
+    # Fill the cells connected to a coordinate with its sprite on the selected layer, sprite id 0 clears them
+    def flood_fill(self, x_tile_unit, y_tile_unit, sprite_id):
+        if self.get_tile_from_room(x_tile_unit, y_tile_unit) == -1:
+            return
+        mask = self.room.get_flood_mask(
+            x_tile_unit - self.room_topleft_tile_unit[0],
+            y_tile_unit - self.room_topleft_tile_unit[1]
+        )
+        self.edit_history.begin_stroke()
+        self.write_block_to_room(
+            self.group_index,
+            self.room_topleft_tile_unit[0],
+            self.room_topleft_tile_unit[1],
+            np.full(mask.shape, sprite_id, np.uint16),
+            np.full(mask.shape, self.frame_index if sprite_id else 0, np.uint16),
+            mask
+        )
+        self.edit_history.end_stroke()
+
+    # Rect of every layer -> stamp, outside the room is air
+    def copy_stamp(self, corner_tile_unit, other_corner_tile_unit):
+        left, top, width, height = self.get_tile_rect(
+            corner_tile_unit, other_corner_tile_unit)
+        left -= self.room_topleft_tile_unit[0]
+        top -= self.room_topleft_tile_unit[1]
+        self.stamp_list = []
+        for room in self.rooms_list:
+            sprite_ids = np.zeros((height, width), np.uint16)
+            frame_indexes = np.zeros((height, width), np.uint16)
+            clip_left = max(left, 0)
+            clip_top = max(top, 0)
+            clip_right = min(left + width, room.width_tile_unit)
+            clip_bottom = min(top + height, room.height_tile_unit)
+            if clip_left < clip_right and clip_top < clip_bottom:
+                sprite_ids[clip_top - top:clip_bottom - top, clip_left - left:clip_right - left] = \
+                    room.sprite_ids[clip_top:clip_bottom, clip_left:clip_right]
+                frame_indexes[clip_top - top:clip_bottom - top, clip_left - left:clip_right - left] = \
+                    room.frame_indexes[clip_top:clip_bottom, clip_left:clip_right]
+            self.stamp_list.append((sprite_ids, frame_indexes))
+
+    # Stamp topleft at a coordinate on every layer, air in the stamp keeps what is there
+    def paste_stamp(self, x_tile_unit, y_tile_unit):
+        if not self.stamp_list:
+            return
+        self.edit_history.begin_stroke()
+        for i, (sprite_ids, frame_indexes) in enumerate(self.stamp_list):
+            self.write_block_to_room(
+                i, x_tile_unit, y_tile_unit, sprite_ids, frame_indexes, sprite_ids != 0
+            )
+        self.edit_history.end_stroke()
+
+    # Undo or redo entry written back -> entities, redraw and minimap catch up
+    def apply_edit_history_entry(self, entry):
+        if entry is None:
+            return
+        for i, indexes, values in entry:
+            room = self.rooms_list[i]
+            ys, xs = np.divmod(indexes, room.width_tile_unit)
+            if len(indexes) > AUTOTILE_MARK_ALL_CHUNKS_DIRTY_COUNT:
+                self.is_full_redraw = True
+                self.is_minimap_stale = True
             else:
-                # Neighbour is not kind? check other position
-                if neighbour.name != this.name:
-                    continue
-
-            # Found neighbour!
-            found_neighbours_list.append(
-                {
-                    "neighbour": neighbour,
-                    "pos": pos
-                }
+                for y, x in zip(ys.tolist(), xs.tolist()):
+                    self.add_edit_frect(
+                        self.room_topleft_tile_unit[0] + x,
+                        self.room_topleft_tile_unit[1] + y
+                    )
+
+            # Only cells that were or became an entity
+            is_entity = self.sprite_sheet.is_entity_array[values[:, 0]] | \
+                self.sprite_sheet.is_entity_array[values[:, 2]]
+            for y, x in zip(ys[is_entity].tolist(), xs[is_entity].tolist()):
+                self.sync_entity_sprite(i, x, y)
+
+    # Set frame index with coordinate
+    def set_frame_index_from_room(self, x_tile_unit, y_tile_unit, frame_index):
+        position_tile_unit = (x_tile_unit, y_tile_unit)
+        # Bring room back to origin - array top left is always 0 0
+        x_tile_unit -= self.room_topleft_tile_unit[0]
+        y_tile_unit -= self.room_topleft_tile_unit[1]
+        if not ((0 <= x_tile_unit < self.room_width_tile_unit) and (0 <= y_tile_unit < self.room_height_tile_unit)):
+            return
+        self.room.set_frame_index(x_tile_unit, y_tile_unit, frame_index)
+        self.add_edit_frect(*position_tile_unit)
+        sprite = self.entity_sprites.get(position_tile_unit)
+        if sprite:
+            sprite.frame_index = frame_index
+
+    # Edited tile coordinate -> pixels it can change, autotile reaches its neighbours, big sprites poke out right and up
+    def add_edit_frect(self, x_tile_unit, y_tile_unit):
+        self.is_minimap_stale = True
+        margin_tile_unit = self.sprite_sheet.margin_tile_unit
+        self.edit_frects_list.append(
+            pg.FRect(
+                (x_tile_unit - 1) * TILE_SIZE,
+                (y_tile_unit - 1 - margin_tile_unit[1]) * TILE_SIZE,
+                (3 + margin_tile_unit[0]) * TILE_SIZE,
+                (3 + margin_tile_unit[1]) * TILE_SIZE
             )
+        )
 
-            # Tell my neighbour to update their frame index
-            if last == False:
-                self.update_bitmasks(
-                    neighbour,
-                    pos,
-                    last=True
-                )
+    # Minimap on and stale? rasterize the whole room small on a thread, not more often than the rebuild interval
+    def update_minimap(self):
+        # Rebuilt? show it, unless the rooms changed while it ran, then it is stale again and dropped
+        if self.minimap_future and self.minimap_future.done():
+            minimap_surface = self.minimap_future.result()
+            self.minimap_future = None
+            if not self.is_minimap_stale:
+                self.minimap_surface = minimap_surface
+                self.is_full_redraw = True
+
+        if not self.is_minimap or not self.is_minimap_stale or self.minimap_future:
+            return
+        ticks = pg.time.get_ticks()
+        if self.minimap_surface and ticks - self.minimap_built_ticks < MINIMAP_REBUILD_INTERVAL:
+            return
+
+        # Chunks go to the other raster threads, this job only waits on them
+        # They read a copy, the rooms keep changing while they run
+        self.minimap_future = self.raster_executor.submit(
+            rasterize_layers,
+            self.room_data.snapshot().tile_maps_list,
+            pg.FRect(self.room_topleft, (self.room_width, self.room_height)),
+            min(MINIMAP_WIDTH / self.room_width, MINIMAP_HEIGHT / self.room_height),
+            executor=self.raster_executor
+        )
+        self.is_minimap_stale = False
+        self.minimap_built_ticks = ticks
+
+    # Autotile every layer at once
+    def autotile_all(self):
+        for room in self.rooms_list:
+            room.autotile()
+        self.is_full_redraw = True
+        self.is_minimap_stale = True
+
+    # Autotile tiles placed or removed since last time, once per layer
+    def autotile_dirty(self):
+        for room in self.rooms_list:
+            if game.is_debug:
+                for x_tile_unit, y_tile_unit in room.dirty_tile_units_set:
+                    pg.draw.rect(
+                        NATIVE_SURFACE,
+                        "green",
+                        pg.FRect(
+                            (self.room_topleft_tile_unit[0] + x_tile_unit) *
+                            TILE_SIZE - self.render_camera_frect.x,
+                            (self.room_topleft_tile_unit[1] + y_tile_unit) *
+                            TILE_SIZE - self.render_camera_frect.y,
+                            TILE_SIZE,
+                            TILE_SIZE
+                        ),
+                    )
+            room.autotile_dirty()
+
+    # Save room to the next free room file in the background, extension picks the format
+    def save_room(self, extension):
+        # Find the latest room index in dir once, remember the ones still being written
+        self.latest_room_index = max(
+            self.latest_room_index,
+            get_latest_room_index(ROOMS_DIR_PATH)
+        ) + 1
+
+        # Generate filename with the next available index
+        filename = path.join(
+            ROOMS_DIR_PATH, f"room{self.latest_room_index}{extension}"
+        )
 
-            dx = neighbour.rect.x - this.rect.x
-            dy = neighbour.rect.y - this.rect.y
-            t += dx == 0 and dy == -TILE_SIZE
-            r += dx == TILE_SIZE and dy == 0
-            b += dx == 0 and dy == TILE_SIZE
-            l += dx == -TILE_SIZE and dy == 0
-            br += dx == TILE_SIZE and dy == TILE_SIZE
-            bl += dx == -TILE_SIZE and dy == TILE_SIZE
-            tr += dx == TILE_SIZE and dy == -TILE_SIZE
-            tl += dx == -TILE_SIZE and dy == -TILE_SIZE
-        tr = tr and t and r
-        tl = tl and t and l
-        br = br and b and r
-        bl = bl and b and l
-        mask_id = (br << 7) | (b << 6) | (bl << 5) | (
-            r << 4) | (l << 3) | (tr << 2) | (t << 1) | tl
-
-        # Update frame index with cooked bitmask
-        this.frame_index = self.sprite_bitmasks[mask_id]
+        # Copy the room now, serialize and write it on the save thread
+        room_data = self.room_data.snapshot()
+        self.save_futures_list.append(
+            (
+                filename,
+                self.save_executor.submit(save_room_data, filename, room_data)
+            )
+        )
+        self.save_status = f"saving {filename}..."
+
+    # Done saves -> save status
+    def update_save_status(self):
+        while self.save_futures_list and self.save_futures_list[0][1].done():
+            filename, future = self.save_futures_list.pop(0)
+            error = future.exception()
+            if error:
+                self.save_status = f"save failed {filename}: {error}"
+            else:
+                self.save_status = f"saved {filename}"
 
     def get_mouse_positions(self, game):
-        pos = pg.mouse.get_pos()
-
         # Calculate mouse position in global coordinates (for UI clicks)
-        mouse_global = (
-            pos[0] // game.resolution_scale,
-            pos[1] // game.resolution_scale
-        )
+        mouse_global = game.presenter.window_to_native(pg.mouse.get_pos())
 
         # Calculate mouse position snapped to game grid (for tile placement clicks)
         mouse_snapped_in_game = (
             (
-                mouse_global[0] + self.camera_frect.x
+                mouse_global[0] + self.render_camera_frect.x
             ) // TILE_SIZE * TILE_SIZE,
             (
-                mouse_global[1] + self.camera_frect.y
+                mouse_global[1] + self.render_camera_frect.y
             ) // TILE_SIZE * TILE_SIZE
         )
 
@@ -611,146 +3390,97 @@ class RoomLoadEditor():
         return mouse_global, mouse_snapped_in_game, mouse_snapped_in_game_tile_unit
 
     def input(self, event):
-        # Key up
-        if event.type == pg.KEYDOWN:
-            # P
-            if event.key == pg.K_p:
-                game.is_debug = not game.is_debug
-
-            # Right
-            if event.key == pg.K_d:
-                self.is_right_pressed = 1
-            # Left
-            if event.key == pg.K_a:
-                self.is_left_pressed = 1
-            # Up
-            if event.key == pg.K_w:
-                self.is_up_pressed = 1
-            # Down
-            if event.key == pg.K_s:
-                self.is_down_pressed = 1
-
-            # 1
-            if event.key == pg.K_1:
-                game.resolution_scale = 1
-            # 2
-            if event.key == pg.K_2:
-                game.resolution_scale = 2
-            # 3
-            if event.key == pg.K_3:
-                game.resolution_scale = 3
-            # 4
-            if event.key == pg.K_4:
-                game.resolution_scale = 4
-
-            # Down
-            if event.key == pg.K_q:
-                self.group_index -= 1
-            # Up
-            if event.key == pg.K_e:
-                self.group_index += 1
-
-            # W
-            if event.key == pg.K_w:
-                if self.frame_index < self.sprite_frames_list_len:
-                    self.frame_index += 1
-            # S
-            if event.key == pg.K_s:
-                if self.frame_index > 0:
-                    self.frame_index -= 1
-
-            # Space
-            if event.key == pg.K_SPACE:
-                # Find the latest room index in dir
-                latest_room_index = 0
-                while path.exists(f"rooms/room{latest_room_index + 1}.json"):
-                    latest_room_index += 1
-
-                # Create a copy of the rooms list to avoid modification
-                processed_rooms_list = []
-                for room in self.rooms_list:
-                    processed_room = []
-                    for cell in room:
-                        if cell != 0:
-                            processed_cell = {
-                                "name": cell.name,
-                                "position_x": cell.position.x,
-                                "position_y": cell.position.y,
-                                "frame_index": cell.frame_index,
-                            }
-                            processed_room.append(processed_cell)
-                    processed_rooms_list.append(processed_room)
-
-                # Package room data
-                data = {
-                    "sprite_sheet_path": self.sprite_sheet_path,
-                    "room_topleft_room_unit_x": self.room_topleft_room_unit[0],
-                    "room_topleft_room_unit_y": self.room_topleft_room_unit[1],
-                    "room_scale_x": self.room_scale[0],
-                    "room_scale_y": self.room_scale[1],
-                    "room_width_tile_unit": self.room_width_tile_unit,
-                    "room_height_tile_unit": self.room_height_tile_unit,
-                    "room_width": self.room_width,
-                    "room_height": self.room_height,
-                    "rooms_list": processed_rooms_list
-                }
+        # Keys and buttons go through the bindings, taken in update
+        game.input_map.process(event)
 
-                # Generate filename with the next available index
-                filename = f"rooms/room{latest_room_index + 1}.json"
+        if event.type == pg.MOUSEWHEEL:
+            self.sprite_name_index += event.y
 
-                # Serialize the room data to JSON and save it to a file
-                with open(filename, "w") as f:
-                    dump(data, f, indent=4)
+        # Window shown again? it needs a whole frame
+        if event.type == pg.WINDOWEXPOSED:
+            self.is_full_redraw = True
+
+    # Pressed and released actions since the last frame -> their handlers, in the order they happened
+    def dispatch_actions(self):
+        pressed_actions_list, released_actions_list = game.input_map.pop_actions()
+        for action in pressed_actions_list:
+            handler = self.pressed_actions_dict.get(action)
+            if handler:
+                handler()
+            # Switched to the play test? the rest belongs to it
+            if game.scene is not self:
+                return
+        for action in released_actions_list:
+            handler = self.released_actions_dict.get(action)
+            if handler:
+                handler()
+
+    def toggle_debug(self):
+        game.is_debug = not game.is_debug
+
+    def toggle_fullscreen(self):
+        game.presenter.is_fullscreen = not game.presenter.is_fullscreen
+
+    def toggle_integer_scale(self):
+        game.presenter.is_integer_scale = not game.presenter.is_integer_scale
+
+    def toggle_chunk_cache(self):
+        game.is_chunk_cache = not game.is_chunk_cache
+
+    def toggle_minimap(self):
+        self.is_minimap = not self.is_minimap
+
+    def toggle_world(self):
+        if self.world:
+            self.world.close()
+            self.world = None
+        else:
+            self.world = World(
+                self.sprite_sheet,
+                ROOMS_DIR_PATH,
+                self.room_path
+            )
 
-        # Key up
-        elif event.type == pg.KEYUP:
-            # Right
-            if event.key == pg.K_d:
-                self.is_right_pressed = 0
-            # Left
-            if event.key == pg.K_a:
-                self.is_left_pressed = 0
-            # Up
-            if event.key == pg.K_w:
-                self.is_up_pressed = 0
-            # Down
-            if event.key == pg.K_s:
-                self.is_down_pressed = 0
-
-        # Mouse
-        if event.type == pg.MOUSEBUTTONDOWN:
-            # Lmb
-            if event.button == 1:
-                self.is_lmb_pressed = True
-
-            # Rmb
-            if event.button == 3:
-                self.is_rmb_pressed = True
-
-        if event.type == pg.MOUSEBUTTONUP:
-            # Lmb
-            if event.button == 1:
-                self.is_lmb_pressed = False
-
-            # Rmb
-            if event.button == 3:
-                self.is_rmb_pressed = False
+    def autotile_all_stroke(self):
+        self.edit_history.begin_stroke()
+        self.autotile_all()
+        self.edit_history.end_stroke()
 
-        if event.type == pg.MOUSEWHEEL:
-            self.sprite_name_index += event.y
+    def undo(self):
+        self.apply_edit_history_entry(self.edit_history.undo())
 
-    def update(self, dt):
-        # Key input
+    def redo(self):
+        self.apply_edit_history_entry(self.edit_history.redo())
+
+    def dump_profile(self):
+        profiler.dump_chrome_trace(PROFILER_TRACE_JSON_PATH)
+        self.save_status = f"profile saved {PROFILER_TRACE_JSON_PATH}"
+
+    def next_frame_index(self):
+        if self.frame_index < self.sprite_frames_list_len - 1:
+            self.frame_index += 1
+
+    def previous_frame_index(self):
+        if self.frame_index > 0:
+            self.frame_index -= 1
+
+    # Simulation, runs at the fixed tick rate
+    def fixed_update(self, dt):
+        self.camera_previous_topleft.update(self.camera_frect.topleft)
+
+        # Held keys
+        input_map = game.input_map
         direction = pg.math.Vector2(
-            self.is_right_pressed - self.is_left_pressed,
-            self.is_down_pressed - self.is_up_pressed
+            input_map.is_held("move_right") - input_map.is_held("move_left"),
+            input_map.is_held("move_down") - input_map.is_held("move_up")
         )
         if direction.length() > 0:
             direction = direction.normalize()
 
-        # Camera velocity towards target velocity by weight
+        # Camera velocity towards target velocity by weight, scaled to dt so any tick rate feels the same
+        weight = 1 - (1 - self.camera_lerp_weight) ** (dt / self.camera_lerp_dt)
         self.camera_velocity = self.camera_velocity.lerp(
-            direction * self.camera_max_speed, self.camera_lerp_weight)
+            direction * self.camera_max_speed, weight)
 
         # Prevent bouncing
         if self.camera_velocity.length() < 1.0:
@@ -759,16 +3489,126 @@ class RoomLoadEditor():
         # Velocity updates position
         self.camera_frect.topleft += self.camera_velocity * dt
 
+        # Animated tiles and entities step
+        self.sprite_sheet.animation_clock.update(dt)
+
+    # Camera -> in game frects of the animations on screen that stepped since they were drawn
+    def get_stale_animation_frects(self, camera_frect):
+        animation_clock = self.sprite_sheet.animation_clock
+        tile_maps_list = list(self.rooms_list)
+        if self.world:
+            for room_data in self.world.rooms_dict.values():
+                tile_maps_list += room_data.tile_maps_list
+
+        # Clocks that stepped since the last frame, for layers drawn tile by tile
+        steps_array = animation_clock.steps_array
+        is_stepped_array = None
+        if self.drawn_animation_steps is not None:
+            is_stepped_array = steps_array != self.drawn_animation_steps
+            if not is_stepped_array.any():
+                is_stepped_array = None
+        self.drawn_animation_steps = steps_array.copy()
+
+        frects_list = []
+        for layer in tile_maps_list + self.groups_list:
+            # Drawn from chunks? they know which of their animations are stale
+            if game.is_chunk_cache and (layer is self.room or layer is self.group):
+                frects_list += animation_clock.get_stale_frects(
+                    layer.chunk_animations_dict, camera_frect
+                )
+
+            # Else the tiles and sprites the camera sees whose clocks stepped
+            elif is_stepped_array is not None:
+                frects_list += layer.get_frects_with_ids(
+                    camera_frect, is_stepped_array)
+        return frects_list
+
+    # Draw and edit, runs once per frame
+    def update(self, dt):
+        # Pressed keys and buttons of this frame
+        self.dispatch_actions()
+        if game.scene is not self:
+            return
+
+        profiler.begin("camera")
+
+        # Camera between the last 2 ticks
+        camera_frect = self.render_camera_frect
+        camera_frect.topleft = self.camera_previous_topleft.lerp(
+            self.camera_frect.topleft, game.timestep.alpha
+        )
+
+        # Everything else that shows up on screen
+        self.update_save_status()
+        self.update_minimap()
+        self.edit_frects_list += self.get_stale_animation_frects(camera_frect)
+        # Region tools draw a preview that follows the mouse
+        tool_preview_tile_rect = None
+        if self.tool != "brush":
+            mouse_snapped_in_game_tile_unit = self.get_mouse_positions(game)[2]
+            if self.drag_start_tile_unit is not None:
+                tool_preview_tile_rect = self.get_tile_rect(
+                    self.drag_start_tile_unit, mouse_snapped_in_game_tile_unit
+                )
+            elif self.tool == "paste" and self.stamp_list:
+                tool_preview_tile_rect = (
+                    *mouse_snapped_in_game_tile_unit,
+                    self.stamp_list[0][0].shape[1],
+                    self.stamp_list[0][0].shape[0]
+                )
+        draw_state = (
+            self.tool,
+            tool_preview_tile_rect,
+            self.is_minimap,
+            tuple(camera_frect.topleft),
+            game.is_debug,
+            game.is_chunk_cache,
+            game.resolution_scale,
+            self.group_index,
+            self.sprite_name,
+            self.frame_index,
+            self.save_status,
+            (len(self.world.rooms_dict), len(self.world.loading_dict), len(self.world.room_rects_dict)) if self.world else None,
+        )
+
+        # Debug texts change every frame, else only draw what changed
+        if game.is_debug or self.is_full_redraw or draw_state != self.draw_state:
+            self.dirty_rects_list = None
+        else:
+            self.dirty_rects_list = []
+            for frect in self.edit_frects_list:
+                rect = pg.Rect(
+                    frect.x - camera_frect.x - 1,
+                    frect.y - camera_frect.y - 1,
+                    frect.width + 2,
+                    frect.height + 2
+                ).clip(NATIVE_RECT)
+                if rect:
+                    self.dirty_rects_list.append(rect)
+        self.draw_state = draw_state
+        self.edit_frects_list.clear()
+        self.is_full_redraw = False
+
+        # Nothing changed? idle, keep the last frame, still take edits
+        if self.dirty_rects_list == []:
+            profiler.end()
+            self.edit_room_with_mouse()
+            self.autotile_dirty()
+            return
+
+        profiler.end()
+        profiler.begin("grid")
+
         # Clear
         NATIVE_SURFACE.fill("black")
 
         # Grid
         grid_render_position = (
             (
-                (self.grid_rect.x - self.camera_frect.x) % TILE_SIZE
+                (self.grid_rect.x - camera_frect.x) % TILE_SIZE
             ) - TILE_SIZE,
             (
-                (self.grid_rect.y - self.camera_frect.y) % TILE_SIZE
+                (self.grid_rect.y - camera_frect.y) % TILE_SIZE
             ) - TILE_SIZE
         )
         NATIVE_SURFACE.blit(
@@ -777,7 +3617,7 @@ class RoomLoadEditor():
         )
 
         # Line
-        line_x = (-self.camera_frect.x) % (NATIVE_RECT.width)
+        line_x = (-camera_frect.x) % (NATIVE_RECT.width)
         pg.draw.line(
             NATIVE_SURFACE,
             "grey6",
@@ -785,7 +3625,7 @@ class RoomLoadEditor():
             (line_x, NATIVE_RECT.height),
             4
         )
-        line_y = (-self.camera_frect.y) % (NATIVE_RECT.height)
+        line_y = (-camera_frect.y) % (NATIVE_RECT.height)
         pg.draw.line(
             NATIVE_SURFACE,
             "grey6",
@@ -799,17 +3639,31 @@ class RoomLoadEditor():
             NATIVE_SURFACE,
             "red",
             pg.FRect(
-                self.room_topleft[0] - self.camera_frect.x,
-                self.room_topleft[1] - self.camera_frect.y,
+                self.room_topleft[0] - camera_frect.x,
+                self.room_topleft[1] - camera_frect.y,
                 self.room_width,
                 self.room_height,
             ),
             1
         )
 
-        # Groups draw
-        for group in self.groups_list:
-            group.draw(self.camera_frect, self.group)
+        profiler.end()
+
+        # World mode? stream and draw the rooms around this one
+        if self.world:
+            profiler.begin("world")
+            self.world.update(camera_frect)
+            self.world.draw(camera_frect)
+            profiler.end()
+
+        # Layers draw, tiles then entities
+        profiler.begin("groups draw")
+        for room, group in zip(self.rooms_list, self.groups_list):
+            room.draw(camera_frect, room is not self.room)
+            group.draw(camera_frect, self.group)
+        profiler.end()
+
+        profiler.begin("hud")
 
         # Group text draw
         NATIVE_SURFACE.blit(
@@ -817,6 +3671,26 @@ class RoomLoadEditor():
             self.group_text_rect
         )
 
+        # Tool text draw
+        NATIVE_SURFACE.blit(
+            self.tool_text_surface,
+            self.tool_text_rect
+        )
+
+        # Region tool preview draw
+        if tool_preview_tile_rect:
+            pg.draw.rect(
+                NATIVE_SURFACE,
+                "yellow",
+                pg.FRect(
+                    tool_preview_tile_rect[0] * TILE_SIZE - camera_frect.x,
+                    tool_preview_tile_rect[1] * TILE_SIZE - camera_frect.y,
+                    tool_preview_tile_rect[2] * TILE_SIZE,
+                    tool_preview_tile_rect[3] * TILE_SIZE
+                ),
+                1
+            )
+
         # Sprite name text draw
         NATIVE_SURFACE.blit(
             self.sprite_name_text_surface,
@@ -829,11 +3703,53 @@ class RoomLoadEditor():
             self.info_text_rect
         )
 
+        # Minimap draw, the camera is the white rect
+        if self.is_minimap and self.minimap_surface:
+            minimap_rect = self.minimap_surface.get_rect(
+                topright=(
+                    self.sprite_name_text_rect.right,
+                    self.sprite_name_text_rect.bottom + FONT_HEIGHT * 3
+                )
+            )
+            pg.draw.rect(NATIVE_SURFACE, "black", minimap_rect)
+            NATIVE_SURFACE.blit(self.minimap_surface, minimap_rect)
+            minimap_scale = minimap_rect.width / self.room_width
+            pg.draw.rect(
+                NATIVE_SURFACE,
+                "white",
+                pg.FRect(
+                    minimap_rect.x +
+                    (camera_frect.x - self.room_topleft[0]) * minimap_scale,
+                    minimap_rect.y +
+                    (camera_frect.y - self.room_topleft[1]) * minimap_scale,
+                    camera_frect.width * minimap_scale,
+                    camera_frect.height * minimap_scale
+                ).clip(minimap_rect),
+                1
+            )
+            pg.draw.rect(NATIVE_SURFACE, "grey40", minimap_rect, 1)
+
+        # Save status text draw
+        if self.save_status:
+            save_status_surface = text_cache.render(
+                self.save_status,
+                "white"
+            )
+            save_status_rect = save_status_surface.get_rect(
+                topright=(
+                    self.sprite_name_text_rect.right,
+                    self.sprite_name_text_rect.bottom + FONT_HEIGHT
+                )
+            )
+            NATIVE_SURFACE.blit(
+                save_status_surface,
+                save_status_rect
+            )
+
         if game.is_debug:
-            fps_surface = FONT.render(
+            fps_surface = text_cache.render(
                 f"fps: {int(1//dt)}",
-                False,
-                "white",
+                "white"
             )
             fps_rect = fps_surface.get_rect(
                 bottomright=(
@@ -845,11 +3761,40 @@ class RoomLoadEditor():
                 fps_rect
             )
 
+            # Text cache counters change every frame, caching them would only evict the rest
+            text_cache_surface = FONT.render(
+                f"text cache hits: {text_cache.hits} misses: {text_cache.misses}",
+                False,
+                "white"
+            )
+            text_cache_rect = text_cache_surface.get_rect(
+                bottomright=fps_rect.topright
+            )
+            text_cache_rect.y -= FONT_HEIGHT
+            NATIVE_SURFACE.blit(
+                text_cache_surface,
+                text_cache_rect
+            )
+
+            # World rooms
+            if self.world:
+                world_surface = text_cache.render(
+                    f"world rooms: {len(self.world.rooms_dict)} loaded {len(self.world.loading_dict)} loading {len(self.world.room_rects_dict)} indexed",
+                    "white"
+                )
+                world_rect = world_surface.get_rect(
+                    bottomright=text_cache_rect.topright
+                )
+                world_rect.y -= FONT_HEIGHT
+                NATIVE_SURFACE.blit(
+                    world_surface,
+                    world_rect
+                )
+
         # Ruler
-        ruler_x = int(self.camera_frect.x // NATIVE_RECT.width) + 1
-        ruler_x_surface = FONT.render(
+        ruler_x = int(camera_frect.x // NATIVE_RECT.width) + 1
+        ruler_x_surface = text_cache.render(
             str(ruler_x),
-            False,
             "white"
         )
         rulex_x_rect = ruler_x_surface.get_frect()
@@ -858,10 +3803,9 @@ class RoomLoadEditor():
             ruler_x_surface,
             rulex_x_rect
         )
-        ruler_y = int(self.camera_frect.y // NATIVE_RECT.height) + 1
-        ruler_y_surface = FONT.render(
+        ruler_y = int(camera_frect.y // NATIVE_RECT.height) + 1
+        ruler_y_surface = text_cache.render(
             str(ruler_y),
-            False,
             "white"
         )
         ruler_y_rect = ruler_y_surface.get_frect()
@@ -876,14 +3820,72 @@ class RoomLoadEditor():
             NATIVE_SURFACE,
             "red",
             (
-                -self.camera_frect.x + 1,
-                -self.camera_frect.y + 1
+                -camera_frect.x + 1,
+                -camera_frect.y + 1
             ),
             2
         )
 
+        profiler.end()
+        profiler.begin("mouse editing")
+
+        # Mouse edits room
+        self.edit_room_with_mouse()
+
+        # Autotile what the mouse changed
+        self.autotile_dirty()
+
+        profiler.end()
+
+    # Mouse button down -> flood and paste act, rect and copy start their drag
+    def use_tool_on_press(self, button):
+        mouse_snapped_in_game_tile_unit = self.get_mouse_positions(game)[2]
+        sprite_id = self.sprite_sheet.ids_dict[self.sprite_name] if button == 1 else 0
+        if self.tool in ("rect", "copy"):
+            self.drag_start_tile_unit = mouse_snapped_in_game_tile_unit
+        elif self.tool == "flood":
+            self.flood_fill(*mouse_snapped_in_game_tile_unit, sprite_id)
+        elif self.tool == "paste" and button == 1:
+            self.paste_stamp(*mouse_snapped_in_game_tile_unit)
+
+    # Mouse button up -> rect fills or clears, copy takes the stamp
+    def use_tool_on_release(self, button):
+        if self.drag_start_tile_unit is None:
+            return
+        mouse_snapped_in_game_tile_unit = self.get_mouse_positions(game)[2]
+        if self.tool == "rect":
+            sprite_id = self.sprite_sheet.ids_dict[self.sprite_name] if button == 1 else 0
+            self.fill_rect(
+                self.drag_start_tile_unit, mouse_snapped_in_game_tile_unit, sprite_id
+            )
+        elif self.tool == "copy":
+            self.copy_stamp(
+                self.drag_start_tile_unit, mouse_snapped_in_game_tile_unit
+            )
+        self.drag_start_tile_unit = None
+
+    # Switch to a play test of this room, the stroke and drag so far end here
+    def play_test(self):
+        self.edit_history.end_stroke()
+        self.drag_start_tile_unit = None
+        self.autotile_dirty()
+        game.scene = RoomPlayTest(self)
+
+    def edit_room_with_mouse(self):
+        # Buttons up? the stroke is over, its autotile ran with its last edit
+        is_paint_held = game.input_map.is_held("paint")
+        is_erase_held = game.input_map.is_held("erase")
+        if not (is_paint_held or is_erase_held):
+            self.edit_history.end_stroke()
+            return
+
+        # Region tools act on press and release instead
+        if self.tool != "brush":
+            return
+        self.edit_history.begin_stroke()
+
         # Lmb press
-        if self.is_lmb_pressed:
+        if is_paint_held:
             # Get mouse position
             mouse_global, mouse_snapped_in_game, mouse_snapped_in_game_tile_unit = self.get_mouse_positions(
                 game
@@ -903,36 +3905,16 @@ class RoomLoadEditor():
             if clicked_cell_item == -1:
                 return
 
-            # Handle big tile position - make sure their bottom left is snapped to grid
-            position_x = mouse_snapped_in_game[0]
-            position_y = mouse_snapped_in_game[1]
-            position_y -= self.sprite_frames_list[0][3] - TILE_SIZE
-
-            # Instance tile on mouse click
-            sprite = Sprite(
-                self.group,
-                self.sprite_sheet_surface,
-                (position_x, position_y),
-                self.sprite_frames_list,
-                self.sprite_name
-            )
-            sprite.frame_index = self.frame_index
-
             # Save this sprite to room map
+            sprite_id = self.sprite_sheet.ids_dict[self.sprite_name]
             self.set_tile_from_room(
                 mouse_snapped_in_game_tile_unit[0],
                 mouse_snapped_in_game_tile_unit[1],
-                sprite
+                sprite_id,
+                self.frame_index
             )
 
-            # Got no bitmask? return
-            if not self.sprite_bitmasks:
-                return
-
-            # Autotile check
-            self.update_bitmasks(sprite, mouse_snapped_in_game_tile_unit)
-
-        elif self.is_rmb_pressed:
+        elif is_erase_held:
             # Get mouse position
             mouse_global, mouse_snapped_in_game, mouse_snapped_in_game_tile_unit = self.get_mouse_positions(
                 game
@@ -952,51 +3934,351 @@ class RoomLoadEditor():
             if clicked_cell_item == -1:
                 return
 
-            # Kill it
-            clicked_cell_item.kill()
-
-            # Remove from room
+            # Remove from room, kills its sprite if it has one
             self.set_tile_from_room(
                 mouse_snapped_in_game_tile_unit[0],
                 mouse_snapped_in_game_tile_unit[1],
                 0
             )
 
-            # Got no bitmask? return
-            if not self.sprite_bitmasks:
+
+class RoomPlayTest():
+    # Plays the editor room as is, no files loaded, the editor waits to be switched back to
+    # Actors live in arrays, 1 entry per actor in each, instead of 1 sprite object per actor
+
+    def __init__(self, editor):
+        # Scenes need the window, font and native surface
+        init()
+
+        # Same room, sprite sheet and chunk caches as the editor
+        self.editor = editor
+        self.sprite_sheet = editor.sprite_sheet
+        self.rooms_list = editor.rooms_list
+        self.collider = TileCollider(self.rooms_list[COLLISION_LAYER_INDEX])
+
+        # Camera starts where the editor looks
+        self.camera_frect = editor.camera_frect.copy()
+        self.camera_velocity = pg.math.Vector2()
+        self.camera_max_speed = editor.camera_max_speed
+        self.camera_lerp_weight = editor.camera_lerp_weight
+        self.camera_lerp_dt = editor.camera_lerp_dt
+        self.camera_previous_topleft = pg.math.Vector2(self.camera_frect.topleft)
+        self.render_camera_frect = self.camera_frect.copy()
+
+        # Action -> handler, same bindings as the editor, r restarts here
+        self.pressed_actions_dict = {
+            "play_test": self.stop,
+            "restart": self.restart,
+            "debug": self.editor.toggle_debug,
+            "fullscreen": self.editor.toggle_fullscreen,
+            "integer_scale": self.editor.toggle_integer_scale,
+        }
+
+        # Actors move every tick, every frame is drawn whole
+        self.dirty_rects_list = None
+
+        # Info text
+        self.info_text_surface = text_cache.render(
+            "g key: back to editor\n\nr key: restart\n\np key: debug\n\nwasd keys: move camera",
+            "white"
+        )
+        self.info_text_rect = self.info_text_surface.get_rect(
+            bottomleft=(FONT_HEIGHT, NATIVE_RECT.height - FONT_HEIGHT)
+        )
+
+        self.restart()
+
+    # Actors back to the entity cells of the room, arrays sorted by layer so each layer draws a slice
+    def restart(self):
+        sprite_sheet = self.sprite_sheet
+        offsets_y_array = np.array(sprite_sheet.offsets_y_list, np.float64)
+        frame_sizes_array = np.array(
+            [frames_list[0][2:] if frames_list else (0, 0) for frames_list in sprite_sheet.frames_lists],
+            np.float64
+        )
+        is_flying_array = np.zeros(len(sprite_sheet.names_list), bool)
+        is_flying_array[
+            [sprite_sheet.ids_dict[name] for name in FLYING_ACTOR_NAMES_LIST if name in sprite_sheet.ids_dict]
+        ] = True
+
+        sprite_ids_list = []
+        frame_indexes_list = []
+        lefts_list = []
+        tops_list = []
+        self.layer_starts_list = [0]
+        for room in self.rooms_list:
+            ys, xs = np.nonzero(sprite_sheet.is_entity_array[room.sprite_ids])
+            sprite_ids = room.sprite_ids[ys, xs]
+            sprite_ids_list.append(sprite_ids)
+            frame_indexes_list.append(room.frame_indexes[ys, xs])
+            # Same spot as the editor sprite, bottom left on the cell
+            lefts_list.append((room.topleft_tile_unit[0] + xs) * TILE_SIZE + 0.0)
+            tops_list.append(
+                (room.topleft_tile_unit[1] + ys) * TILE_SIZE - offsets_y_array[sprite_ids]
+            )
+            self.layer_starts_list.append(self.layer_starts_list[-1] + len(xs))
+
+        self.actor_sprite_ids = np.concatenate(sprite_ids_list)
+        self.actor_frame_indexes = np.concatenate(frame_indexes_list)
+        self.actor_lefts = np.concatenate(lefts_list)
+        self.actor_tops = np.concatenate(tops_list)
+        self.actor_widths = frame_sizes_array[self.actor_sprite_ids, 0]
+        self.actor_heights = frame_sizes_array[self.actor_sprite_ids, 1]
+        self.actor_is_flying = is_flying_array[self.actor_sprite_ids]
+        self.actors_count = len(self.actor_sprite_ids)
+
+        # Everyone starts walking left, flyers also go up and down
+        self.actor_vxs = np.full(self.actors_count, -ACTOR_WALK_SPEED)
+        self.actor_vys = np.where(self.actor_is_flying, ACTOR_WALK_SPEED, 0.0)
+
+        # Spikes send actors back here
+        self.actor_spawn_lefts = self.actor_lefts.copy()
+        self.actor_spawn_tops = self.actor_tops.copy()
+
+        # Positions at the tick before, draws happen somewhere in between
+        self.actor_previous_lefts = self.actor_lefts.copy()
+        self.actor_previous_tops = self.actor_tops.copy()
+
+    def input(self, event):
+        # Keys and buttons go through the bindings, taken in update
+        game.input_map.process(event)
+
+    # Back to the editor, nothing reloaded
+    def stop(self):
+        self.editor.is_full_redraw = True
+        game.scene = self.editor
+
+    def dispatch_actions(self):
+        pressed_actions_list, _ = game.input_map.pop_actions()
+        for action in pressed_actions_list:
+            handler = self.pressed_actions_dict.get(action)
+            if handler:
+                handler()
+            # Switched back? the rest belongs to the editor
+            if game.scene is not self:
                 return
 
-            # Autotile check
-            self.update_bitmasks(
-                clicked_cell_item, mouse_snapped_in_game_tile_unit
+    # Simulation, runs at the fixed tick rate, every actor at once
+    def fixed_update(self, dt):
+        self.camera_previous_topleft.update(self.camera_frect.topleft)
+
+        # Camera like in the editor
+        input_map = game.input_map
+        direction = pg.math.Vector2(
+            input_map.is_held("move_right") - input_map.is_held("move_left"),
+            input_map.is_held("move_down") - input_map.is_held("move_up")
+        )
+        if direction.length() > 0:
+            direction = direction.normalize()
+        weight = 1 - (1 - self.camera_lerp_weight) ** (dt / self.camera_lerp_dt)
+        self.camera_velocity = self.camera_velocity.lerp(
+            direction * self.camera_max_speed, weight)
+        if self.camera_velocity.length() < 1.0:
+            self.camera_velocity *= 0
+        self.camera_frect.topleft += self.camera_velocity * dt
+
+        # Animated tiles and actors step
+        self.sprite_sheet.animation_clock.update(dt)
+
+        if not self.actors_count:
+            return
+        profiler.begin("actors")
+        self.actor_previous_lefts = self.actor_lefts
+        self.actor_previous_tops = self.actor_tops
+        widths = self.actor_widths
+        heights = self.actor_heights
+
+        # Walls turn actors around
+        self.actor_lefts, is_hit_x = self.collider.move_x(
+            self.actor_lefts, self.actor_tops, widths, heights, self.actor_vxs * dt
+        )
+        self.actor_vxs[is_hit_x] *= -1
+
+        # Walkers fall and stop on the ground, flyers bounce off floors and ceilings
+        self.actor_vys = np.where(
+            self.actor_is_flying,
+            self.actor_vys,
+            np.minimum(self.actor_vys + ACTOR_GRAVITY * dt, ACTOR_MAX_FALL_SPEED)
+        )
+        self.actor_tops, is_hit_y = self.collider.move_y(
+            self.actor_lefts, self.actor_tops, widths, heights, self.actor_vys * dt
+        )
+        self.actor_vys[is_hit_y] = np.where(
+            self.actor_is_flying[is_hit_y], -self.actor_vys[is_hit_y], 0.0
+        )
+
+        # Spikes send actors back to their spawn
+        is_hazard = self.collider.get_hazard_mask(
+            self.actor_lefts, self.actor_tops, widths, heights
+        )
+        self.actor_lefts[is_hazard] = self.actor_spawn_lefts[is_hazard]
+        self.actor_tops[is_hazard] = self.actor_spawn_tops[is_hazard]
+        self.actor_previous_lefts[is_hazard] = self.actor_spawn_lefts[is_hazard]
+        self.actor_previous_tops[is_hazard] = self.actor_spawn_tops[is_hazard]
+
+        # Actors walking into each other both turn around
+        is_array, js_array = get_overlapping_pairs(
+            self.actor_lefts, self.actor_tops, widths, heights
+        )
+        is_left_first = self.actor_lefts[is_array] < self.actor_lefts[js_array]
+        lefts_array = np.where(is_left_first, is_array, js_array)
+        rights_array = np.where(is_left_first, js_array, is_array)
+        self.actor_vxs[lefts_array] = -np.abs(self.actor_vxs[lefts_array])
+        self.actor_vxs[rights_array] = np.abs(self.actor_vxs[rights_array])
+        profiler.end()
+
+    # Draw, runs once per frame
+    def update(self, dt):
+        # Pressed keys of this frame
+        self.dispatch_actions()
+        if game.scene is not self:
+            return
+
+        profiler.begin("camera")
+
+        # Camera and actors between the last 2 ticks
+        alpha = game.timestep.alpha
+        camera_frect = self.render_camera_frect
+        camera_frect.topleft = self.camera_previous_topleft.lerp(
+            self.camera_frect.topleft, alpha
+        )
+        lefts = self.actor_previous_lefts + \
+            (self.actor_lefts - self.actor_previous_lefts) * alpha
+        tops = self.actor_previous_tops + \
+            (self.actor_tops - self.actor_previous_tops) * alpha
+
+        # Only actors on screen get drawn
+        is_visible = (
+            (lefts < camera_frect.right) & (lefts + self.actor_widths > camera_frect.left) &
+            (tops < camera_frect.bottom) & (tops + self.actor_heights > camera_frect.top)
+        )
+        xs_list = (lefts - camera_frect.x).tolist()
+        ys_list = (tops - camera_frect.y).tolist()
+
+        profiler.end()
+        profiler.begin("layers draw")
+
+        # Clear
+        NATIVE_SURFACE.fill("black")
+
+        # Layers draw, tiles then the actors of that layer in 1 blits call
+        frames_lists = self.sprite_sheet.frames_lists
+        surface = self.sprite_sheet.surface
+        animation_clock = self.sprite_sheet.animation_clock
+        for i, room in enumerate(self.rooms_list):
+            room.draw(camera_frect, False)
+            actors = np.flatnonzero(
+                is_visible[self.layer_starts_list[i]:self.layer_starts_list[i + 1]]
+            ) + self.layer_starts_list[i]
+            NATIVE_SURFACE.blits(
+                [
+                    (surface, (xs_list[actor], ys_list[actor]), frames_lists[sprite_id][frame_index])
+                    for actor, sprite_id, frame_index in zip(
+                        actors.tolist(),
+                        self.actor_sprite_ids[actors].tolist(),
+                        animation_clock.get_frame_indexes(
+                            self.actor_sprite_ids[actors], self.actor_frame_indexes[actors]
+                        ).tolist()
+                    )
+                ],
+                doreturn=False
+            )
+
+        profiler.end()
+        profiler.begin("hud")
+
+        # Info text draw
+        NATIVE_SURFACE.blit(
+            self.info_text_surface,
+            self.info_text_rect
+        )
+
+        # Actors text draw
+        actors_text_surface = text_cache.render(
+            f"play test actors: {self.actors_count}",
+            "white"
+        )
+        NATIVE_SURFACE.blit(
+            actors_text_surface,
+            (FONT_HEIGHT, FONT_HEIGHT)
+        )
+
+        if game.is_debug:
+            fps_surface = text_cache.render(
+                f"fps: {int(1//dt)}",
+                "white"
+            )
+            fps_rect = fps_surface.get_rect(
+                bottomright=(
+                    NATIVE_RECT.width - FONT_HEIGHT, NATIVE_RECT.height - FONT_HEIGHT
+                )
+            )
+            NATIVE_SURFACE.blit(
+                fps_surface,
+                fps_rect
             )
 
+        profiler.end()
 
-# Set scene
-game.scene = RoomLoadEditor()
 
+# Open the editor and loop until the window closes
+def run(room_path=LOAD_ROOM_JSON_PATH):
+    init()
 
-while 1:
-    # Limit fps and get dt
-    dt = CLOCK.tick(FPS) / 1000
+    # Set scene
+    game.scene = RoomLoadEditor(room_path)
 
-    # Get events
-    for event in pg.event.get():
-        # Close window
-        if event.type == pg.QUIT:
-            pg.quit()
-            exit()
+    while 1:
+        # Limit fps and get dt, the wait is not part of the frame
+        dt = CLOCK.tick(FPS) / 1000
+        profiler.start_frame()
+        ticks_count = game.timestep.advance(dt)
 
-        # Scene event
-        game.scene.input(event)
+        # Get events
+        profiler.begin("event pump")
+        for event in pg.event.get():
+            # Close window
+            if event.type == pg.QUIT:
+                pg.quit()
+                exit()
 
-    # Scene update
-    game.scene.update(dt)
+            # Screen changed under the window? fit again
+            if event.type == pg.WINDOWSIZECHANGED:
+                game.presenter.resize()
+
+            # Scene event
+            profiler.begin("scene.input")
+            game.scene.input(event)
+            profiler.end()
+        profiler.end()
+
+        # Scene simulation, 0 or more ticks this frame
+        profiler.begin("scene.fixed_update")
+        for _ in range(ticks_count):
+            game.scene.fixed_update(game.timestep.tick_dt)
+        profiler.end()
+
+        # Scene update
+        profiler.begin("scene.update")
+        game.scene.update(dt)
+        profiler.end()
+
+        # Profiler graph, shows the frames before this one
+        if game.is_debug:
+            profiler.begin("profiler")
+            profiler.draw(NATIVE_SURFACE, (FONT_HEIGHT, FONT_HEIGHT * 5))
+            profiler.end()
+
+        # Scene reports what it changed, None is everything, empty is nothing
+        dirty_rects_list = game.scene.dirty_rects_list
+        if game.is_debug:
+            dirty_rects_list = None
+
+        # Native to window, only the changed parts
+        game.presenter.present(dirty_rects_list)
+
+        profiler.end_frame()
 
-    # Resize native to window
-    pg.transform.scale_by(
-        NATIVE_SURFACE, game.resolution_scale, game.window_surface
-    )
 
-    # Update window
-    pg.display.update()
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,54 @@
+# Render room files to png, every layer with its entities, chunks rasterized on a thread pool
+# python render_room.py rooms/room1.json            -> rooms/room1.png
+# python render_room.py a.room -o a.png --scale 0.25 -> a quarter sized overview
+
+from os import environ, path
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import time
+
+# No window needed
+environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import main
+import pygame as pg
+
+
+def run():
+    parser = argparse.ArgumentParser(
+        description="Render room files to png"
+    )
+    parser.add_argument("paths", nargs="+", help="room files")
+    parser.add_argument(
+        "-o", "--output", help="png path, only with 1 room, defaults to next to the room")
+    parser.add_argument("--scale", type=float, default=1.0,
+                        help="size of the png relative to the room")
+    parser.add_argument("--workers", type=int,
+                        help="raster threads, defaults to 1 per core")
+    args = parser.parse_args()
+    if args.output and len(args.paths) > 1:
+        parser.error("--output needs exactly 1 room")
+
+    sprite_sheet = main.SpriteSheet(
+        main.SPRITE_SHEET_PNG_PATH,
+        main.SPRITE_SHEET_JSON_PATH
+    )
+    with ThreadPoolExecutor(args.workers) as executor:
+        for room_path in args.paths:
+            output_path = args.output or path.splitext(room_path)[0] + ".png"
+            room_data = main.load_room_data(room_path, sprite_sheet)
+            start = time.perf_counter()
+            surface = main.rasterize_layers(
+                room_data.tile_maps_list,
+                pg.FRect(room_data.topleft, (room_data.width, room_data.height)),
+                args.scale,
+                executor=executor
+            )
+            raster_ms = (time.perf_counter() - start) * 1000
+            pg.image.save(surface, output_path)
+            print(
+                f"{room_path} -> {output_path} {surface.get_width()}x{surface.get_height()} {raster_ms:.1f}ms")
+
+
+if __name__ == "__main__":
+    run()